@@ -0,0 +1,314 @@
+""" This module provides Linux control group (cgroup v2) scopes for the
+    applications launched by a task, so they can be ended together, along
+    with any processes they start, and their resource usage measured.
+
+    A scope is created under the task daemon's own cgroup::
+
+        <daemon cgroup>/focus-<task>/daemon  - the task daemon
+        <daemon cgroup>/focus-<task>/apps    - launched applications
+
+    The daemon is moved into a leaf of the scope so launched applications can
+    be moved between cgroups the task owner has write access to.
+    """
+
+import os
+import errno
+import signal
+
+from focus import common
+
+__all__ = ('TaskScope', 'SCOPE_FILE', 'get_root', 'is_supported',
+           'get_cgroup', 'remove_scope')
+
+
+SCOPE_FILE = '.focusd.cgroup'  # in data directory, path of task's scope
+
+_root = None  # cgroup2 mount point, '' if not mounted
+
+
+def get_root():
+    """ Gets the mount point of the unified (v2) cgroup hierarchy, which
+        is '/sys/fs/cgroup/unified' on hybrid systems.
+
+        Returns path string or ``None``.
+        """
+
+    global _root
+
+    if _root is None:
+        _root = ''
+
+        for line in (common.readfile('/proc/self/mounts') or '').splitlines():
+            parts = line.split()
+            if len(parts) > 2 and parts[2] == 'cgroup2':
+                _root = parts[1]
+                break
+
+    return _root or None
+
+
+def is_supported():
+    """ Determines if the unified (v2) cgroup hierarchy is mounted.
+
+        Returns boolean.
+        """
+    return get_root() is not None
+
+
+def get_cgroup(pid='self'):
+    """ Gets the cgroup v2 path for a process.
+
+        `pid`
+            System process identifier. Default: current process.
+
+        Returns path string, relative to hierarchy root, or ``None``.
+        """
+
+    data = common.readfile('/proc/{0}/cgroup'.format(pid))
+    if not data:
+        return None
+
+    for line in data.splitlines():
+        # unified hierarchy entry: "0::/path"
+        if line.startswith('0::'):
+            return line[3:]
+
+    return None
+
+
+def _write(filename, value):
+    """ Writes a value to a cgroup interface file.
+
+        `filename`
+            Interface filename.
+        `value`
+            Value to write.
+
+        Returns boolean.
+        """
+
+    try:
+        fd = os.open(filename, os.O_WRONLY)
+    except OSError:
+        return False
+
+    try:
+        os.write(fd, str(value))
+        return True
+
+    except OSError:
+        return False
+
+    finally:
+        os.close(fd)
+
+
+def _read_keys(filename):
+    """ Reads a flat-keyed cgroup interface file (e.g. ``cpu.stat``).
+
+        `filename`
+            Interface filename.
+
+        Returns dict.
+        """
+
+    values = {}
+
+    for line in (common.readfile(filename) or '').splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[1].isdigit():
+            values[parts[0]] = int(parts[1])
+
+    return values
+
+
+class TaskScope(object):
+    """ cgroup scope for applications launched by a task.
+
+        `path`
+            Absolute path of the scope cgroup directory.
+        """
+
+    def __init__(self, path):
+        self.path = path
+        self.apps_path = os.path.join(path, 'apps')
+
+    @classmethod
+    def create(cls, name, uid=None):
+        """ Creates a scope under the current process's cgroup and moves the
+            current process into it. Existing scopes for the same name are
+            reused.
+
+            `name`
+                Task name.
+            `uid`
+                User identifier to give ownership of the scope to, so
+                applications can be moved into it after privileges are
+                dropped.
+
+            Returns ``TaskScope`` instance or ``None`` if cgroups aren't
+            supported or not permitted.
+            """
+
+        if not is_supported():
+            return None
+
+        current = get_cgroup()
+        if current is None:
+            return None
+
+        parent = os.path.join(get_root(), current.lstrip('/'))
+
+        # already moved into a scope for this task
+        if os.path.basename(parent) == 'daemon':
+            parent = os.path.dirname(os.path.dirname(parent))
+
+        scope = cls(os.path.join(parent, 'focus-{0}'.format(name)))
+        daemon_path = os.path.join(scope.path, 'daemon')
+
+        try:
+            for path in (scope.path, daemon_path, scope.apps_path):
+                try:
+                    os.mkdir(path)
+                except OSError as exc:
+                    if exc.errno != errno.EEXIST:
+                        raise
+
+            # migrating requires write access to the common ancestor
+            if uid is not None and uid != os.getuid():
+                os.chown(scope.apps_path, uid, -1)
+                for path in (scope.path, scope.apps_path):
+                    os.chown(os.path.join(path, 'cgroup.procs'), uid, -1)
+                if os.path.exists(scope.kill_file):
+                    os.chown(scope.kill_file, uid, -1)
+
+        except OSError:
+            return None
+
+        if not _write(os.path.join(daemon_path, 'cgroup.procs'), os.getpid()):
+            return None
+
+        return scope
+
+    @property
+    def kill_file(self):
+        """ Returns path to the ``cgroup.kill`` file for applications.
+            """
+        return os.path.join(self.apps_path, 'cgroup.kill')
+
+    def attach(self, pid=0):
+        """ Moves a process into the applications cgroup. Suitable as a
+            ``preexec_fn`` for ``subprocess.Popen``.
+
+            `pid`
+                System process identifier. Default: current process.
+
+            Returns boolean.
+            """
+        return _write(os.path.join(self.apps_path, 'cgroup.procs'), pid)
+
+    def get_pids(self):
+        """ Returns list of process identifiers for applications.
+            """
+        data = common.readfile(os.path.join(self.apps_path, 'cgroup.procs'))
+        return [int(x) for x in (data or '').split()]
+
+    def is_populated(self):
+        """ Determines if any applications are still running.
+
+            Returns boolean.
+            """
+        events = _read_keys(os.path.join(self.apps_path, 'cgroup.events'))
+        return bool(events.get('populated'))
+
+    def kill(self):
+        """ Kills all applications, including any processes they started,
+            with a single write.
+
+            Returns boolean.
+            """
+
+        # cgroup.kill requires kernel 5.14; signal processes individually
+        if not os.path.exists(self.kill_file):
+            for pid in self.get_pids():
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+            return True
+
+        return _write(self.kill_file, 1)
+
+    def get_stats(self):
+        """ Gets resource usage for applications.
+
+            Returns dict with 'cpu' (seconds), 'memory' (bytes or ``None`` if
+            the memory controller isn't enabled) and 'processes' keys.
+            """
+
+        cpu = _read_keys(os.path.join(self.apps_path, 'cpu.stat'))
+        filename = os.path.join(self.apps_path, 'memory.current')
+        memory = (common.readfile(filename) or '').strip()
+        return {
+            'cpu': cpu.get('usage_usec', 0) / 1000000.0,
+            'memory': int(memory) if memory.isdigit() else None,
+            'processes': len(self.get_pids())
+        }
+
+    def remove(self):
+        """ Removes the scope. Any applications still running, and the task
+            daemon processes, are moved back to the cgroup the scope was
+            created under.
+
+            Returns boolean.
+            """
+
+        parent_procs = os.path.join(os.path.dirname(self.path),
+                                    'cgroup.procs')
+        daemon_path = os.path.join(self.path, 'daemon')
+
+        # all task daemon processes share the leaf, not just this one
+        for path in (self.apps_path, daemon_path):
+            data = common.readfile(os.path.join(path, 'cgroup.procs'))
+            for pid in (data or '').split():
+                _write(parent_procs, pid)
+
+        for path in (self.apps_path, daemon_path, self.path):
+            try:
+                os.rmdir(path)
+            except OSError as exc:
+                if exc.errno != errno.ENOENT:
+                    return False
+
+        return True
+
+
+def remove_scope(path):
+    """ Removes a scope left by a task daemon that has exited, which can't
+        always remove it after dropping privileges. Only scopes created under
+        the current process's cgroup, with no task daemon processes left in
+        them, are removed.
+
+        `path`
+            Absolute path of the scope cgroup directory.
+
+        Returns boolean.
+        """
+
+    current = get_cgroup()
+    if not is_supported() or current is None:
+        return False
+
+    path = os.path.normpath(path)
+    parent = os.path.join(get_root(), current.lstrip('/'))
+
+    if (os.path.dirname(path) != os.path.normpath(parent)
+            or not os.path.basename(path).startswith('focus-')):
+        return False
+
+    # still in use by a running task daemon
+    procs = os.path.join(path, 'daemon', 'cgroup.procs')
+    if (common.readfile(procs) or '').strip():
+        return False
+
+    return TaskScope(path).remove()
@@ -4,16 +4,118 @@
 
 import os
 import sys
+import time
 import shlex
+import signal
+import threading
 import subprocess
+import collections
 
-__all__ = ('IS_MACOSX', 'readfile', 'writefile', 'safe_remove_file', 'which',
-           'extract_app_paths', 'shell_process', 'to_utf8', 'from_utf8')
+try:
+    import ctypes
+    import ctypes.util
+except ImportError:
+    ctypes = None
+
+__all__ = ('IS_MACOSX', 'monotonic', 'boottime', 'readfile', 'writefile',
+           'safe_remove_file', 'which', 'extract_app_paths', 'shell_process',
+           'spawn_process', 'ChildProcess', 'set_child_owner', 'get_children',
+           'reap_children', 'claim_exit_status', 'terminate_children',
+           'call_with_deadlines', 'to_utf8', 'from_utf8')
 
 
 # platform is mac osx
 IS_MACOSX = sys.platform.lower().startswith('darwin')
 
+# background processes spawned by `shell_process`
+_children = {}  # running, pid -> ``ChildProcess``
+_exited_children = collections.deque(maxlen=100)  # most recent exits
+_child_owner = None  # owner assigned to new children
+
+# (pid, exit status) of other child processes reaped by `reap_children`
+_reaped_statuses = collections.deque(maxlen=100)
+
+# CLOCK_MONOTONIC and CLOCK_BOOTTIME identifiers for clock_gettime() on linux
+_CLOCK_MONOTONIC = 1
+_CLOCK_BOOTTIME = 7
+
+
+def _load_clock_gettime():
+    """ Loads the libc clock_gettime() function.
+
+        Returns callable or ``None``.
+        """
+
+    if ctypes is None or not sys.platform.startswith('linux'):
+        return None
+
+    class _timespec(ctypes.Structure):
+        """ struct timespec
+            """
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno=True)
+        clock_gettime = libc.clock_gettime
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_timespec)]
+
+    except (OSError, AttributeError):
+        return None
+
+    spec = _timespec()
+
+    def _gettime(clock_id):
+        """ Returns seconds for the clock or ``None`` on failure.
+            """
+        if clock_gettime(clock_id, ctypes.byref(spec)) != 0:
+            return None
+        return spec.tv_sec + spec.tv_nsec * 1e-9
+
+    # make sure it works before trusting it
+    if _gettime(_CLOCK_MONOTONIC) is None:
+        return None
+
+    return _gettime
+
+_clock_gettime = _load_clock_gettime()
+
+
+def monotonic():
+    """ Returns the value (in fractional seconds) of a clock that can't go
+        backwards and isn't affected by system clock changes. Only the
+        difference between two values is meaningful.
+
+        Falls back to wall clock time if a monotonic clock isn't available.
+
+        Returns float.
+        """
+
+    if _clock_gettime:
+        value = _clock_gettime(_CLOCK_MONOTONIC)
+        if value is not None:
+            return value
+
+    return time.time()
+
+
+def boottime():
+    """ Returns the value (in fractional seconds) of a monotonic clock that
+        also counts time the system was suspended, so it tracks how much real
+        time passed between two values.
+
+        Falls back to `monotonic` if the clock isn't available.
+
+        Returns float.
+        """
+
+    if _clock_gettime:
+        value = _clock_gettime(_CLOCK_BOOTTIME)
+        if value is not None:
+            return value
+
+    return monotonic()
+
 
 def readfile(filename, binary=False):
     """ Reads the contents of the specified file.
@@ -189,7 +291,8 @@ def extract_app_paths(values, app_should_exist=True):
     return list(paths)
 
 
-def shell_process(command, input_data=None, background=False, exitcode=False):
+def shell_process(command, input_data=None, background=False, exitcode=False,
+                  scoped=False, preexec_fn=None):
     """ Shells a process with the given shell command.
 
         `command`
@@ -201,6 +304,12 @@ def shell_process(command, input_data=None, background=False, exitcode=False):
             NOTE: This exits immediately with no result returned.
         `exitcode`
             Set to ``True`` to also return process exit status code.
+        `scoped`
+            Set to ``True`` to mark a background process to be terminated
+            when the active task ends. See ``terminate_children``.
+        `preexec_fn`
+            Callable to run in the child process before the command is
+            executed (e.g. ``cgroup.TaskScope.attach``).
 
         if `exitcode` is ``False``, then this returns output string from
         process or ``None`` if it failed.
@@ -220,7 +329,8 @@ def shell_process(command, input_data=None, background=False, exitcode=False):
         kwargs = {
             'shell': isinstance(command, basestring),
             'stdout': subprocess.PIPE,
-            'stderr': subprocess.PIPE
+            'stderr': subprocess.PIPE,
+            'preexec_fn': preexec_fn
         }
         if not input_data is None:
             kwargs['stdin'] = subprocess.PIPE
@@ -231,11 +341,24 @@ def shell_process(command, input_data=None, background=False, exitcode=False):
             output, _ = proc.communicate(input_data)
             retcode = proc.returncode
 
+            # looks like a clean exit if `reap_children` took the status
+            if retcode == 0:
+                status = claim_exit_status(proc.pid)
+                if not status is None:
+                    retcode = status
+
             if retcode == 0:
                 data = str(output).rstrip()
         else:
             retcode = None
 
+            # track process until it's reaped; its output pipes are closed,
+            # as they would be if the process object was discarded
+            proc.stdout.close()
+            proc.stderr.close()
+            _children[proc.pid] = ChildProcess(proc, command, _child_owner,
+                                               scoped)
+
             if input_data:
                 raise TypeError(u'Backgrounded does not support input data.')
 
@@ -249,6 +372,278 @@ def shell_process(command, input_data=None, background=False, exitcode=False):
         return data
 
 
+def spawn_process(command, scoped=False, preexec_fn=None):
+    """ Spawns a background process with the given shell command, like
+        ``shell_process`` with `background` set, but returns the tracked
+        process record.
+
+        `command`
+            Shell command to spawn.
+        `scoped`
+            Set to ``True`` to mark the process to be terminated when the
+            active task ends. See ``terminate_children``.
+        `preexec_fn`
+            Callable to run in the child process before the command is
+            executed.
+
+        Returns ``ChildProcess`` instance or ``None`` if it failed.
+        """
+
+    try:
+        proc = subprocess.Popen(command,
+                                shell=isinstance(command, basestring),
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                preexec_fn=preexec_fn)
+    except OSError:
+        return None
+
+    # output pipes are closed, as they would be if the process object was
+    # discarded
+    proc.stdout.close()
+    proc.stderr.close()
+
+    child = ChildProcess(proc, command, _child_owner, scoped)
+    _children[proc.pid] = child
+    return child
+
+
+class ChildProcess(object):
+    """ Record for a background process spawned by `shell_process`.
+
+        `proc`
+            ``subprocess.Popen`` instance.
+        `command`
+            Shell command used to spawn process.
+        `owner`
+            Name of the plugin that spawned the process or ``None``.
+        `scoped`
+            Set to ``True`` if process should end with the active task.
+        """
+
+    def __init__(self, proc, command, owner=None, scoped=False):
+        self.proc = proc
+        self.pid = proc.pid
+        self.command = command
+        self.owner = owner
+        self.scoped = scoped
+        self.started = time.time()
+        self.ended = None
+
+    def poll(self):
+        """ Reaps the process if it has exited.
+
+            Returns ``True`` if the process has exited.
+            """
+
+        if self.ended is None:
+            try:
+                exited = self.proc.poll() is not None
+
+            except OSError:
+                exited = True  # reaped elsewhere, status unknown
+
+            if exited:
+                self.ended = time.time()
+
+        return self.ended is not None
+
+    @property
+    def returncode(self):
+        """ Returns exit status code or ``None`` if still running. Negative
+            values indicate the process was killed by that signal.
+            """
+        return self.proc.returncode
+
+    def __repr__(self):
+        return ('ChildProcess (pid={0}, owner={1}, returncode={2})'
+                .format(self.pid, self.owner, self.returncode))
+
+
+def set_child_owner(owner):
+    """ Sets the owner assigned to background processes spawned hereafter.
+
+        `owner`
+            Owner name (e.g. plugin name) or ``None``.
+        """
+
+    global _child_owner
+    _child_owner = owner
+
+
+def get_children(running=None):
+    """ Returns records for background processes spawned by `shell_process`.
+
+        `running`
+            Set to ``True`` for only running processes or ``False`` for only
+            recently exited processes. Default: both.
+
+        Returns list of ``ChildProcess`` instances.
+        """
+
+    children = []
+
+    if running is None or running:
+        children.extend(_children.values())
+    if running is None or not running:
+        children.extend(_exited_children)
+
+    return children
+
+
+def _child_exited(child):
+    """ Moves exited child process into the recently exited records.
+        """
+    _children.pop(child.pid, None)
+    _exited_children.append(child)
+
+
+def _exit_status(status):
+    """ Converts a status returned by ``os.waitpid`` to an exit status code,
+        negative for the signal that killed the process.
+
+        `status`
+            Status integer.
+
+        Returns integer.
+        """
+
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def reap_children():
+    """ Reaps exited background processes spawned by `shell_process`, then
+        any other exited child processes, so none are left behind as zombies.
+        This is safe to call from a SIGCHLD handler. Exit statuses of the
+        other processes are kept for their owners. See `claim_exit_status`.
+
+        Returns list of ``ChildProcess`` instances reaped.
+        """
+
+    reaped = []
+
+    for child in _children.values():
+        if child.poll():
+            _child_exited(child)
+            reaped.append(child)
+
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+
+        except OSError:
+            break  # no more children
+
+        if not pid:
+            break
+
+        child = _children.get(pid)
+
+        if child:  # exited since it was polled
+            child.proc.returncode = _exit_status(status)
+            if child.poll():
+                _child_exited(child)
+                reaped.append(child)
+        else:
+            _reaped_statuses.append((pid, _exit_status(status)))
+
+    return reaped
+
+
+def claim_exit_status(pid):
+    """ Gets the exit status of a child process that was reaped by
+        `reap_children` rather than waited on by its owner. The status is
+        forgotten afterwards.
+
+        `pid`
+            Process identifier.
+
+        Returns exit status code or ``None`` if not reaped.
+        """
+
+    for item in list(_reaped_statuses):
+        if item[0] == pid:
+            try:
+                _reaped_statuses.remove(item)
+            except ValueError:
+                pass
+            return item[1]
+
+    return None
+
+
+def terminate_children(owner=None, scoped=None):
+    """ Terminates running background processes spawned by `shell_process`.
+
+        `owner`
+            Owner name to limit to. Default: any owner.
+        `scoped`
+            Set to ``True`` to limit to processes marked as scoped to the
+            active task. Default: any process.
+
+        Returns list of ``ChildProcess`` instances signalled.
+        """
+
+    signalled = []
+
+    for child in _children.values():
+        if not owner is None and child.owner != owner:
+            continue
+        if scoped and not child.scoped:
+            continue
+        if child.poll():
+            continue
+
+        try:
+            os.kill(child.pid, signal.SIGTERM)
+            signalled.append(child)
+
+        except OSError:
+            pass
+
+    return signalled
+
+
+def call_with_deadlines(calls):
+    """ Runs functions concurrently, each in its own thread, and waits until
+        each has returned or its deadline has passed. A function still running
+        at its deadline is left to finish in the background.
+
+        `calls`
+            Iterable of tuples: (key, function, arguments tuple, timeout in
+            seconds).
+
+        Returns list of tuples, in order of `calls`: (key, state, value),
+        where state is 'ok' with the returned value, 'error' with the raised
+        exception, or 'timeout' with ``None``.
+        """
+
+    results = {}
+    pending = []
+    start = monotonic()
+
+    def _run(key, func, args):
+        try:
+            results[key] = ('ok', func(*args))
+        except Exception as exc:
+            results[key] = ('error', exc)
+
+    for key, func, args, timeout in calls:
+        thread = threading.Thread(target=_run, args=(key, func, args))
+        thread.daemon = True
+        thread.start()
+        pending.append((key, thread, start + timeout))
+
+    # wait for earliest deadlines first
+    for key, thread, deadline in sorted(pending, key=lambda x: x[2]):
+        thread.join(max(0, deadline - monotonic()))
+
+    return [(key,) + results.get(key, ('timeout', None))
+            for key, thread, deadline in pending]
+
+
 def to_utf8(buf, errors='replace'):
     """ Encodes a string into a UTF-8 compatible, ASCII string.
 
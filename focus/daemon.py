@@ -11,15 +11,39 @@ import grp
 import time
 import errno
 import types
+import struct
+import select
 import signal
+import socket
 import atexit
 import multiprocessing
 
-from focus import errors, common
+from focus import errors, common, cgroup, dispatch, telemetry
 from focus.plugin import registration
 
-__all__ = ('get_daemon_pidfile', 'pid_exists', 'daemonize', 'shell_focusd',
-           'focusd', 'Focusd', 'TaskRunner', 'CommandServer')
+__all__ = ('SUPERVISOR_SOCKET', 'START_LATENCY_BUDGET', 'get_daemon_pidfile',
+           'get_daemon_perffile', 'pid_exists', 'daemonize', 'start_focusd',
+           'shell_focusd', 'fork_focusd', 'focusd', 'supervise', 'Focusd',
+           'Supervisor', 'TaskRunner', 'CommandServer')
+
+
+# unix socket the resident supervisor listens on for task start requests
+SUPERVISOR_SOCKET = '/var/run/focusd.sock'
+
+# target time (seconds) for a task daemon to be up after `focus on`
+START_LATENCY_BUDGET = 0.25
+
+# environment variables forwarded from the requesting user to task daemons
+# started by the supervisor, so plugins can reach the user's desktop session
+_SUPERVISOR_ENV_KEYS = ('DISPLAY', 'XAUTHORITY', 'DBUS_SESSION_BUS_ADDRESS',
+                        'LANG')
+
+# seconds the task daemon waits for background deliveries (e.g. notifications)
+# queued by task end plugins, before it exits
+_DRAIN_TIMEOUT = 3.0
+
+# linux socket option for fetching unix socket peer credentials
+_SO_PEERCRED = getattr(socket, 'SO_PEERCRED', 17)
 
 
 def _shutdown_pipe(pipe):
@@ -51,6 +75,18 @@ def get_daemon_pidfile(task):
     return os.path.join(task.base_dir, '.focusd.pid')
 
 
+def get_daemon_perffile(task):
+    """ Get path for focusd daemon performance snapshot file.
+
+        `task`
+            ``Task`` instance.
+
+        Returns filename string.
+        """
+
+    return os.path.join(task.base_dir, '.focusd.perf')
+
+
 def pid_exists(pid):
     """ Determines if a system process identifer exists in process table.
         """
@@ -62,6 +98,238 @@ def pid_exists(pid):
         return True
 
 
+def _register_pidfile(filename):
+    """ Registers a pid file for the current process which will cleaned up
+        when the process terminates.
+
+        `filename`
+            Filename to save pid to.
+
+        Returns callable that removes the pid file or ``None`` if the pid file
+        could not be written.
+        """
+
+    if common.writefile(filename, str(os.getpid()) + os.linesep):
+        os.chmod(filename, 0644)  # rw-r--r--
+
+        def _cleanup_pid():
+            """ Removes pidfile.
+                """
+            common.safe_remove_file(filename)
+        atexit.register(_cleanup_pid)
+
+        return _cleanup_pid
+
+    return None
+
+
+def _recv_all(sock, timeout=None, max_size=None):
+    """ Reads from the provided socket until the remote end stops sending.
+
+        `sock`
+            Connected ``socket`` object.
+        `timeout`
+            Seconds allowed for the whole read, so a client sending slowly
+            can't hold the connection open. Default: socket's own timeout.
+        `max_size`
+            Maximum number of bytes to read.
+
+        Returns string.
+
+        * Raises ``socket.timeout`` if the read doesn't complete in time, or
+          ``socket.error`` if too much was sent.
+        """
+
+    chunks = []
+    size = 0
+    deadline = None if timeout is None else common.monotonic() + timeout
+
+    while True:
+        if not deadline is None:
+            remaining = deadline - common.monotonic()
+            if remaining <= 0:
+                raise socket.timeout(u'Read timed out')
+            sock.settimeout(remaining)
+
+        chunk = sock.recv(4096)
+        if not chunk:
+            break
+
+        size += len(chunk)
+        if not max_size is None and size > max_size:
+            raise socket.error(errno.EMSGSIZE, u'Message too long')
+        chunks.append(chunk)
+
+    return ''.join(chunks)
+
+
+def _drop_privs(uid):
+    """ Reduces privileges for the current process to that of a user. The
+        umask and environment variables are also modified to recreate the
+        environment of the user.
+
+        `uid`
+            User identifier.
+
+        * Raises ``OSError`` if privileges couldn't be fully dropped.
+        """
+
+    try:
+        pwd_info = pwd.getpwuid(uid)
+
+    except KeyError:
+        raise OSError(errno.EINVAL, u'Unknown user id {0}'.format(uid))
+
+    if os.geteuid() == 0:
+        # set secondary group ids for user, must come first
+        gids = [g.gr_gid for g in grp.getgrall()
+                if pwd_info.pw_name in g.gr_mem]
+        gids.append(pwd_info.pw_gid)
+        os.setgroups(gids)
+
+        # set group id, must come before uid
+        os.setgid(pwd_info.pw_gid)
+        os.setuid(uid)
+
+        ids = (os.getuid(), os.geteuid(), os.getgid(), os.getegid())
+        if ids != (uid, uid, pwd_info.pw_gid, pwd_info.pw_gid):
+            raise OSError(errno.EPERM, u'Failed to drop privileges')
+
+    elif os.getuid() != uid or os.geteuid() != uid:
+        raise OSError(errno.EPERM, u'Failed to drop privileges')
+
+    # update user env variables
+    for k in ('USER', 'USERNAME', 'SHELL', 'HOME'):
+        if k in os.environ:
+            if k in ('USER', 'USERNAME'):
+                val = pwd_info.pw_name
+
+            elif k == 'SHELL':
+                val = pwd_info.pw_shell
+
+            elif k == 'HOME':
+                val = pwd_info.pw_dir
+
+            # update value
+            os.environ[k] = val
+
+    # remove unneeded env variables
+    keys = []
+    for k, _ in os.environ.iteritems():
+        if k.startswith('SUDO_') or k == 'LOGNAME':
+            keys.append(k)
+    for k in keys:
+        del os.environ[k]
+
+    # set default umask
+    os.umask(022)
+
+
+def _call_as_user(uid, func, *args):
+    """ Calls a function with the effective user and group ids of a user, so
+        files are accessed with that user's permissions. The effective ids of
+        the current process are restored afterwards.
+
+        `uid`
+            User identifier.
+        `func`
+            Callable to call.
+        `args`
+            Positional arguments for the callable.
+
+        Returns value returned by the callable.
+
+        * Raises ``OSError`` if the effective ids couldn't be changed.
+        """
+
+    if os.geteuid() != 0:
+        return func(*args)
+
+    try:
+        pwd_info = pwd.getpwuid(uid)
+
+    except KeyError:
+        raise OSError(errno.EINVAL, u'Unknown user id {0}'.format(uid))
+
+    groups = os.getgroups()
+    gid = os.getegid()
+
+    os.setgroups([g.gr_gid for g in grp.getgrall()
+                  if pwd_info.pw_name in g.gr_mem] + [pwd_info.pw_gid])
+
+    try:
+        os.setegid(pwd_info.pw_gid)
+        os.seteuid(uid)
+        return func(*args)
+
+    finally:
+        os.seteuid(0)
+        os.setegid(gid)
+        os.setgroups(groups)
+
+
+def _wait_ready(read_fd, timeout):
+    """ Waits for a forked daemon to report that it's ready via the read end of
+        a pipe. The pipe end is closed afterwards.
+
+        `read_fd`
+            File descriptor for the read end of the pipe.
+        `timeout`
+            Seconds to wait before giving up.
+
+        Returns ``True`` if the daemon reported ready.
+        """
+
+    try:
+        while True:
+            try:
+                readable, _, _ = select.select([read_fd], [], [], timeout)
+                break
+
+            except select.error as exc:
+                if exc.args[0] != errno.EINTR:
+                    return False
+
+        # closed without a reply means the daemon never came up
+        return bool(readable) and os.read(read_fd, 2) == 'OK'
+
+    except OSError:
+        return False
+
+    finally:
+        os.close(read_fd)
+
+
+def _notify_ready(write_fd):
+    """ Reports the current process is ready through the write end of a pipe
+        and closes it.
+
+        `write_fd`
+            File descriptor for the write end of the pipe.
+        """
+
+    try:
+        os.write(write_fd, 'OK')
+        os.close(write_fd)
+
+    except OSError:
+        pass
+
+
+def _needs_command_server():
+    """ Determines if the command server should be started for the task
+        daemon in the current process.
+
+        Returns boolean.
+        """
+
+    # root event plugins available, command server must be run as root
+    if registration.get_registered(event_hooks=True, root_access=True):
+        return os.getuid() == 0
+
+    return False
+
+
 def daemonize(pid_file, working_dir, func):
     """ Turns the current process into a daemon.
 
@@ -88,22 +356,6 @@ def daemonize(pid_file, working_dir, func):
         except OSError:
             return False
 
-    def _register_pidfile(filename):
-        """ Registers a pid file for the current process which will cleaned up
-            when the process terminates.
-
-            `filename`
-                Filename to save pid to.
-            """
-        if common.writefile(filename, str(os.getpid()) + os.linesep):
-            os.chmod(filename, 0644)  # rw-r--r--
-
-            def _cleanup_pid():
-                """ Removes pidfile.
-                    """
-                common.safe_remove_file(filename)
-            atexit.register(_cleanup_pid)
-
     if not pid_file or not working_dir or not func:
         return
 
@@ -135,10 +387,46 @@ def daemonize(pid_file, working_dir, func):
         os.dup2(_fd, sys.stderr.fileno())
 
         # setup pidfile
-        _register_pidfile(pid_file)
+        cleanup = _register_pidfile(pid_file)
 
-        # execute provided callable
-        func()
+        # execute provided callable; clean up the pidfile explicitly, in case
+        # the caller leaves via ``os._exit``
+        try:
+            func()
+
+        finally:
+            if cleanup:
+                cleanup()
+
+
+def start_focusd(task):
+    """ Starts a focusd daemon for the provided task using the fastest method
+        available.
+
+        If none of the registered event plugins need root access (or we're
+        already root), the daemon is forked directly from the current process,
+        reusing the already parsed task and plugin state. Otherwise, this
+        falls back to the supervisor or shelling focusd through sudo.
+
+        `task`
+            ``Task`` instance for the task to run.
+
+        Returns boolean.
+
+        * Raises ``ValueError`` if sudo used and all passwords tries failed.
+        """
+
+    plugins = registration.get_registered(event_hooks=True)
+
+    if not plugins:  # none registered, bail
+        raise errors.NoPluginsRegistered
+
+    needs_root = any(p for p in plugins if p.needs_root)
+
+    if needs_root and os.getuid() != 0:
+        return shell_focusd(task.base_dir)
+
+    return fork_focusd(task)
 
 
 def shell_focusd(data_dir):
@@ -160,6 +448,11 @@ def shell_focusd(data_dir):
     if not plugins:  # none registered, bail
         raise errors.NoPluginsRegistered
 
+    # hand off to the resident supervisor, if one is running
+    started = _supervisor_request(data_dir)
+    if not started is None:
+        return started
+
     # do any of the plugins need root access?
     # if so, wrap command with sudo to escalate privs, if not already root
     needs_root = any(p for p in plugins if p.needs_root)
@@ -178,25 +471,134 @@ def shell_focusd(data_dir):
     return code == 0
 
 
-def focusd(task):
+def _supervisor_request(data_dir, socket_path=None):
+    """ Requests the resident supervisor to start a task daemon for the active
+        task in the provided data directory.
+
+        `data_dir`
+            Home directory for focusd data.
+        `socket_path`
+            Path to supervisor unix socket. Default: ``SUPERVISOR_SOCKET``
+
+        Returns ``None`` if no supervisor is available; otherwise, returns
+        ``True`` if the task daemon was started.
+        """
+
+    socket_path = socket_path or SUPERVISOR_SOCKET
+
+    if not os.path.exists(socket_path):
+        return None
+
+    # forward the bits of our environment the task daemon needs
+    env = ['{0}={1}'.format(k, os.environ[k])
+           for k in _SUPERVISOR_ENV_KEYS if k in os.environ]
+    payload = '\x80'.join(['RUN', os.path.realpath(data_dir)] + env)
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        sock.settimeout(Supervisor.START_TIMEOUT + 5)
+        sock.connect(socket_path)
+        sock.sendall(payload)
+        sock.shutdown(socket.SHUT_WR)
+        res = _recv_all(sock)
+
+    except socket.error:
+        return None  # stale socket or access denied
+
+    finally:
+        sock.close()
+
+    return res == 'OK'
+
+
+def fork_focusd(task, timeout=10):
+    """ Forks a focusd daemon for the provided task from the current process,
+        without shelling a new focusd process.
+
+        `task`
+            ``Task`` instance for the task to run.
+        `timeout`
+            Seconds to wait for the daemon to start.
+
+        Returns boolean.
+        """
+
+    read_fd, write_fd = os.pipe()
+
+    try:
+        pid = os.fork()
+
+    except OSError:
+        os.close(read_fd)
+        os.close(write_fd)
+        return False
+
+    if pid == 0:
+        # the daemon forks away from this process, so only the daemon itself
+        # returns here after the task ends. either way, we must never return
+        # into the caller's stack.
+        try:
+            os.close(read_fd)
+            focusd(task, ready_fd=write_fd)
+
+        finally:
+            os._exit(0)
+
+    os.close(write_fd)
+    started = _wait_ready(read_fd, timeout)
+
+    # reclaim the intermediate process
+    try:
+        os.waitpid(pid, 0)
+    except OSError:
+        pass
+
+    return started
+
+
+def focusd(task, ready_fd=None):
     """ Forks the current process as a daemon to run a task.
 
         `task`
             ``Task`` instance for the task to run.
+        `ready_fd`
+            Write end of a pipe used to report the daemon has started.
         """
 
     # determine if command server should be started
-    if registration.get_registered(event_hooks=True, root_access=True):
-        # root event plugins available
-        start_cmd_srv = (os.getuid() == 0)  # must be root
-    else:
-        start_cmd_srv = False
+    start_cmd_srv = _needs_command_server()
+
+    def _run():
+        """ Runs the daemon for the task.
+            """
+        if not ready_fd is None:
+            _notify_ready(ready_fd)
+        Focusd(task).run(start_cmd_srv)
 
     # daemonize our current process
-    _run = lambda: Focusd(task).run(start_cmd_srv)
     daemonize(get_daemon_pidfile(task), task.task_dir, _run)
 
 
+def supervise(task_loader, pid_file, socket_path=None, group=None):
+    """ Forks the current process as a daemon running the resident
+        supervisor.
+
+        `task_loader`
+            Callable used to load the active task for a data directory.
+            See ``Supervisor``.
+        `pid_file`
+            File path to use as pid lock file for the supervisor.
+        `socket_path`
+            Path to unix socket to listen on. Default: ``SUPERVISOR_SOCKET``
+        `group`
+            Name of group allowed to send requests. Default: root only.
+        """
+
+    _run = lambda: Supervisor(task_loader, socket_path, group).run()
+    daemonize(pid_file, '/', _run)
+
+
 class Focusd(object):
     """ Defines the container for the Focus daemon process.
 
@@ -204,17 +606,23 @@ class Focusd(object):
             ``Task`` object.
         """
 
-    def __init__(self, task):
+    def __init__(self, task, command_server=None):
         self._exited = False
         self._pidfile = get_daemon_pidfile(task)
         self._task = task
-        self._pipe = multiprocessing.Pipe(duplex=True)
         self._sleep_period = 1.0  # one second
 
-        # child procs
+        # child procs; the command server may already be running
         pid = os.getpid()
+
+        if command_server:
+            self._pipe = command_server._pipe
+            self._command_server = command_server
+        else:
+            self._pipe = multiprocessing.Pipe(duplex=True)
+            self._command_server = CommandServer(task, pid, self._pipe)
+
         self._task_runner = TaskRunner(task, pid, self._pipe)
-        self._command_server = CommandServer(task, pid, self._pipe)
 
     def _reg_sighandlers(self):
         """ Registers signal handlers to this class.
@@ -227,72 +635,9 @@ class Focusd(object):
 
     def _drop_privs(self):
         """ Reduces effective privileges for this process to that of the task
-            owner. The umask and environment variables are also modified to
-            recreate the environment of the user.
+            owner. See `_drop_privs`.
             """
-
-        uid = self._task.owner
-
-        # get pwd database info for task owner
-        try:
-            pwd_info = pwd.getpwuid(uid)
-
-        except OSError:
-            pwd_info = None
-
-        # set secondary group ids for user, must come first
-        if pwd_info:
-            try:
-                gids = [g.gr_gid for g in grp.getgrall()
-                        if pwd_info.pw_name in g.gr_mem]
-                gids.append(pwd_info.pw_gid)
-                os.setgroups(gids)
-
-            except OSError:
-                pass
-
-            # set group id, must come before uid
-            try:
-                os.setgid(pwd_info.pw_gid)
-            except OSError:
-                pass
-
-        # set user id
-        try:
-            os.setuid(uid)
-
-            # update user env variables
-            if pwd_info:
-                for k in ('USER', 'USERNAME', 'SHELL', 'HOME'):
-                    if k in os.environ:
-                        if k in ('USER', 'USERNAME'):
-                            val = pwd_info.pw_name
-
-                        elif k == 'SHELL':
-                            val = pwd_info.pw_shell
-
-                        elif k == 'HOME':
-                            val = pwd_info.pw_dir
-
-                        # update value
-                        os.environ[k] = val
-
-            # remove unneeded env variables
-            keys = []
-            for k, _ in os.environ.iteritems():
-                if k.startswith('SUDO_') or k == 'LOGNAME':
-                    keys.append(k)
-            for k in keys:
-                del os.environ[k]
-
-        except OSError:
-            pass
-
-        # set default umask
-        try:
-            os.umask(022)
-        except OSError:
-            pass
+        _drop_privs(self._task.owner)
 
     def shutdown(self):
         """ Shuts down the daemon process.
@@ -323,6 +668,10 @@ class Focusd(object):
                 Set to ``True`` if command server should be started.
             """
 
+        # let plugins open privileged resources; these are inherited by the
+        # task runner
+        registration.run_event_hooks('task_prepare', self._task)
+
         if start_command_srv:
             # note, this must be established *before* the task runner is forked
             # so the task runner can communicate with the command server.
@@ -336,6 +685,10 @@ class Focusd(object):
             # command server.
             self._drop_privs()
 
+        elif os.getuid() != self._task.owner:
+            # started by root on behalf of the task owner
+            self._drop_privs()
+
         # fork the task runner
         self._task_runner.start()
 
@@ -359,6 +712,345 @@ class Focusd(object):
                 and self._task.active)
 
 
+class Supervisor(object):
+    """ Defines the resident, privileged focusd process that starts task
+        daemons on behalf of the users of the host.
+
+        Core plugins are imported once by the supervisor, so each task daemon
+        is forked from an already warm interpreter rather than shelling a new
+        ``focusd`` process through sudo. Each task daemon starts its command
+        server if root plugins need it, loads the task with the effective ids
+        of the task owner, and runs the ``task_prepare`` hooks before dropping
+        privileges to the task owner, like ``sudo focusd`` would.
+
+        Requests are served while task daemons start, so the response to a
+        client is only sent once its task daemon reports in.
+
+        `task_loader`
+            Callable that accepts a data directory path and returns the loaded
+            ``Task`` instance for the active task. This is only called within
+            the forked task daemon, so option hooks never run in the
+            supervisor itself.
+        `socket_path`
+            Path to unix socket to listen on. Default: ``SUPERVISOR_SOCKET``
+        `group`
+            Name of group allowed to send requests. Default: root only.
+        """
+
+    START_TIMEOUT = 10  # seconds to wait for a task daemon to start
+    CLIENT_TIMEOUT = 5  # seconds a client has to send its request
+    MAX_REQUEST_SIZE = 65536
+
+    def __init__(self, task_loader, socket_path=None, group=None):
+        self._exited = False
+        self._task_loader = task_loader
+        self._socket_path = socket_path or SUPERVISOR_SOCKET
+        self._group = group
+        self._socket = None
+        self._children = {}  # task daemon pid -> data dir
+        self._starting = {}  # ready pipe read fd -> (client conn, deadline)
+
+    def _reg_sighandlers(self):
+        """ Registers signal handlers to this class.
+            """
+
+        signal.signal(signal.SIGCHLD, lambda signo, frame: self._reap())
+        signal.signal(signal.SIGTERM, lambda signo, frame: self.shutdown())
+
+        # don't interrupt accept() and friends when task daemons exit
+        signal.siginterrupt(signal.SIGCHLD, False)
+
+    def _reap(self):
+        """ Reclaims exited task daemon processes.
+            """
+
+        for pid in self._children.keys():
+            try:
+                reaped, _ = os.waitpid(pid, os.WNOHANG)
+
+            except OSError:
+                reaped = pid  # not our child anymore
+
+            if reaped:
+                self._remove_scope(self._children.pop(pid))
+
+    def _remove_scope(self, data_dir):
+        """ Removes the cgroup scope for launched apps left by an exited task
+            daemon, along with the file recording its path.
+
+            `data_dir`
+                Home directory for focusd data.
+            """
+
+        filename = os.path.join(data_dir, cgroup.SCOPE_FILE)
+        path = common.readfile(filename)
+
+        if path and cgroup.remove_scope(path.strip()):
+            common.safe_remove_file(filename)
+
+    def _listen(self):
+        """ Creates the unix socket to accept requests on.
+            """
+
+        common.safe_remove_file(self._socket_path)  # stale socket
+
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(self._socket_path)
+        self._socket.listen(16)
+        self._socket.settimeout(1.0)
+
+        # open access to the provided group; otherwise, only root may send
+        # requests. requests are also authorized per data directory
+        if self._group:
+            os.chown(self._socket_path, 0, grp.getgrnam(self._group).gr_gid)
+            os.chmod(self._socket_path, 0660)  # rw-rw----
+        else:
+            os.chmod(self._socket_path, 0600)  # rw-------
+
+    def _peer_uid(self, conn):
+        """ Returns user identifier for the process connected to the provided
+            socket or ``None`` if it can't be determined.
+
+            `conn`
+                Connected ``socket`` object.
+            """
+
+        try:
+            creds = conn.getsockopt(socket.SOL_SOCKET, _SO_PEERCRED,
+                                    struct.calcsize('3i'))
+            _, uid, _ = struct.unpack('3i', creds)
+            return uid
+
+        except (socket.error, struct.error):
+            return None
+
+    def _handle_request(self, payload, uid):
+        """ Processes a request received from a client.
+
+            `payload`
+                Request payload string.
+            `uid`
+                User identifier of the requesting process.
+
+            Returns response string, or the file descriptor the started task
+            daemon reports through. See `_start_task`.
+            """
+
+        parts = payload.split('\x80')
+        _op = parts[0]
+
+        if _op == 'RUN' and len(parts) >= 2 and not uid is None:
+            data_dir = os.path.realpath(parts[1])
+
+            # the task daemon runs as the owner of the active file, so only
+            # that user (or root) may start it
+            try:
+                active_file = os.path.join(data_dir, '.active.cfg')
+                owner = os.stat(active_file).st_uid
+
+            except OSError:
+                return 'FAIL'
+
+            if uid != 0 and uid != owner:
+                return 'FAIL'
+
+            env = dict(x.split('=', 1) for x in parts[2:] if '=' in x)
+            env = dict((k, v) for k, v in env.iteritems()
+                       if k in _SUPERVISOR_ENV_KEYS)
+
+            read_fd = self._start_task(data_dir, owner, env)
+            if not read_fd is None:
+                return read_fd
+
+        return 'FAIL'
+
+    def _start_task(self, data_dir, owner, env):
+        """ Forks a task daemon for the active task in the provided data
+            directory.
+
+            `data_dir`
+                Home directory for focusd data.
+            `owner`
+                User identifier of the task owner, which the task daemon runs
+                as.
+            `env`
+                Dictionary of environment variables for the task daemon.
+
+            Returns read end file descriptor of the pipe the task daemon
+            reports its start through, or ``None`` if the fork failed.
+            """
+
+        read_fd, write_fd = os.pipe()
+
+        try:
+            pid = os.fork()
+
+        except OSError:
+            os.close(read_fd)
+            os.close(write_fd)
+            return False
+
+        if pid > 0:
+            os.close(write_fd)
+            self._children[pid] = data_dir
+            return read_fd
+
+        # task daemon process
+        code = 1
+
+        try:
+            os.close(read_fd)
+            self._socket.close()
+
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            os.environ.update(env)
+            os.setsid()
+
+            # the command server is forked while we're still root, and before
+            # any plugin code is loaded. it's the only process that keeps root
+            # privileges, serving commands for root plugins.
+            command_server = None
+
+            if _needs_command_server():
+                command_server = CommandServer(
+                    None, os.getpid(), multiprocessing.Pipe(duplex=True))
+                command_server.start()
+
+            # load task and its plugin options, with the files of the task
+            # owner accessed as the owner
+            task = _call_as_user(owner, self._task_loader, data_dir)
+
+            if task and task.active and task.owner == owner:
+                pid_file = get_daemon_pidfile(task)
+
+                if not os.path.isfile(pid_file):  # enforce pid lock file
+                    os.chdir(task.task_dir)
+
+                    cleanup = _register_pidfile(pid_file)
+                    _notify_ready(write_fd)
+
+                    # prepare hooks run as root, then privileges are dropped
+                    # to the task owner
+                    try:
+                        Focusd(task, command_server).run(False)
+                        code = 0
+
+                    finally:
+                        if cleanup:
+                            cleanup()
+
+        finally:
+            os._exit(code)
+
+    def _respond(self, conn, res):
+        """ Sends a response to a client and closes the connection.
+
+            `conn`
+                Connected ``socket`` object.
+            `res`
+                Response string.
+            """
+
+        try:
+            conn.settimeout(self.CLIENT_TIMEOUT)
+            conn.sendall(res)
+
+        except socket.error:
+            pass
+
+        finally:
+            conn.close()
+
+    def _accept(self):
+        """ Accepts and processes a single request. Responses for started
+            task daemons are deferred until they report in.
+            """
+
+        try:
+            conn, _ = self._socket.accept()
+
+        except socket.error:
+            return  # client went away
+
+        try:
+            uid = self._peer_uid(conn)
+            payload = _recv_all(conn, self.CLIENT_TIMEOUT,
+                                self.MAX_REQUEST_SIZE)
+
+        except socket.error:
+            conn.close()
+            return
+
+        res = self._handle_request(payload, uid)
+
+        if isinstance(res, basestring):
+            self._respond(conn, res)
+        else:
+            deadline = common.monotonic() + self.START_TIMEOUT
+            self._starting[res] = (conn, deadline)
+
+    def _serve(self):
+        """ Waits up to a second for a request or a starting task daemon to
+            report in, then processes whichever are pending.
+            """
+
+        now = common.monotonic()
+        timeout = 1.0
+
+        for _, deadline in self._starting.itervalues():
+            timeout = min(timeout, max(0, deadline - now))
+
+        try:
+            readable = select.select([self._socket] + self._starting.keys(),
+                                     [], [], timeout)[0]
+
+        except (select.error, socket.error) as exc:
+            # interrupted or socket closed during shutdown
+            if exc.args[0] == errno.EINTR or self._exited:
+                return
+            raise
+
+        # respond to clients whose task daemon reported in, or timed out
+        now = common.monotonic()
+        for read_fd, (conn, deadline) in self._starting.items():
+            if read_fd in readable or deadline <= now:
+                del self._starting[read_fd]
+                started = _wait_ready(read_fd, 0)
+                self._respond(conn, 'OK' if started else 'FAIL')
+
+        if self._socket in readable:
+            self._accept()
+
+    def run(self):
+        """ Setup supervisor and serve requests until shutdown.
+            """
+
+        self._listen()
+        self._reg_sighandlers()
+
+        while not self._exited:
+            self._serve()
+
+        self.shutdown()
+
+    def shutdown(self):
+        """ Shuts down the supervisor. Running task daemons are left alone.
+            """
+
+        if not self._exited:
+            self._exited = True
+
+            if self._socket:
+                self._socket.close()
+            common.safe_remove_file(self._socket_path)
+
+            for read_fd, (conn, _) in self._starting.items():
+                os.close(read_fd)
+                conn.close()
+            self._starting.clear()
+
+
 class TaskProcess(multiprocessing.Process):
     """ Defines the container process that handles running tasks.
 
@@ -379,6 +1071,16 @@ class TaskProcess(multiprocessing.Process):
         self._ppid = parent_pid
         self._sleep_period = 0.1  # 1/10 second
 
+        # back off the loop period while `_run` reports no activity
+        self._max_sleep_period = None  # disabled
+        self._idle_ticks = 5  # idle ticks before backing off
+        self._period = self._sleep_period
+        self._active = False  # set by `_run` when something happened
+
+        # loop measurements
+        self._lag_hist = telemetry.Histogram()
+        self._tick_hist = telemetry.Histogram()
+
     def _register_sigterm(self):
         """ Registers SIGTERM signal handler.
             """
@@ -394,20 +1096,75 @@ class TaskProcess(multiprocessing.Process):
     def _run(self):
         """ Override this for running during the main event loop.
 
-            Return ``False`` to end the main event loop.
+            Return ``False`` to end the main event loop. Set `_active` to
+            ``True`` to indicate something happened (which resets the loop
+            period).
             """
         pass
 
+    def _next_period(self, active, idle_ticks):
+        """ Determines the period until the next loop tick.
+
+            `active`
+                If something happened during the tick.
+            `idle_ticks`
+                Number of consecutive ticks without activity.
+
+            Returns float.
+            """
+
+        if (active or not self._max_sleep_period
+                or idle_ticks < self._idle_ticks):
+            return self._sleep_period
+
+        return min(self._period * 2, self._max_sleep_period)
+
+    def _tick(self, lag, duration):
+        """ Called after each loop tick, to record measurements.
+
+            `lag`
+                Time (seconds) the tick started past its scheduled time.
+            `duration`
+                Time (seconds) spent in `_run`.
+            """
+
+        self._lag_hist.add(lag)
+        self._tick_hist.add(duration)
+
+    def _wait(self, timeout):
+        """ Waits until the next loop tick.
+
+            `timeout`
+                Time (seconds) to wait.
+            """
+        time.sleep(timeout)
+
     def run(self):
-        """ Main process loop.
+        """ Main process loop. Ticks are scheduled against a monotonic
+            deadline, so time spent in `_run` doesn't stretch the period.
             """
 
         self._prepare()
 
+        idle_ticks = 0
+        deadline = common.monotonic()
+
         while self.running:
-            if self._run() is False:
+            self._active = False
+            start = common.monotonic()
+            result = self._run()
+            end = common.monotonic()
+
+            self._tick(max(0, start - deadline), end - start)
+            if result is False:
                 break
-            time.sleep(self._sleep_period)
+
+            idle_ticks = 0 if self._active else idle_ticks + 1
+            self._period = self._next_period(self._active, idle_ticks)
+
+            # skip ticks we've already missed, rather than bursting
+            deadline = max(deadline + self._period, end)
+            self._wait(max(0, deadline - common.monotonic()))
 
         self.shutdown()
 
@@ -418,7 +1175,8 @@ class TaskProcess(multiprocessing.Process):
         if not self._exited:
             self._exited = True
             _shutdown_pipe(self._pipe)
-            self._task.stop()
+            if self._task:
+                self._task.stop()
             raise SystemExit
 
     @property
@@ -441,6 +1199,13 @@ class TaskRunner(TaskProcess):
         self._cmd_pipe = self._pipe[0]
         self._rlock = multiprocessing.RLock()
         self._sleep_period = 1.0  # one second
+        self._max_sleep_period = 4.0
+        self._period = self._sleep_period
+
+        # write measurements for the `perf` command every so often
+        self._perf_file = get_daemon_perffile(self._task)
+        self._perf_period = 10.0
+        self._perf_written = None
 
         self._ran_taskstart = False
 
@@ -497,19 +1262,100 @@ class TaskRunner(TaskProcess):
 
         # run events
         event = 'task_end' if shutdown else 'task_run'
-        registration.run_event_hooks(event, self._task)
+        active = registration.run_event_hooks(event, self._task)
 
-        # reclaim any subprocesses plugins may have forked
-        try:
-            os.waitpid(-1, os.P_NOWAIT)
-        except OSError:
-            pass
+        # reclaim background processes plugins spawned that have exited
+        common.reap_children()
+
+        return active
+
+    def _register_sigchld(self):
+        """ Registers SIGCHLD signal handler, which reaps background processes
+            spawned by plugins as soon as they exit.
+            """
+
+        _handler = lambda signo, frame: common.reap_children()
+        signal.signal(signal.SIGCHLD, _handler)
+
+        # don't interrupt command pipe reads when children exit
+        signal.siginterrupt(signal.SIGCHLD, False)
+
+    def _get_watched(self):
+        """ Gets file descriptors watched by event plugins.
+
+            Returns dict of file descriptor -> ``Plugin`` instance.
+            """
+
+        watched = {}
+
+        for plugin in registration.get_registered(event_hooks=True):
+            if getattr(plugin, 'watch_fd', None) is not None:
+                watched[plugin.watch_fd] = plugin
+
+        return watched
+
+    def _next_period(self, active, idle_ticks):
+        """ Determines the period until the next loop tick. The period is
+            only backed off while every plugin running task_run events
+            watches a file descriptor, as the others poll on each tick.
+
+            `active`
+                If something happened during the tick.
+            `idle_ticks`
+                Number of consecutive ticks without activity.
+
+            Returns float.
+            """
+
+        for plugin in registration.get_registered(event_hooks=True):
+            if ('task_run' in (plugin.events or ())
+                    and getattr(plugin, 'watch_fd', None) is None):
+                return self._sleep_period
+
+        return super(TaskRunner, self)._next_period(active, idle_ticks)
+
+    def _wait(self, timeout):
+        """ Waits until the next loop tick, running task_run events for
+            plugins as soon as their watched file descriptors are readable.
+            Returns early when the task's total duration is reached, so the
+            task ends on time rather than on a later tick.
+            """
+
+        remaining = self._task.remaining
+        if remaining is not None:
+            timeout = max(0, min(timeout, remaining))
+
+        watched = self._get_watched()
+        if not watched or not self._ran_taskstart:
+            super(TaskRunner, self)._wait(timeout)
+            return
+
+        deadline = common.monotonic() + timeout
+
+        while True:
+            remaining = deadline - common.monotonic()
+            if remaining <= 0:
+                break
+
+            try:
+                ready = select.select(watched.keys(), [], [], remaining)[0]
+
+            except select.error as exc:
+                if exc.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            if ready:
+                plugins = [watched[fd] for fd in ready]
+                registration.run_event_hooks('task_run', self._task,
+                                             plugins=plugins)
 
     def _prepare(self):
         """ Setup initial requirements for daemon run.
             """
 
         super(TaskRunner, self)._prepare()
+        self._register_sigchld()
         self._setup_root_plugins()
 
         # set the default x-window display for non-mac systems
@@ -525,7 +1371,45 @@ class TaskRunner(TaskProcess):
             self.shutdown()
 
         else:
-            self._run_events()
+            self._active = self._run_events()
+
+    def _tick(self, lag, duration):
+        """ Records loop measurements and periodically writes them out.
+            """
+
+        super(TaskRunner, self)._tick(lag, duration)
+
+        now = common.monotonic()
+        if (self._perf_written is None
+                or now - self._perf_written >= self._perf_period):
+            self._perf_written = now
+            self._write_perf()
+
+    def _write_perf(self):
+        """ Writes snapshot of loop measurements and background process
+            activity for the `perf` command.
+            """
+
+        children = []
+        for child in common.get_children():
+            children.append({
+                'pid': child.pid,
+                'owner': child.owner,
+                'command': (child.command
+                            if isinstance(child.command, basestring)
+                            else ' '.join(child.command)),
+                'returncode': child.returncode,
+                'runtime': (child.ended or time.time()) - child.started
+            })
+
+        telemetry.write_snapshot(self._perf_file, {
+            'written': time.time(),
+            'sleep_period': self._sleep_period,
+            'period': self._period,
+            'lag': self._lag_hist,
+            'tick': self._tick_hist,
+            'children': children
+        })
 
     def shutdown(self, skip_hooks=False):
         """ Shuts down the process.
@@ -540,6 +1424,12 @@ class TaskRunner(TaskProcess):
             if not skip_hooks:
                 self._run_events(shutdown=True)
 
+            dispatch.drain_all(_DRAIN_TIMEOUT)
+
+            # end background processes scoped to the task
+            common.terminate_children(scoped=True)
+            common.safe_remove_file(self._perf_file)
+
             _shutdown_pipe(self._pipe)
             self._task.stop()
             raise SystemExit
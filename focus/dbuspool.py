@@ -0,0 +1,299 @@
+""" This module provides a shared DBus session bus connection, which caches
+    the proxy objects and interfaces resolved through it, so plugins talking
+    to the same services don't reconnect and introspect for every call.
+
+    Cached proxies are dropped when the bus disconnects, when the owner of
+    their bus name changes, or when a call through them fails.
+
+    The caches of a pool are locked, so it can be used from multiple
+    threads, but calls through its connection aren't serialized. Threads
+    that may be abandoned while calling (e.g. by
+    ``common.call_with_deadlines``) use a private pool instead, so a hung
+    call never holds up the shared connection, and the connection is closed
+    when the thread is done with it. See ``private_pool``.
+    """
+
+import threading
+import contextlib
+
+try:
+    import dbus
+    import dbus.bus
+    from dbus.exceptions import DBusException
+
+except ImportError:
+    dbus = None
+
+    class DBusException(Exception):
+        """ Stand-in for DBus errors, when DBus isn't available.
+            """
+        pass
+
+__all__ = ('DBusException', 'DBusPool', 'get_pool', 'private_pool')
+
+
+def _session_bus():
+    """ Opens a private session bus connection, so reconnecting doesn't
+        return a shared connection that has dropped.
+        """
+    return dbus.bus.BusConnection(dbus.bus.BUS_SESSION)
+
+
+class DBusPool(object):
+    """ Caches a bus connection and proxies per bus name, object path and
+        interface.
+
+        `bus_factory`
+            Callable returning a new bus connection. Defaults to the session
+            bus.
+        `interface_factory`
+            Callable taking a proxy object and interface name, returning the
+            interface proxy. Defaults to ``dbus.Interface``.
+
+        Example Usage::
+
+            >>> pool = DBusPool()
+            >>> pool.call('org.freedesktop.Notifications',
+            ...           '/org/freedesktop/Notifications',
+            ...           'org.freedesktop.Notifications', 'Notify',
+            ...           'Focus', 0, '', 'title', 'message', [], {}, 5)
+        """
+
+    def __init__(self, bus_factory=None, interface_factory=None):
+        if dbus:
+            bus_factory = bus_factory or _session_bus
+            interface_factory = interface_factory or dbus.Interface
+
+        self._bus_factory = bus_factory
+        self._interface_factory = interface_factory
+        self._bus = None
+        self._proxies = {}  # (bus name, path, interface) -> proxy
+        self._watches = {}  # bus name -> name owner watch
+        self._owners = {}  # bus name -> unique name of owner
+        self._lock = threading.RLock()
+
+    @property
+    def bus(self):
+        """ Returns bus connection, connecting again if it dropped.
+
+            * Raises ``DBusException`` if connection fails.
+            """
+
+        with self._lock:
+            if self._bus and not self._bus.get_is_connected():
+                self.close()
+
+            if not self._bus:
+                if not self._bus_factory:
+                    raise DBusException(u'DBus is not available')
+                self._bus = self._bus_factory()
+
+            return self._bus
+
+    def _watch(self, bus_name):
+        """ Invalidates proxies for a bus name when its owner changes. The
+            notification is only delivered while a main loop is running;
+            otherwise, proxies are invalidated when calls through them fail.
+            """
+
+        if bus_name in self._watches:
+            return
+
+        def _changed(owner):
+            # first notification reports current owner
+            if self._owners.setdefault(bus_name, owner) != owner:
+                self._owners[bus_name] = owner
+                self.invalidate(bus_name)
+
+        try:
+            self._watches[bus_name] = self.bus.watch_name_owner(bus_name,
+                                                                _changed)
+        except (DBusException, AttributeError, TypeError):
+            self._watches[bus_name] = None
+
+    def _get_proxy(self, bus_name, object_path, interface=None):
+        """ Gets a cached proxy, creating it if needed.
+
+            * Raises ``DBusException`` if the proxy can't be created.
+            """
+
+        key = (bus_name, object_path, interface)
+
+        with self._lock:
+            proxy = self._proxies.get(key)
+
+            if proxy is None:
+                if interface:
+                    obj = self._get_proxy(bus_name, object_path)
+                    proxy = self._interface_factory(obj, interface)
+                else:
+                    proxy = self.bus.get_object(bus_name, object_path)
+                    self._watch(bus_name)
+
+                self._proxies[key] = proxy
+
+        return proxy
+
+    def has_owner(self, bus_name):
+        """ Determines if a bus name is owned, i.e. its service is running.
+
+            `bus_name`
+                Name of the bus interface.
+
+            Returns boolean.
+            """
+
+        try:
+            return bool(self.bus.name_has_owner(bus_name))
+
+        except DBusException:
+            return False
+
+    def get_object(self, bus_name, object_path):
+        """ Gets proxy object.
+
+            `bus_name`
+                Name of the bus interface.
+            `object_path`
+                Object path related to the interface.
+
+            Returns object or ``None``.
+            """
+
+        try:
+            return self._get_proxy(bus_name, object_path)
+        except DBusException:
+            return None
+
+    def get_interface(self, bus_name, object_path, interface):
+        """ Gets interface proxy object.
+
+            `bus_name`
+                Name of the bus interface.
+            `object_path`
+                Object path related to the interface.
+            `interface`
+                Name of the interface.
+
+            Returns object or ``None``.
+            """
+
+        try:
+            return self._get_proxy(bus_name, object_path, interface)
+        except DBusException:
+            return None
+
+    def call(self, bus_name, object_path, interface, method, *args,
+             **kwargs):
+        """ Calls a method on an interface, retrying once with new proxies
+            if the call fails, as the service may have restarted.
+
+            `bus_name`
+                Name of the bus interface.
+            `object_path`
+                Object path related to the interface.
+            `interface`
+                Name of the interface.
+            `method`
+                Method name.
+            `args`
+                Method arguments.
+            `kwargs`
+                Keyword arguments for the proxy method (e.g. ``timeout``).
+
+            Returns method result.
+
+            * Raises ``DBusException`` if the call fails again.
+            """
+
+        for attempt in (0, 1):
+            try:
+                proxy = self._get_proxy(bus_name, object_path, interface)
+                return getattr(proxy, method)(*args, **kwargs)
+
+            except DBusException:
+                self.invalidate(bus_name)
+                if attempt:
+                    raise
+
+    def invalidate(self, bus_name=None):
+        """ Drops cached proxies.
+
+            `bus_name`
+                Bus name to drop proxies for. Defaults to all.
+            """
+
+        with self._lock:
+            for key in self._proxies.keys():
+                if bus_name is None or key[0] == bus_name:
+                    del self._proxies[key]
+
+    def close(self):
+        """ Drops cached proxies and closes the bus connection.
+            """
+
+        with self._lock:
+            self.invalidate()
+
+            for watch in self._watches.values():
+                if watch is not None:
+                    try:
+                        watch.cancel()
+                    except (DBusException, AttributeError):
+                        pass
+            self._watches.clear()
+            self._owners.clear()
+
+            if self._bus:
+                try:
+                    self._bus.close()
+                except (DBusException, AttributeError):
+                    pass
+                self._bus = None
+
+
+_pool = None
+_local = threading.local()  # private pool of current thread, if any
+
+
+def get_pool():
+    """ Returns the ``DBusPool`` instance for the current thread, which is
+        its private pool while one is in use; otherwise, the shared pool.
+        """
+
+    global _pool
+
+    pool = getattr(_local, 'pool', None)
+    if pool:
+        return pool
+
+    if not _pool:
+        _pool = DBusPool()
+
+    return _pool
+
+
+@contextlib.contextmanager
+def private_pool():
+    """ Uses a private pool, with its own connection, for the current thread
+        until the context exits, when its connection is closed. Connections
+        are made the same way as the shared pool's.
+
+        Returns ``DBusPool`` instance.
+        """
+
+    pool = getattr(_local, 'pool', None)
+    if pool:
+        yield pool  # already private
+        return
+
+    shared = get_pool()
+    pool = DBusPool(shared._bus_factory, shared._interface_factory)
+    _local.pool = pool
+
+    try:
+        yield pool
+
+    finally:
+        _local.pool = None
+        pool.close()
@@ -0,0 +1,182 @@
+""" This module provides background delivery of messages (e.g. notifications)
+    for plugins, so event hooks return without waiting on slow backends.
+
+    Pending messages are kept in a bounded queue, where a message replaces
+    any pending message with the same key. Failed deliveries are retried with
+    backoff, and delivery latency is recorded. The task daemon drains all
+    dispatchers, within a deadline, before it exits.
+    """
+
+import os
+import time
+import weakref
+import threading
+
+from focus import common, telemetry
+
+__all__ = ('Dispatcher', 'drain_all')
+
+
+_dispatchers = weakref.WeakSet()  # live ``Dispatcher`` instances
+
+
+class Dispatcher(object):
+    """ Delivers messages in a background thread.
+
+        `send`
+            Function called with the arguments of each message. Exceptions
+            raised are treated as transient failures.
+        `max_size`
+            Maximum number of pending messages. The oldest pending message is
+            dropped when full.
+        `retries`
+            Number of times a failed delivery is retried.
+        `backoff`
+            Seconds to wait before the first retry, doubled for each retry.
+        `max_backoff`
+            Maximum seconds to wait between retries.
+
+        Example Usage::
+
+            >>> dispatcher = Dispatcher(send_notification)
+            >>> dispatcher.submit('task', 'Focus (task)', 'Started')
+            >>> dispatcher.drain(2.0)
+        """
+
+    def __init__(self, send, max_size=16, retries=3, backoff=0.5,
+                 max_backoff=4.0):
+        self.send = send
+        self.max_size = max_size
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.latency = telemetry.Histogram()
+        self.delivered = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self._order = []  # keys, oldest first
+        self._messages = {}  # key -> (args, submitted)
+        self._busy = False
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+
+        _dispatchers.add(self)
+
+    def _start(self):
+        """ Starts the delivery thread, if not running in this process.
+            Threads don't survive a fork, so a dispatcher created before the
+            task daemon forks starts its thread on first use.
+            """
+
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._busy = False
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def submit(self, key, *args):
+        """ Queues a message for delivery, replacing any pending message with
+            the same key.
+
+            `key`
+                Message key.
+            `args`
+                Arguments for the send function.
+            """
+
+        with self._cond:
+            if key in self._messages:
+                self._order.remove(key)  # superseded
+
+            elif len(self._order) >= self.max_size:
+                del self._messages[self._order.pop(0)]
+                self.dropped += 1
+
+            self._order.append(key)
+            self._messages[key] = (args, common.monotonic())
+            self._start()
+            self._cond.notify_all()
+
+    def _deliver(self, args):
+        """ Calls send function, retrying with backoff.
+
+            Returns boolean.
+            """
+
+        delay = self.backoff
+
+        for attempt in xrange(self.retries + 1):
+            try:
+                self.send(*args)
+                return True
+
+            except Exception:
+                if attempt < self.retries:
+                    time.sleep(delay)
+                    delay = min(delay * 2, self.max_backoff)
+
+        return False
+
+    def _run(self):
+        """ Delivers pending messages, oldest first.
+            """
+
+        while True:
+            with self._cond:
+                while not self._order:
+                    self._busy = False
+                    self._cond.notify_all()
+                    self._cond.wait()
+
+                key = self._order.pop(0)
+                args, submitted = self._messages.pop(key)
+                self._busy = True
+
+            if self._deliver(args):
+                self.delivered += 1
+                self.latency.add(common.monotonic() - submitted)
+            else:
+                self.failed += 1
+
+    def drain(self, timeout):
+        """ Waits until pending messages are delivered.
+
+            `timeout`
+                Maximum seconds to wait.
+
+            Returns ``True`` if all messages were delivered or failed.
+            """
+
+        deadline = common.monotonic() + timeout
+
+        with self._cond:
+            while self._order or self._busy:
+                remaining = deadline - common.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+
+        return True
+
+
+def drain_all(timeout):
+    """ Waits until pending messages of all dispatchers are delivered.
+
+        `timeout`
+            Maximum seconds to wait in total.
+
+        Returns ``True`` if all messages were delivered or failed.
+        """
+
+    deadline = common.monotonic() + timeout
+    drained = True
+
+    for dispatcher in list(_dispatchers):
+        if not dispatcher.drain(max(0, deadline - common.monotonic())):
+            drained = False
+
+    return drained
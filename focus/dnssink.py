@@ -0,0 +1,487 @@
+""" This module provides a small DNS responder that answers queries for blocked
+    domains, and any of their subdomains, with an unroutable address and
+    forwards all other queries to an upstream name server.
+
+    The responder runs in its own thread, so queries are answered while the
+    task daemon is busy with other plugins.
+    """
+
+import os
+import errno
+import socket
+import select
+import struct
+import threading
+
+from focus import common
+
+__all__ = ('DomainTrie', 'DnsSinkhole', 'get_nameservers', 'is_serving')
+
+
+_HEADER = struct.Struct('!HHHHHH')  # id, flags, qd, an, ns, ar counts
+_QUESTION = struct.Struct('!HH')  # type, class
+_ANSWER = struct.Struct('!HHHIH')  # name pointer, type, class, ttl, length
+
+_FLAG_QR = 0x8000
+_FLAG_RD = 0x0100
+_FLAG_RA = 0x0080
+_OPCODE_MASK = 0x7800
+_RCODE_SERVFAIL = 2
+
+_TYPE_A = 1
+_TYPE_AAAA = 28
+_CLASS_IN = 1
+
+_BLOCK_TTL = 5  # seconds, so unblocked names recover quickly
+_FORWARD_TIMEOUT = 5.0  # seconds to wait for upstream response
+_MAX_PACKETS = 256  # packets handled per call to `process`
+_RECV_SIZE = 4096
+_PROBE_TIMEOUT = 0.5  # seconds to wait for a responder to answer a probe
+
+
+def get_nameservers(filename='/etc/resolv.conf'):
+    """ Gets name server addresses from resolver configuration.
+
+        `filename`
+            Resolver configuration filename.
+
+        Returns list of address strings.
+        """
+
+    servers = []
+
+    for line in (common.readfile(filename) or '').splitlines():
+        parts = line.split('#', 1)[0].split()
+        if len(parts) > 1 and parts[0] == 'nameserver':
+            servers.append(parts[1])
+
+    return servers
+
+
+def is_serving(address, timeout=_PROBE_TIMEOUT):
+    """ Determines if a name server is answering queries at an address, by
+        sending it a query for the root name servers.
+
+        `address`
+            Tuple (host, port) of name server.
+        `timeout`
+            Seconds to wait for a response.
+
+        Returns ``False`` if nothing is listening at the address; ``True``
+        otherwise, including when the name server is too slow to respond.
+        """
+
+    query = (_HEADER.pack(struct.unpack('!H', os.urandom(2))[0], _FLAG_RD,
+                          1, 0, 0, 0) + '\x00' + _QUESTION.pack(2, _CLASS_IN))
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    try:
+        sock.settimeout(timeout)
+        sock.connect(address)
+        sock.send(query)
+        sock.recv(_RECV_SIZE)
+        return True
+
+    except socket.timeout:
+        return True
+
+    except socket.error:
+        return False  # port unreachable
+
+    finally:
+        sock.close()
+
+
+class DomainTrie(object):
+    """ Set of domains, matched by label from the top-level domain down, so a
+        name matches if it or any parent domain was added.
+
+        `domains`
+            Iterable of domains.
+        """
+
+    def __init__(self, domains=()):
+        self._root = {}
+        self.count = 0
+
+        for domain in domains:
+            self.add(domain)
+
+    def add(self, domain):
+        """ Adds a domain.
+
+            `domain`
+                Domain name (e.g. 'example.com').
+            """
+
+        node = self._root
+
+        for label in reversed(domain.lower().strip('.').split('.')):
+            node = node.setdefault(label, {})
+
+        if not '' in node:
+            node[''] = True  # labels are never empty
+            self.count += 1
+
+    def matches(self, name):
+        """ Determines if a name is, or is a subdomain of, an added domain.
+
+            `name`
+                Domain name.
+
+            Returns boolean.
+            """
+
+        node = self._root
+
+        for label in reversed(name.lower().rstrip('.').split('.')):
+            node = node.get(label)
+            if node is None:
+                return False
+            if '' in node:
+                return True
+
+        return False
+
+
+def _parse_question(packet):
+    """ Parses the question of a DNS query.
+
+        `packet`
+            Query packet data.
+
+        Returns tuple (name, type, end offset of question) or ``None`` if the
+        packet is invalid.
+        """
+
+    offset = _HEADER.size
+    labels = []
+
+    try:
+        while True:
+            length = ord(packet[offset])
+            offset += 1
+
+            if not length:
+                break
+            if length & 0xc0:
+                return None  # compression isn't used in questions
+
+            labels.append(packet[offset:offset + length])
+            offset += length
+
+        qtype = _QUESTION.unpack_from(packet, offset)[0]
+
+    except (IndexError, struct.error):
+        return None
+
+    return '.'.join(labels), qtype, offset + _QUESTION.size
+
+
+def _make_response(packet, qtype, end, rcode=0, answer=True):
+    """ Builds a response for a query.
+
+        `packet`
+            Query packet data.
+        `qtype`
+            Query type.
+        `end`
+            End offset of question in query.
+        `rcode`
+            Response code.
+        `answer`
+            Set to ``False`` to omit the unroutable address answer.
+
+        Returns response packet data.
+        """
+
+    ident, flags = _HEADER.unpack_from(packet)[:2]
+    flags = (_FLAG_QR | _FLAG_RA | (flags & (_OPCODE_MASK | _FLAG_RD))
+             | rcode)
+
+    rdata = None
+    if answer and qtype == _TYPE_A:
+        rdata = socket.inet_aton('0.0.0.0')
+    elif answer and qtype == _TYPE_AAAA:
+        rdata = '\x00' * 16
+
+    response = _HEADER.pack(ident, flags, 1, 1 if rdata else 0, 0, 0)
+    response += packet[_HEADER.size:end]
+
+    if rdata:
+        response += _ANSWER.pack(0xc000 | _HEADER.size, qtype, _CLASS_IN,
+                                 _BLOCK_TTL, len(rdata)) + rdata
+
+    return response
+
+
+class DnsSinkhole(object):
+    """ UDP DNS responder that blocks domains.
+
+        `address`
+            Tuple (host, port) to listen on.
+        `upstream`
+            Tuple (host, port) of name server to forward other queries to.
+            Only IPv4 addresses are supported.
+
+        Example Usage::
+
+            >>> sinkhole = DnsSinkhole(('127.0.0.153', 53), ('8.8.8.8', 53))
+            >>> sinkhole.open()
+            >>> sinkhole.set_domains(['example.com'])
+            >>> sinkhole.start()
+            >>> sinkhole.close()
+        """
+
+    def __init__(self, address, upstream):
+        self.address = address
+        self.upstream = upstream
+        self._sock = None
+        self._upstream_sock = None  # unbound, so it can reach any address
+        self._trie = DomainTrie()
+        self._pending = {}  # forwarded id -> (client id, client, expires)
+        self._next_id = struct.unpack('!H', os.urandom(2))[0]
+        self._thread = None
+        self._pid = None
+        self._wakeup = None  # pipe (read fd, write fd) to stop thread
+
+    def open(self):
+        """ Binds the listening socket. Binding port 53 requires root
+            privileges, though the socket can be used after privileges are
+            dropped.
+
+            Returns boolean.
+            """
+
+        if self._sock:
+            return True
+
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(self.address)
+            sock.setblocking(False)
+
+        except socket.error:
+            return False
+
+        # queries are forwarded from a separate socket, as one bound to a
+        # loopback address can't send to other hosts
+        try:
+            upstream_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            upstream_sock.setblocking(False)
+
+        except socket.error:
+            sock.close()
+            return False
+
+        self._sock = sock
+        self._upstream_sock = upstream_sock
+        self.address = sock.getsockname()
+        return True
+
+    def start(self):
+        """ Starts the thread that answers queries, if not running in this
+            process. Threads don't survive a fork, so a responder opened
+            before the task daemon forks starts its thread on first use.
+            """
+
+        if not self._sock:
+            return
+
+        if (self._pid != os.getpid() or not self._thread
+                or not self._thread.is_alive()):
+            self._stop()
+            self._pid = os.getpid()
+            self._wakeup = os.pipe()
+            self._thread = threading.Thread(target=self._run,
+                                            args=(self._wakeup[0],))
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self, wakeup_fd):
+        """ Answers queries until the responder is closed.
+
+            `wakeup_fd`
+                Read end of pipe written to when closed.
+            """
+
+        socks = [self._sock, self._upstream_sock]
+
+        while True:
+            try:
+                ready = select.select(socks + [wakeup_fd], [], [])[0]
+            except (select.error, socket.error) as exc:
+                if exc.args[0] == errno.EINTR:
+                    continue
+                break
+
+            if wakeup_fd in ready:
+                break
+
+            self.process()
+
+    def _stop(self):
+        """ Stops the thread that answers queries, if running in this
+            process.
+            """
+
+        if self._wakeup:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                os.write(self._wakeup[1], '\x00')
+                self._thread.join()
+
+            for fd in self._wakeup:
+                os.close(fd)
+
+        self._thread = self._wakeup = None
+
+    def close(self):
+        """ Stops answering queries and closes the sockets.
+            """
+
+        self._stop()
+
+        if self._sock:
+            self._sock.close()
+            self._upstream_sock.close()
+            self._sock = self._upstream_sock = None
+            self._pending.clear()
+
+    def fileno(self):
+        """ Returns listening socket file descriptor.
+            """
+        return self._sock.fileno() if self._sock else None
+
+    def set_domains(self, domains):
+        """ Replaces the blocked domains. Queries are answered with the
+            previous domains until the new set is built.
+
+            `domains`
+                Iterable of domains.
+            """
+        self._trie = DomainTrie(domains)
+
+    def is_blocked(self, name):
+        """ Determines if a name is blocked.
+
+            `name`
+                Domain name.
+
+            Returns boolean.
+            """
+        return self._trie.matches(name)
+
+    def _forward(self, packet, client):
+        """ Forwards a query to the upstream name server.
+
+            `packet`
+                Query packet data.
+            `client`
+                Address of client to relay response to.
+            """
+
+        # replace query id, as ids of different clients may collide
+        for i in range(0x10000):
+            self._next_id = (self._next_id + 1) & 0xffff
+            if not self._next_id in self._pending:
+                break
+
+        ident = _HEADER.unpack_from(packet)[0]
+        self._pending[self._next_id] = (ident, client,
+                                        common.monotonic() + _FORWARD_TIMEOUT)
+        self._upstream_sock.sendto(struct.pack('!H', self._next_id) +
+                                   packet[2:], self.upstream)
+
+    def _relay(self, packet, addr):
+        """ Relays an upstream response to the client that queried, matched
+            by the forwarded query id.
+
+            `packet`
+                Response packet data.
+            `addr`
+                Address of sender.
+            """
+
+        if (len(packet) < _HEADER.size or addr != self.upstream
+                or not _HEADER.unpack_from(packet)[1] & _FLAG_QR):
+            return
+
+        entry = self._pending.pop(_HEADER.unpack_from(packet)[0], None)
+        if entry:
+            ident, client = entry[:2]
+            self._sock.sendto(struct.pack('!H', ident) + packet[2:], client)
+
+    def _handle(self, packet, addr):
+        """ Handles a received query.
+
+            `packet`
+                Packet data.
+            `addr`
+                Address of sender.
+            """
+
+        if len(packet) < _HEADER.size:
+            return
+
+        if _HEADER.unpack_from(packet)[1] & _FLAG_QR:
+            return  # not a query
+
+        question = _parse_question(packet)
+        if not question:
+            return
+
+        name, qtype, end = question
+
+        if self._trie.matches(name):
+            self._sock.sendto(_make_response(packet, qtype, end), addr)
+            return
+
+        try:
+            self._forward(packet, addr)
+        except socket.error:
+            self._sock.sendto(_make_response(packet, qtype, end,
+                                             rcode=_RCODE_SERVFAIL,
+                                             answer=False), addr)
+
+    def process(self):
+        """ Handles pending queries and upstream responses, without
+            blocking.
+
+            Returns number of packets handled.
+            """
+
+        if not self._sock:
+            return 0
+
+        count = 0
+
+        for sock, handle in ((self._upstream_sock, self._relay),
+                             (self._sock, self._handle)):
+            handled = 0
+
+            while handled < _MAX_PACKETS:
+                try:
+                    packet, addr = sock.recvfrom(_RECV_SIZE)
+
+                except socket.error as exc:
+                    if exc.args[0] == errno.EINTR:
+                        continue
+                    break  # EAGAIN, or ICMP error from a previous send
+
+                handled += 1
+
+                try:
+                    handle(packet, addr)
+                except socket.error:
+                    pass
+
+            count += handled
+
+        # forget queries upstream never answered
+        now = common.monotonic()
+        for ident, entry in self._pending.items():
+            if entry[2] < now:
+                del self._pending[ident]
+
+        return count
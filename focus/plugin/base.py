@@ -80,6 +80,10 @@ class Plugin(object):
     #: Event Hooks (tuple,list): List of strings.
     #:                           Required, if 'command' not set.
     #:
+    #:   task_prepare - Calls `on_taskprepare` method when the task daemon
+    #:                starts, before it drops root privileges (if it has
+    #:                them). This allows privileged resources to be opened.
+    #:
     #:   task_start - Calls `on_taskstart` method when a new task is started.
     #:
     #:   task_run   - Calls `on_taskrun` method during the main program loop
@@ -121,6 +125,13 @@ class Plugin(object):
     #:
     task_only = False
 
+    #: Watched File Descriptor (integer): Set by event plugins hooking the
+    #: 'task_run' event, typically from `on_taskprepare`. The `on_taskrun`
+    #: method is called as soon as the descriptor is readable, in addition to
+    #: the main program loop.
+    #:
+    watch_fd = None
+
     #--------------------------
     #: Class Utilities
     #--------------------------
@@ -134,6 +145,15 @@ class Plugin(object):
     #: Event Hook Specifics
     #--------------------------
 
+    def on_taskprepare(self, task):
+        """ Event hook that is called when the task daemon starts, before
+            root privileges are dropped.
+
+            `task`
+                ``Task`` instance.
+            """
+        pass
+
     def on_taskstart(self, task):
         """ Event hook that is called upon start of a task.
 
@@ -152,6 +172,9 @@ class Plugin(object):
             Note, this method is called in a chain of plugins, so cpu-intensive
             processing should be yielded to another thread of execution so
             other plugins aren't negatively affected.
+
+            Return ``True`` if something was acted upon. While no plugin
+            reports activity, the main event loop gradually runs less often.
             """
         pass
 
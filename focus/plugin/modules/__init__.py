@@ -4,6 +4,6 @@ This package contains all the plugin modules that ship with the system.
 
 # import all the modules
 from focus.plugin.modules import (
-    apps, im, notify, sites,
+    apps, im, notify, perf, sites,
     sounds, stats, tasks, timer
 )
@@ -5,20 +5,45 @@
         - Starting applications at task start.
         - Closing applications at task start.
         - Blocking applications during an active task.
+        - Launching applications into a task cgroup, to end them together.
     """
 
 import os
 import time
-import psutil
+import signal
+import socket
 import hashlib
 
-from focus import common
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+from focus import cgroup, common, procevents, procscan
 from focus.plugin import base
 
 __all__ = ('AppRun', 'AppClose', 'AppBlock')
 
 
-_process_checksums = {}  # cache for `_stop_processes`
+_FAST_CHECKSUM_MIN_SIZE = 8 * 1024 * 1024  # smaller files are fully hashed
+_FAST_CHECKSUM_SAMPLES = 32
+_FAST_CHECKSUM_CHUNK = 64 * 1024
+
+_READY_CONDITIONS = ('alive', 'window', 'port', 'file')
+_READY_TIMEOUT = 10.0  # default seconds to wait for a launched app
+_READY_POLL_PERIOD = 0.05
+_ALIVE_SETTLE = 0.2  # seconds an app must stay running to be 'alive'
+_TRACKER_RETRY_CALLS = 10  # scans between retrying uninspected processes
+
+_checksum_mode = 'full'  # 'full' or 'fast', see `_get_checksum`
+_close_grace = 2.0  # seconds closed apps have to exit before being killed
+_match_cmdline = False  # read command-lines, for 'cmd:' match rules
+_tracked_processes = {}  # (pid, start time) -> (info, path) or ``None``
+_tracked_pids = {}  # pid -> start time, for tracked processes
+_last_pid = None  # last process identifier allocated, as of last scan
+_tracker_calls = 0  # scans since processes not inspected were retried
+_task_scope = None  # ``cgroup.TaskScope`` for launched apps
+_scope_close_keys = set()  # task end keys ('end', 'timer') closing apps
 
 
 def _get_process_cwd(pid):
@@ -47,11 +72,14 @@ def _get_process_cwd(pid):
     return None
 
 
-def _get_checksum(path):
+def _get_checksum(path, fast=False):
     """ Generates a md5 checksum of the file at the specified path.
 
         `path`
             Path to file for checksum.
+        `fast`
+            Set to ``True`` to only hash evenly spaced samples of large files,
+            along with the file size.
 
         Returns string or ``None``
         """
@@ -62,88 +90,605 @@ def _get_checksum(path):
 
     try:
         with open(path, 'rb') as _file:
+            size = os.fstat(_file.fileno()).st_size
+
+            if fast and size >= _FAST_CHECKSUM_MIN_SIZE:
+                _md5.update(str(size))
+                step = max(0, size - _FAST_CHECKSUM_CHUNK) // (
+                    _FAST_CHECKSUM_SAMPLES - 1)
+
+                for i in range(_FAST_CHECKSUM_SAMPLES):
+                    _file.seek(i * step)
+                    _md5.update(_file.read(_FAST_CHECKSUM_CHUNK))
+
+                return 'fast:' + _md5.hexdigest()
+
             for chunk in iter(lambda: _file.read(chunk_size), ''):
                 _md5.update(chunk)
         return _md5.hexdigest()
 
-    except IOError:
+    except (IOError, OSError):
+        return None
+
+
+class _ChecksumCache(object):
+    """ Least-recently used cache of executable checksums, keyed by file
+        identity: (device, inode, size, modification time). An upgraded
+        binary gets a new identity, so stale checksums are never used.
+
+        The cache can be persisted, so checksums of large binaries are
+        reused across tasks.
+
+        `max_entries`
+            Maximum number of checksums to keep.
+        """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.filename = None
+        self._entries = {}  # identity -> [checksum, last used]
+        self._clock = 0
+        self._dirty = False
+
+    def _identity(self, path, fast):
+        """ Gets identity key for file.
+
+            Returns string or ``None`` if file doesn't exist.
+            """
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        # python 2 has no st_mtime_ns; microseconds survive the float
+        return '{0}:{1}:{2}:{3}:{4}'.format(
+            stat.st_dev, stat.st_ino, stat.st_size,
+            int(round(stat.st_mtime * 1000000)), 'fast' if fast else 'full')
+
+    def get(self, path, fast=False):
+        """ Gets checksum for file, generating it if not cached.
+
+            `path`
+                Path to file for checksum.
+            `fast`
+                Set to ``True`` for fast sampled checksums.
+
+            Returns string or ``None``.
+            """
+
+        key = self._identity(path, fast)
+        if key is None:
+            return None
+
+        self._clock += 1
+        entry = self._entries.get(key)
+
+        if entry:
+            entry[1] = self._clock
+            return entry[0]
+
+        checksum = _get_checksum(path, fast)
+        if checksum is None:
+            return None
+
+        self._entries[key] = [checksum, self._clock]
+        self._dirty = True
+
+        # evict least-recently used, a batch at a time
+        if len(self._entries) > self.max_entries:
+            count = len(self._entries) - self.max_entries * 9 // 10
+            oldest = sorted(self._entries.iteritems(),
+                            key=lambda item: item[1][1])[:count]
+            for key, _ in oldest:
+                del self._entries[key]
+
+        return checksum
+
+    def load(self, filename):
+        """ Loads persisted checksums, replacing cached checksums.
+
+            `filename`
+                Cache filename.
+            """
+
+        self.filename = filename
+        self._entries = {}
+        self._clock = 0
+        self._dirty = False
+
+        try:
+            data = json.loads(common.readfile(filename) or '{}')
+            for key, (checksum, last_used) in data.iteritems():
+                self._entries[key] = [checksum, int(last_used)]
+                self._clock = max(self._clock, int(last_used))
+
+        except (ValueError, TypeError, AttributeError):
+            self._entries = {}
+
+    def save(self):
+        """ Persists checksums, if any were added since loaded.
+
+            Returns boolean.
+            """
+
+        if not self.filename or not self._dirty:
+            return False
+
+        cache_dir = os.path.dirname(self.filename)
+
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+        except OSError:
+            return False
+
+        temp_file = '{0}.tmp'.format(self.filename)
+
+        if not common.writefile(temp_file, json.dumps(self._entries)):
+            return False
+
+        try:
+            os.rename(temp_file, self.filename)
+
+        except OSError:
+            common.safe_remove_file(temp_file)
+            return False
+
+        self._dirty = False
+        return True
+
+_checksums = _ChecksumCache()
+
+
+def _setup_checksum_cache(task):
+    """ Loads the persisted checksum cache for the task's data directory, if
+        not already loaded.
+
+        `task`
+            ``Task`` instance.
+        """
+
+    filename = os.path.join(task.base_dir, '.cache', 'app_checksums.json')
+    if _checksums.filename != filename:
+        _checksums.load(filename)
+
+
+def _inspect_process(pid, uid):
+    """ Inspects a process, determining if it's owned by the user and the
+        path to its executable.
+
+        `pid`
+            System process identifier.
+        `uid`
+            User identifier.
+
+        Returns tuple (``ProcessInfo`` instance, path) or ``None`` if the
+        process isn't owned by the user.
+        """
+
+    info = procscan.read_process(pid, uid, cmdline=_match_cmdline)
+    if not info:
         return None
 
+    path = info.exe
+
+    if not path:
+        # work around for suid/sguid processes and MacOS X restrictions
+        path = common.which(info.name)
+
+        # psutil doesn't support MacOS X relative paths,
+        # let's use a workaround to merge working directory with
+        # process relative path
+        if not path and common.IS_MACOSX:
+            cwd = _get_process_cwd(pid)
+            info = procscan.read_process(pid, uid, cmdline=True)
+            if not cwd or not info or not info.cmdline:
+                return None
+            path = os.path.join(cwd, info.cmdline[0])
+
+    return (info, path)
+
 
 def _get_user_processes():
     """ Gets process information owned by the current user.
 
-        Returns generator of tuples: (``psutil.Process`` instance, path).
+        Processes are tracked between calls by (pid, start time), so only
+        processes started since the last call are fully inspected. A tracked
+        process identifier is only checked again if the kernel has allocated
+        identifiers past it since, as it may have been reused. Tracked user
+        processes are inspected again if they executed another program, and
+        processes that couldn't be inspected are retried every
+        ``_TRACKER_RETRY_CALLS`` calls.
+
+        Returns generator of tuples: (``ProcessInfo`` instance, path).
         """
 
+    global _last_pid, _tracker_calls
+
     uid = os.getuid()
+    pids = procscan.get_pids()
+    last_pid, prior_pid = procscan.get_last_pid(), _last_pid
+    _last_pid = last_pid
 
-    for proc in psutil.process_iter():
-        try:
-            # yield processes that match current user
-            if proc.uids.real == uid:
-                yield (proc, proc.exe)
+    _tracker_calls += 1
+    retry = _tracker_calls >= _TRACKER_RETRY_CALLS
+    if retry:
+        _tracker_calls = 0
 
-        except psutil.AccessDenied:
-            # work around for suid/sguid processes and MacOS X restrictions
-            try:
-                path = common.which(proc.name)
+    def _maybe_reused(pid):
+        """ Determines if identifier was allocated again since last call.
+            """
+        if last_pid is None or prior_pid is None:
+            return True  # can't tell
+        if last_pid >= prior_pid:
+            return prior_pid < pid <= last_pid
+        return pid > prior_pid or pid <= last_pid  # wrapped around
 
-                # psutil doesn't support MacOS X relative paths,
-                # let's use a workaround to merge working directory with
-                # process relative path
-                if not path and common.IS_MACOSX:
-                    cwd = _get_process_cwd(proc.pid)
-                    if not cwd:
-                        continue
-                    path = os.path.join(cwd, proc.cmdline[0])
+    # forget processes that have exited
+    for pid in set(_tracked_pids) - pids:
+        del _tracked_processes[(pid, _tracked_pids.pop(pid))]
 
-                yield (proc, path)
+    for pid in pids:
+        start_time = _tracked_pids.get(pid)
 
-            except (psutil.AccessDenied, OSError):
-                pass
+        if start_time is not None and _maybe_reused(pid):
+            if procscan.get_start_time(pid) != start_time:
+                del _tracked_processes[(pid, _tracked_pids.pop(pid))]
+                start_time = None
+
+        # new process
+        if start_time is None:
+            start_time = procscan.get_start_time(pid)
+            if start_time is None:
+                continue  # exited
+
+            _tracked_pids[pid] = start_time
+            _tracked_processes[(pid, start_time)] = _inspect_process(pid,
+                                                                     uid)
+
+        key = (pid, start_time)
+        entry = _tracked_processes[key]
+
+        if entry is None:
+            if retry:  # e.g. changed owner, or was exiting
+                entry = _tracked_processes[key] = _inspect_process(pid, uid)
+
+        # executed another program in place, same pid and start time
+        elif entry[0].exe:
+            exe = procscan.get_exe(pid)
+            if exe and exe != entry[0].exe:
+                entry = _tracked_processes[key] = _inspect_process(pid, uid)
+
+        if entry:
+            yield entry
+
+
+def _get_exec_processes(pids):
+    """ Gets process information owned by the current user, for processes
+        that have just executed a program.
+
+        `pids`
+            List of system process identifiers.
 
-        except psutil.NoSuchProcess:
-            pass
+        Returns generator of tuples: (``ProcessInfo`` instance, path).
+        """
+
+    uid = os.getuid()
+
+    for pid in set(pids):
+        info = _inspect_process(pid, uid)
+        if info:
+            yield info
 
 
-def _stop_processes(paths):
+def _stop_processes(paths, processes=None, matcher=None, closing=None):
     """ Scans process list trying to terminate processes matching paths
         specified. Uses checksums to identify processes that are duplicates of
         those specified to terminate.
 
         `paths`
             List of full paths to executables for processes to terminate.
+        `processes`
+            Iterable of (``ProcessInfo`` instance, path) tuples to check.
+            Default: all processes owned by the current user.
+        `matcher`
+            ``procscan.ProcessMatcher`` instance, for processes to terminate
+            that match rules rather than paths.
+        `closing`
+            Dict of pid -> (``ProcessInfo`` instance, kill time) to add
+            processes to once sent SIGTERM, rather than waiting out the grace
+            period. See `_kill_overdue`.
+
+        Returns dict of pid -> outcome, see ``procscan.terminate_all``.
+        Processes added to `closing` are ``TERMINATED``.
         """
 
+    checksums = {}
+
     def cache_checksum(path):
         """ Checksum provided path, cache, and return value.
             """
         if not path:
             return None
 
-        if not path in _process_checksums:
-            checksum = _get_checksum(path)
-            _process_checksums[path] = checksum
+        if not path in checksums:
+            fast = _checksum_mode == 'fast'
+            checksums[path] = _checksums.get(path, fast)
 
-        return _process_checksums[path]
+        return checksums[path]
 
-    if not paths:
-        return
+    target_checksums = dict((cache_checksum(p), 1) for p in paths or ())
+    target_checksums.pop(None, None)  # missing targets match nothing
+    if not target_checksums and not matcher:
+        return {}
 
-    target_checksums = dict((cache_checksum(p), 1) for p in paths)
-    if not target_checksums:
-        return
+    if processes is None:
+        processes = _get_user_processes()
 
-    for proc, path in _get_user_processes():
-        # path's checksum matches targets, attempt to terminate
-        if cache_checksum(path) in target_checksums:
-            try:
-                proc.terminate()
+    # path's checksum matches targets or process matches rules,
+    # terminate them all together
+    matches = [proc for proc, path in processes
+               if (matcher and matcher.matches(proc, path))
+               or (target_checksums
+                   and cache_checksum(path) in target_checksums)]
+    if not matches:
+        return {}
+
+    if closing is None:
+        return procscan.terminate_all(matches, grace=_close_grace)
+
+    outcomes = {}
+    deadline = common.monotonic() + _close_grace
+
+    for info in matches:
+        if info.pid in closing:
+            continue  # already signalled
+
+        try:
+            signalled = procscan.terminate(info)
+
+        except OSError:
+            outcomes[info.pid] = procscan.DENIED
+            continue
+
+        if signalled:
+            closing[info.pid] = (info, deadline)
+            outcomes[info.pid] = procscan.TERMINATED
+        else:
+            outcomes[info.pid] = procscan.EXITED
 
-            except (psutil.AccessDenied, psutil.NoSuchProcess):
+    return outcomes
+
+
+def _kill_overdue(closing):
+    """ Kills processes that are still running after their grace period to
+        exit.
+
+        `closing`
+            Dict of pid -> (``ProcessInfo`` instance, kill time). Processes
+            that exited or were killed are removed.
+
+        Returns ``True`` if any processes were killed.
+        """
+
+    killed = False
+    now = common.monotonic()
+
+    for pid, (info, deadline) in closing.items():
+        if procscan.get_start_time(pid) != info.start_time:
+            del closing[pid]  # exited
+
+        elif deadline <= now:
+            del closing[pid]
+            try:
+                killed = procscan.terminate(info, signal.SIGKILL) or killed
+            except OSError:
                 pass
 
+    return killed
+
+
+def _port_listening(host, port):
+    """ Determines if a TCP port is accepting connections.
+
+        `host`
+            Host name or address.
+        `port`
+            Port number.
+
+        Returns boolean.
+        """
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(_READY_POLL_PERIOD)
+
+    try:
+        return sock.connect_ex((host, port)) == 0
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+
+
+def _has_window(pid):
+    """ Determines if a process has mapped a window, using ``xdotool``.
+
+        `pid`
+            System process identifier.
+
+        Returns boolean or ``None`` if windows can't be checked.
+        """
+
+    xdotool = common.which('xdotool')
+    if not xdotool:
+        return None
+
+    output = common.shell_process([xdotool, 'search', '--onlyvisible',
+                                   '--pid', str(pid)])
+    return bool(output)
+
+
+class _AppLaunch(object):
+    """ Launches an app and determines when it's ready.
+
+        `command`
+            Shell command to launch.
+        `condition`
+            Readiness condition: 'alive', 'window', 'port:[host:]<port>' or
+            'file:<path>'; ``None`` if the app is ready once launched.
+        `timeout`
+            Seconds to wait for the condition.
+        """
+
+    def __init__(self, command, condition=None, timeout=_READY_TIMEOUT):
+        self.command = command
+        self.condition = condition
+        self.timeout = timeout
+        self.child = None
+        self.started = None
+        self.ready = None  # ``True`` if ready; ``False`` if exited/timed out
+
+    def start(self, scoped=False, preexec_fn=None):
+        """ Launches the app.
+
+            `scoped`
+                Set to ``True`` to terminate the app when the task ends.
+            `preexec_fn`
+                Callable to run in the app process before it's executed.
+            """
+
+        self.started = common.monotonic()
+        self.child = common.spawn_process(self.command, scoped=scoped,
+                                          preexec_fn=preexec_fn)
+        if not self.child:
+            self.ready = False
+        elif not self.condition:
+            self.ready = True
+
+    def _check_condition(self):
+        """ Returns ``True`` if the readiness condition is met.
+            """
+
+        kind, _, value = self.condition.partition(':')
+
+        if kind == 'port':
+            host, _, port = value.rpartition(':')
+            return _port_listening(host or '127.0.0.1', int(port))
+
+        if kind == 'file':
+            return os.path.exists(os.path.expanduser(value))
+
+        if kind == 'window':
+            found = _has_window(self.child.pid)
+            if found is not None:
+                return found
+
+        # alive; or window, if windows can't be checked
+        return (common.monotonic() - self.started >= _ALIVE_SETTLE
+                and not self.child.poll())
+
+    def poll(self):
+        """ Checks if the app is ready.
+
+            Returns ``True`` if no longer waiting on the app.
+            """
+
+        if self.ready is None:
+            if self._check_condition():
+                self.ready = True
+
+            elif (self.child.poll()
+                    or common.monotonic() - self.started >= self.timeout):
+                self.ready = False
+
+        return self.ready is not None
+
+
+def _launch_apps(launches, limit=None, scoped=False, scope=None):
+    """ Launches apps concurrently, waiting until each is ready. Apps wait
+        on their readiness conditions together, so the time taken is bounded
+        by the slowest app rather than the sum.
+
+        `launches`
+            List of ``_AppLaunch`` instances.
+        `limit`
+            Maximum number of apps waiting to be ready at once.
+        `scoped`
+            Set to ``True`` to terminate the apps when the task ends.
+        `scope`
+            ``cgroup.TaskScope`` instance to launch the apps in.
+        """
+
+    preexec_fn = scope.attach if scope else None
+    pending = list(launches)
+    waiting = []
+
+    while pending or waiting:
+        while pending and (not limit or len(waiting) < limit):
+            launch = pending.pop(0)
+            launch.start(scoped, preexec_fn)
+            if launch.ready is None:
+                waiting.append(launch)
+
+        waiting = [launch for launch in waiting if not launch.poll()]
+
+        if waiting:
+            time.sleep(_READY_POLL_PERIOD)
+
+
+def get_scope_file(task):
+    """ Get path for file storing the cgroup path of launched apps.
+
+        `task`
+            ``Task`` instance.
+
+        Returns filename string.
+        """
+    return os.path.join(task.base_dir, cgroup.SCOPE_FILE)
+
+
+def _release_scope(task, kill=False):
+    """ Releases the cgroup for launched apps. Apps still running are left
+        alone, outside of the cgroup, unless killed.
+
+        `task`
+            ``Task`` instance.
+        `kill`
+            Set to ``True`` to kill launched apps, and anything they started,
+            before the cgroup is removed.
+        """
+
+    global _task_scope
+
+    if not _task_scope:
+        return
+
+    if kill:
+        _task_scope.kill()
+
+        # killed processes leave the cgroup asynchronously
+        deadline = common.monotonic() + _close_grace
+        while (_task_scope.is_populated()
+               and common.monotonic() < deadline):
+            time.sleep(0.05)
+
+    if _task_scope.remove():
+        common.safe_remove_file(get_scope_file(task))
+        _task_scope = None
+
+
+def _closed_any(outcomes):
+    """ Determines if any processes were closed.
+
+        `outcomes`
+            Dict returned from `_stop_processes`.
+
+        Returns boolean.
+        """
+    return any(outcome in (procscan.TERMINATED, procscan.KILLED)
+               for outcome in outcomes.itervalues())
+
 
 class AppRun(base.Plugin):
     """ Runs applications at task start and completion.
@@ -151,7 +696,7 @@ class AppRun(base.Plugin):
     name = 'AppRun'
     version = 0.1
     target_version = '>=0.1'
-    events = ['task_start', 'task_end']
+    events = ['task_prepare', 'task_start', 'task_end']
     options = [
         # Example:
         #   apps {
@@ -161,6 +706,11 @@ class AppRun(base.Plugin):
         #       run chromium\ http://www.google.com;
         #       end_run killall\ urxvt;
         #       timer_run killall\ urxvt;
+        #       scoped_run firefox;
+        #       cgroup on;
+        #       ready firefox, window;
+        #       ready "code-server", port:8080, 30;
+        #       launch_limit 4;
         #   }
 
         {
@@ -168,7 +718,11 @@ class AppRun(base.Plugin):
             'options': [
                 {'name': 'run'},
                 {'name': 'end_run'},
-                {'name': 'timer_run'}
+                {'name': 'timer_run'},
+                {'name': 'scoped_run'},
+                {'name': 'cgroup', 'allow_duplicates': False},
+                {'name': 'ready'},
+                {'name': 'launch_limit', 'allow_duplicates': False}
             ]
         }
     ]
@@ -176,27 +730,113 @@ class AppRun(base.Plugin):
     def __init__(self):
         super(AppRun, self).__init__()
         self.paths = {}
+        self.use_cgroup = False
+        self.ready = {}  # path -> (condition, timeout)
+        self.launch_limit = None
+
+    def _run_apps(self, paths, scoped=False, scope=None):
+        """ Runs apps for the provided paths, concurrently.
 
-    def _run_apps(self, paths):
-        """ Runs apps for the provided paths.
+            `scoped`
+                Set to ``True`` to terminate the apps when the task ends.
+            `scope`
+                ``cgroup.TaskScope`` instance to launch the apps in.
             """
 
-        for path in paths:
-            common.shell_process(path, background=True)
-            time.sleep(0.2)  # delay some between starts
+        launches = [_AppLaunch(path, *self.ready.get(path, (None,)))
+                    for path in paths]
+        _launch_apps(launches, self.launch_limit, scoped, scope)
+
+    def _parse_ready(self, values):
+        """ Parse readiness condition for an app.
+
+            `values`
+                Option values: app, condition, and optional timeout.
+            """
+
+        if not 2 <= len(values) <= 3:
+            raise ValueError(u'"ready" must be: app, condition[, timeout]')
+
+        condition = values[1]
+        kind, _, value = condition.partition(':')
+
+        if (kind not in _READY_CONDITIONS
+                or bool(value) != (kind in ('port', 'file'))):
+            raise ValueError(u'Invalid ready condition "{0}"'
+                             .format(condition))
+
+        try:
+            if kind == 'port':
+                int(value.rpartition(':')[2])
+
+            timeout = float(values[2]) if len(values) > 2 else _READY_TIMEOUT
+            if timeout <= 0:
+                raise ValueError
+
+        except ValueError:
+            raise ValueError(u'Invalid ready port or timeout')
+
+        path = common.extract_app_paths([values[0]])[0]
+        self.ready[path] = (condition, timeout)
 
     def parse_option(self, option, block_name, *values):
         """ Parse app path values for option.
             """
+
+        # launch apps into a cgroup for the task
+        if option == 'cgroup':
+            if len(values) != 1 or values[0] not in ('on', 'off'):
+                raise ValueError(u'"cgroup" must be "on" or "off"')
+
+            self.use_cgroup = values[0] == 'on'
+            return
+
+        if option == 'ready':
+            self._parse_ready(values)
+            return
+
+        # maximum apps waiting to be ready at once
+        if option == 'launch_limit':
+            if len(values) != 1 or not values[0].isdigit() or values[0] == '0':
+                raise ValueError(u'"launch_limit" must be a number > 0')
+
+            self.launch_limit = int(values[0])
+            return
+
         if option == 'run':
             option = 'start_' + option
 
         key = option.split('_', 1)[0]
         self.paths[key] = set(common.extract_app_paths(values))
 
+    def on_taskprepare(self, task):
+        """ Creates the cgroup for launched apps, while the task daemon
+            may still have root privileges. Falls back to launching apps
+            normally if cgroups aren't available.
+            """
+
+        global _task_scope
+
+        if not self.use_cgroup:
+            return
+
+        _task_scope = cgroup.TaskScope.create(task.name, uid=task.owner)
+
+        if _task_scope:
+            filename = get_scope_file(task)
+            if common.writefile(filename, _task_scope.path):
+                try:
+                    os.chown(filename, task.owner, -1)
+                except OSError:
+                    pass
+
     def on_taskstart(self, task):
         if 'start' in self.paths:
-            self._run_apps(self.paths['start'])
+            self._run_apps(self.paths['start'], scope=_task_scope)
+
+        if 'scoped' in self.paths:
+            self._run_apps(self.paths['scoped'], scoped=True,
+                           scope=_task_scope)
 
     def on_taskend(self, task):
         key = 'timer' if task.elapsed else 'end'
@@ -205,6 +845,9 @@ class AppRun(base.Plugin):
         if paths:
             self._run_apps(paths)
 
+        # launched apps are killed with the cgroup if AppClose closes apps
+        _release_scope(task, kill=key in _scope_close_keys)
+
 
 class AppClose(base.Plugin):
     """ Closes applications at task start and completion.
@@ -220,6 +863,9 @@ class AppClose(base.Plugin):
         #       close /usr/bin/something;
         #       end_close urxvt;
         #       timer_close urxvt;
+        #       checksum fast;
+        #       close_grace 5;
+        #       close_match name:slack, glob:/opt/*/steam, cmd:--app=chat;
         #   }
 
         {
@@ -227,7 +873,10 @@ class AppClose(base.Plugin):
             'options': [
                 {'name': 'close'},
                 {'name': 'end_close'},
-                {'name': 'timer_close'}
+                {'name': 'timer_close'},
+                {'name': 'checksum', 'allow_duplicates': False},
+                {'name': 'close_grace', 'allow_duplicates': False},
+                {'name': 'close_match'}
             ]
         }
     ]
@@ -235,11 +884,45 @@ class AppClose(base.Plugin):
     def __init__(self):
         super(AppClose, self).__init__()
         self.paths = {}
+        self.matchers = {}
 
     def parse_option(self, option, block_name, *values):
         """ Parse app path values for option.
             """
 
+        global _checksum_mode, _close_grace, _match_cmdline
+
+        # how executables are identified, for all app plugins
+        if option == 'checksum':
+            if len(values) != 1 or values[0] not in ('full', 'fast'):
+                raise ValueError(u'"checksum" must be "full" or "fast"')
+
+            _checksum_mode = values[0]
+            return
+
+        # seconds to wait for apps to exit before they're killed
+        if option == 'close_grace':
+            try:
+                if len(values) != 1:
+                    raise ValueError
+                _close_grace = float(values[0])
+                if _close_grace < 0:
+                    raise ValueError
+
+            except ValueError:
+                raise ValueError(u'"close_grace" must be a number >= 0')
+            return
+
+        # name, glob, regex and command-line rules, compiled into one matcher
+        if option.endswith('_match'):
+            key = 'block' if option == 'block_match' else 'start'
+            matcher = procscan.ProcessMatcher([str(v) for v in values])
+            self.matchers[key] = matcher
+
+            if matcher.needs_cmdline:
+                _match_cmdline = True
+            return
+
         # treat arguments as part of the program name (support spaces in name)
         values = [x.replace(' ', '\\ ') if not x.startswith(os.sep) else x
                   for x in [str(v) for v in values]]
@@ -250,16 +933,32 @@ class AppClose(base.Plugin):
         key = option.split('_', 1)[0]
         self.paths[key] = set(common.extract_app_paths(values))
 
+        if key in ('end', 'timer'):
+            _scope_close_keys.add(key)
+
     def on_taskstart(self, task):
-        if 'start' in self.paths:
-            _stop_processes(paths=self.paths['start'])
+        if 'start' in self.paths or 'start' in self.matchers:
+            _setup_checksum_cache(task)
+            _stop_processes(paths=self.paths.get('start'),
+                            matcher=self.matchers.get('start'))
+            _checksums.save()
 
     def on_taskend(self, task):
         key = 'timer' if task.elapsed else 'end'
         paths = self.paths.get(key)
 
         if paths:
-            _stop_processes(paths=paths)
+            # launched apps, and anything they started, end with the cgroup;
+            # other processes are closed individually
+            scoped = set(_task_scope.get_pids() if _task_scope else ())
+            processes = (x for x in _get_user_processes()
+                         if x[0].pid not in scoped)
+
+            _setup_checksum_cache(task)
+            _stop_processes(paths=paths, processes=processes)
+            _checksums.save()
+
+            _release_scope(task, kill=True)
 
 
 class AppBlock(AppClose):
@@ -268,22 +967,85 @@ class AppBlock(AppClose):
     name = 'AppBlock'
     version = '0.1'
     target_version = '>=0.1'
-    events = ['task_run']
+    events = ['task_prepare', 'task_run']
     options = [
         # Example:
         #   apps {
         #       block firefox, chromium;
         #       block /usr/bin/something;
         #       block '/path/to/bin/';
+        #       block_match name:steam, re:^/opt/games/.*, cmd:youtube.com;
         #   }
 
         {
             'block': 'apps',
             'options': [
-                {'name': 'block'}
+                {'name': 'block'},
+                {'name': 'block_match'}
             ]
         }
     ]
 
+    def __init__(self):
+        super(AppBlock, self).__init__()
+        self._monitor = None
+        self._scanned = False
+        self._closing = {}  # pid -> (info, kill time), see `_kill_overdue`
+
+    def on_taskprepare(self, task):
+        """ Subscribes to program exec notifications, if privileged, so
+            blocked apps are closed as soon as they start.
+            """
+
+        monitor = procevents.ExecMonitor()
+
+        if monitor.open():
+            self._monitor = monitor
+            self.watch_fd = monitor.fileno()
+
     def on_taskrun(self, task):
-        _stop_processes(paths=self.paths['block'])
+        """ Closes blocked apps, without waiting for them to exit. Those
+            still running after the grace period are killed on a later run,
+            which is reported as activity meanwhile, so the task runner
+            doesn't back off its period.
+            """
+
+        killed = _kill_overdue(self._closing)
+        paths = self.paths.get('block')
+        _setup_checksum_cache(task)
+
+        try:
+            closed = self._block(paths, self.matchers.get('block'))
+        finally:
+            _checksums.save()
+
+        return closed or killed or bool(self._closing)
+
+    def _block(self, paths, matcher=None):
+        """ Closes blocked apps.
+
+            `paths`
+                List of full paths to executables to close.
+            `matcher`
+                ``procscan.ProcessMatcher`` instance for apps to close.
+
+            Returns ``True`` if any apps were closed.
+            """
+
+        # only check processes that executed a program since last time,
+        # once running processes have been scanned
+        if self._monitor and self._scanned:
+            pids = self._monitor.read_execs()
+
+            if pids is not None:
+                if not pids:
+                    return False
+
+                processes = _get_exec_processes(pids)
+                return _closed_any(_stop_processes(paths, processes, matcher,
+                                                   closing=self._closing))
+
+        # notifications lost or not available, scan all processes
+        self._scanned = True
+        return _closed_any(_stop_processes(paths=paths, matcher=matcher,
+                                           closing=self._closing))
@@ -3,14 +3,10 @@
     """
 
 import os
-import psutil
 
-from focus import common
+from focus import common, dbuspool, procscan
 from focus.plugin import base
 
-if not common.IS_MACOSX:
-    import dbus
-
 
 ## Code Maps ##
 
@@ -46,9 +42,63 @@ SKYPE_CODE_MAP = {
     'hidden': 'INVISIBLE'
 }
 
+# bus names of clients reached through dbus, which are skipped when not running
+CLIENT_BUS_NAMES = {
+    'pidgin': 'im.pidgin.purple.PurpleService',
+    'empathy': 'org.freedesktop.Telepathy.AccountManager',
+    'linux_skype': 'com.Skype.API'
+}
+
+_STATUS_TIMEOUT = 5.0  # seconds each client has to update its status
+_DBUS_TIMEOUT = _STATUS_TIMEOUT  # seconds for each dbus method call
+_DETECT_TTL = 30.0  # seconds client detection is cached
+
+_detected = {}  # bus name -> (running, expire time)
+
+
+def _client_running(client):
+    """ Determines if an IM client is running, caching the result briefly.
+        Clients not reached through dbus detect themselves.
+
+        `client`
+            Client name.
+
+        Returns boolean.
+        """
+
+    bus_name = CLIENT_BUS_NAMES.get(client)
+    if not bus_name:
+        return True
+
+    now = common.monotonic()
+    entry = _detected.get(bus_name)
+
+    if not entry or entry[1] <= now:
+        entry = (dbuspool.get_pool().has_owner(bus_name), now + _DETECT_TTL)
+        _detected[bus_name] = entry
+
+    return entry[0]
+
+
+def _call_privately(func, *args):
+    """ Calls a status function with a private dbus pool for the current
+        thread, as the thread may be abandoned while the call hangs.
+
+        `func`
+            Status function.
+        `args`
+            Arguments for the function.
+
+        Returns value returned by the function.
+        """
+
+    with dbuspool.private_pool():
+        return func(*args)
+
 
 def _dbus_get_object(bus_name, object_name):
-    """ Fetches DBUS proxy object given the specified parameters.
+    """ Fetches DBUS proxy object given the specified parameters, from the
+        shared connection pool.
 
         `bus_name`
             Name of the bus interface.
@@ -57,18 +107,12 @@ def _dbus_get_object(bus_name, object_name):
 
         Returns object or ``None``.
         """
-
-    try:
-        bus = dbus.SessionBus()
-        obj = bus.get_object(bus_name, object_name)
-        return obj
-
-    except (NameError, dbus.exceptions.DBusException):
-        return None
+    return dbuspool.get_pool().get_object(bus_name, object_name)
 
 
 def _dbus_get_interface(bus_name, object_name, interface_name):
-    """ Fetches DBUS interface proxy object given the specified parameters.
+    """ Fetches DBUS interface proxy object given the specified parameters,
+        from the shared connection pool.
 
         `bus_name`
             Name of the bus interface.
@@ -79,15 +123,8 @@ def _dbus_get_interface(bus_name, object_name, interface_name):
 
         Returns object or ``None``.
         """
-
-    try:
-        obj = _dbus_get_object(bus_name, object_name)
-        if not obj:
-            raise NameError
-        return dbus.Interface(obj, interface_name)
-
-    except (NameError, dbus.exceptions.DBusException):
-        return None
+    return dbuspool.get_pool().get_interface(bus_name, object_name,
+                                             interface_name)
 
 
 def _pidgin_status(status, message):
@@ -107,16 +144,19 @@ def _pidgin_status(status, message):
 
             # create new transient status
             code = PIDGIN_CODE_MAP[status]
-            saved_status = iface.PurpleSavedstatusNew('', code)
+            saved_status = iface.PurpleSavedstatusNew('', code,
+                                                      timeout=_DBUS_TIMEOUT)
 
             # set the message, if provided
-            iface.PurpleSavedstatusSetMessage(saved_status, message)
+            iface.PurpleSavedstatusSetMessage(saved_status, message,
+                                              timeout=_DBUS_TIMEOUT)
 
             # activate status
-            iface.PurpleSavedstatusActivate(saved_status)
+            iface.PurpleSavedstatusActivate(saved_status,
+                                            timeout=_DBUS_TIMEOUT)
 
-    except dbus.exceptions.DBusException:
-        pass
+    except dbuspool.DBusException:
+        dbuspool.get_pool().invalidate('im.pidgin.purple.PurpleService')
 
 
 def _adium_status(status, message):
@@ -183,7 +223,12 @@ def _empathy_status(status, message):
                                    DBUS_PROP_IFACE)
 
     if am_iface:
-        account_paths = am_iface.Get(ACCT_MAN_IFACE, 'ValidAccounts')
+        try:
+            account_paths = am_iface.Get(ACCT_MAN_IFACE, 'ValidAccounts',
+                                         timeout=_DBUS_TIMEOUT)
+        except dbuspool.DBusException:
+            dbuspool.get_pool().invalidate(ACCT_MAN_IFACE)
+            return
 
         for account_path in account_paths:
             try:
@@ -191,24 +236,29 @@ def _empathy_status(status, message):
                 account = _dbus_get_object(ACCT_MAN_IFACE, account_path)
 
                 # skip disconnected, disabled, etc.
-                if account.Get(ACCT_IFACE, 'ConnectionStatus') != 0:
+                if account.Get(ACCT_IFACE, 'ConnectionStatus',
+                               timeout=_DBUS_TIMEOUT) != 0:
                     continue
 
                 # fetch simple presence interface for account connection
-                conn_path = account.Get(ACCT_IFACE, 'Connection')
+                conn_path = account.Get(ACCT_IFACE, 'Connection',
+                                        timeout=_DBUS_TIMEOUT)
                 conn_iface = conn_path.replace("/", ".")[1:]
                 sp_iface = _dbus_get_interface(conn_iface, conn_path,
                                                SP_IFACE)
+                if not sp_iface:
+                    continue
 
-            except dbus.exceptions.DBusException:
+            except (dbuspool.DBusException, AttributeError):
                 continue
 
             # set status and message
             for code in EMPATHY_CODE_MAP[status]:
                 try:
-                    sp_iface.SetPresence(code, message)
-                except dbus.exceptions.DBusException:
-                    pass
+                    sp_iface.SetPresence(code, message,
+                                         timeout=_DBUS_TIMEOUT)
+                except dbuspool.DBusException:
+                    dbuspool.get_pool().invalidate(conn_iface)
                 else:
                     break
 
@@ -228,20 +278,21 @@ def _linux_skype_status(status, message):
                                     'com.Skype.API')
         if iface:
             # authenticate
-            if iface.Invoke('NAME focus') != 'OK':
+            if iface.Invoke('NAME focus', timeout=_DBUS_TIMEOUT) != 'OK':
                 msg = 'User denied authorization'
-                raise dbus.exceptions.DbusException(msg)
-            iface.Invoke('PROTOCOL 5')
+                raise dbuspool.DBusException(msg)
+            iface.Invoke('PROTOCOL 5', timeout=_DBUS_TIMEOUT)
 
             # set status
-            iface.Invoke('SET USERSTATUS {0}'.format(SKYPE_CODE_MAP[status]))
+            iface.Invoke('SET USERSTATUS {0}'.format(SKYPE_CODE_MAP[status]),
+                         timeout=_DBUS_TIMEOUT)
 
             # set the message, if provided
-            iface.Invoke('SET PROFILE MOOD_TEXT {0}'
-                         .format(message))
+            iface.Invoke('SET PROFILE MOOD_TEXT {0}'.format(message),
+                         timeout=_DBUS_TIMEOUT)
 
-    except dbus.exceptions.DBusException:
-        pass
+    except dbuspool.DBusException:
+        dbuspool.get_pool().invalidate('com.Skype.API')
 
 
 def _osx_skype_status(status, message):
@@ -261,17 +312,8 @@ def _osx_skype_status(status, message):
     # The workaround here is to scan the user process list for Skype and
     # bail if we don't find it.
 
-    uid = os.getuid()
-
-    for proc in psutil.process_iter():
-        try:
-            if proc.uids.real == uid and proc.name == 'Skype':
-                skype_running = True
-                break
-        except (psutil.AccessDenied, psutil.NoSuchProcess):
-            pass
-    else:
-        skype_running = False
+    skype_running = any(proc.name == 'Skype'
+                        for proc in procscan.scan(uid=os.getuid()))
 
     if skype_running:
         code = SKYPE_CODE_MAP[status]  # map status code
@@ -375,24 +417,29 @@ class IMStatus(base.Plugin):
         super(IMStatus, self).__init__()
         self.messages = {}
         self.statuses = {}
-        self.set_status_funcs = ()
+        self.set_status_funcs = ()  # (client name, function) pairs
 
         if common.IS_MACOSX:
             self.set_status_funcs = (
-                _adium_status, _osx_skype_status
+                ('adium', _adium_status), ('osx_skype', _osx_skype_status)
             )
         else:
             self.set_status_funcs = (
-                _pidgin_status, _empathy_status, _linux_skype_status
+                ('pidgin', _pidgin_status), ('empathy', _empathy_status),
+                ('linux_skype', _linux_skype_status)
             )
 
     def _set_status(self, status, message=''):
-        """ Updates the status and message on all supported IM apps.
+        """ Updates the status and message on all supported IM apps, which
+            are updated concurrently, each within its own deadline.
 
             `status`
                 Status type (See ``VALID_STATUSES``).
             `message`
                 Status message.
+
+            Returns dict of client name -> tuple (state, value), see
+            ``common.call_with_deadlines``. Clients not running are omitted.
             """
 
         message = message.strip()
@@ -404,9 +451,15 @@ class IMStatus(base.Plugin):
 
         message = message.encode('utf-8', 'replace')
 
-        # attempt to set status for each supported application
-        for func in self.set_status_funcs:
-            func(status, message)
+        # attempt to set status for each running application
+        calls = []
+        for client, func in self.set_status_funcs:
+            if _client_running(client):
+                calls.append((client, _call_privately,
+                              (func, status, message), _STATUS_TIMEOUT))
+
+        return dict((client, (state, value)) for client, state, value
+                    in common.call_with_deadlines(calls))
 
     def parse_option(self, option, block_name, *values):
         """ Parse status, end_status, timer_status and status_msg options.
@@ -2,11 +2,11 @@
     showing system notification messages.
     """
 
-from focus import common
+from focus import common, dbuspool, dispatch
 from focus.plugin import base
 
-if not common.IS_MACOSX:
-    import dbus
+
+_DBUS_TIMEOUT = 5.0  # seconds for the notification method call
 
 
 def _terminal_notifier(title, message):
@@ -21,7 +21,7 @@ def _terminal_notifier(title, message):
     try:
         paths = common.extract_app_paths(['terminal-notifier'])
     except ValueError:
-        pass
+        return
 
     common.shell_process([paths[0], '-title', title, '-message', message])
 
@@ -71,22 +71,28 @@ def _dbus_notify(title, message):
             Notification title.
         `message`
             Notification message.
+
+        * Raises ``DBusException`` if notification fails, so it's retried by
+          the dispatcher.
         """
 
-    try:
-        # fetch main account manager interface
-        bus = dbus.SessionBus()
-        obj = bus.get_object('org.freedesktop.Notifications',
-                             '/org/freedesktop/Notifications')
-        if obj:
-            iface = dbus.Interface(obj, 'org.freedesktop.Notifications')
+    if dbuspool.dbus:
+        bus_name = 'org.freedesktop.Notifications'
+        pool = dbuspool.get_pool()
 
-            if iface:
-                # dispatch notification message
-                iface.Notify('Focus', 0, '', title, message, [], {}, 5)
+        # dispatch notification message, through cached proxy
+        iface = pool.get_interface(bus_name, '/org/freedesktop/Notifications',
+                                   'org.freedesktop.Notifications')
+        if not iface:
+            raise dbuspool.DBusException(u'Notifications unavailable')
 
-    except dbus.exceptions.DBusException:
-        pass
+        try:
+            iface.Notify('Focus', 0, '', title, message, [], {}, 5,
+                         timeout=_DBUS_TIMEOUT)
+
+        except dbuspool.DBusException:
+            pool.invalidate(bus_name)  # service may have restarted
+            raise
 
 
 class Notify(base.Plugin):
@@ -127,6 +133,7 @@ class Notify(base.Plugin):
         super(Notify, self).__init__()
         self.messages = {}
         self.notify_func = None
+        self.dispatcher = dispatch.Dispatcher(self._send)
 
         if common.IS_MACOSX:
             commands = ['terminal-notifier', 'growlnotify']
@@ -151,9 +158,18 @@ class Notify(base.Plugin):
         else:
             self.notify_func = _dbus_notify
 
-    def _notify(self, task, message):
-        """ Shows system notification message according to system requirements.
+    def _send(self, title, message):
+        """ Shows notification message, from the dispatcher thread.
+            """
+        self.notify_func(title, message)
+
+    def _notify(self, task, event, message):
+        """ Queues system notification message, shown according to system
+            requirements. A pending message for the same task event is
+            replaced.
 
+            `event`
+                Event key (e.g. 'start' or 'end').
             `message`
                 Status message.
             """
@@ -161,7 +177,7 @@ class Notify(base.Plugin):
         if self.notify_func:
             message = common.to_utf8(message.strip())
             title = common.to_utf8(u'Focus ({0})'.format(task.name))
-            self.notify_func(title, message)
+            self.dispatcher.submit((task.name, event), title, message)
 
     def parse_option(self, option, block_name, message):
         """ Parse show, end_show, and timer_show options.
@@ -175,11 +191,11 @@ class Notify(base.Plugin):
 
     def on_taskstart(self, task):
         if 'start' in self.messages:
-            self._notify(task, self.messages['start'])
+            self._notify(task, 'start', self.messages['start'])
 
     def on_taskend(self, task):
         key = 'timer' if task.elapsed else 'end'
         message = self.messages.get(key)
 
         if message:
-            self._notify(task, message)
+            self._notify(task, key, message)
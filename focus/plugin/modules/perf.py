@@ -0,0 +1,104 @@
+""" This module provides the performance command plugin that shows how the
+    task daemon's main event loop is keeping up while a task is active.
+    """
+
+from focus import cgroup, common, daemon, telemetry
+from focus.plugin import base
+from focus.plugin.modules import apps
+
+
+class Perf(base.Plugin):
+    """ Prints task daemon loop measurements for the active task.
+        """
+    name = 'Perf'
+    version = '0.1'
+    target_version = '>=0.1'
+    command = 'perf'
+    task_only = True
+
+    def _format_hist(self, hist):
+        """ Formats histogram summary.
+
+            `hist`
+                ``Histogram`` instance.
+
+            Returns string.
+            """
+
+        if not hist.count:
+            return u'no samples'
+
+        msecs = lambda v: u'{0:.1f}ms'.format(v * 1000)
+        return (u'{0} samples, mean {1}, p50 <= {2}, p99 <= {3}, max {4}'
+                .format(hist.count, msecs(hist.mean),
+                        msecs(hist.percentile(50)),
+                        msecs(hist.percentile(99)), msecs(hist.max)))
+
+    def _write_app_usage(self, env):
+        """ Displays resource usage for apps launched into the task's
+            cgroup, if any.
+
+            `env`
+                Runtime ``Environment`` instance.
+            """
+
+        path = common.readfile(apps.get_scope_file(env.task))
+        if not path:
+            return
+
+        stats = cgroup.TaskScope(path.strip()).get_stats()
+
+        if stats['memory'] is None:
+            memory = u'n/a'
+        else:
+            memory = u'{0:.1f}MB'.format(stats['memory'] / 1048576.0)
+
+        env.io.write(u'')
+        env.io.write(u'Launched apps: {0} processes, cpu {1:.1f}s, '
+                     u'memory {2}'.format(stats['processes'], stats['cpu'],
+                                          memory))
+
+    def execute(self, env, args):
+        """ Displays loop lag and tick duration for the task daemon, along
+            with background processes spawned by plugins.
+
+            `env`
+                Runtime ``Environment`` instance.
+            `args`
+                Arguments object from arg parser.
+            """
+
+        filename = daemon.get_daemon_perffile(env.task)
+        data = telemetry.read_snapshot(filename, histograms=('lag', 'tick'))
+
+        if not data:
+            env.io.write(u'No measurements available yet.')
+            self._write_app_usage(env)
+            return
+
+        env.io.write(u'Loop period: {0:.1f}s (base {1:.1f}s)'
+                     .format(data.get('period', 0),
+                             data.get('sleep_period', 0)))
+
+        if 'lag' in data:
+            env.io.write(u'Loop lag: ' + self._format_hist(data['lag']))
+        if 'tick' in data:
+            env.io.write(u'Tick time: ' + self._format_hist(data['tick']))
+
+        children = data.get('children')
+        if children:
+            env.io.write(u'')
+            env.io.write(u'Background processes:')
+
+            for child in children:
+                if child.get('returncode') is None:
+                    status = u'running'
+                else:
+                    status = u'exited {0}'.format(child['returncode'])
+
+                env.io.write(u'    {0} [{1}] {2}, {3:.0f}s: {4}'.format(
+                             child.get('pid'), child.get('owner') or u'-',
+                             status, child.get('runtime') or 0,
+                             child.get('command')))
+
+        self._write_app_usage(env)
@@ -1,15 +1,19 @@
 """ This module provides the website-specific event hook plugins that implement
     the 'sites' settings block in the task configuration file.
 
-    The plugin blocks websites during an active task.
+    The plugin blocks websites during an active task, including those listed
+    in external blocklist files.
     """
 
 import os
 import re
+import stat
+import socket
+import hashlib
 import urlparse
 import tempfile
 
-from focus import common
+from focus import common, dnssink
 from focus.plugin import base
 
 
@@ -17,6 +21,313 @@ _RE_PROTOCOL = re.compile(r'(?:(ht|f)tp(s?)\:\/\/)')
 _RE_TLD = re.compile(r'((?:\.[a-zA-Z]{2,6}){1,2})$')
 _RE_WWW_SUB = re.compile(r'^www\.')
 
+_RE_SECTION = re.compile(r'^# FOCUS BEGIN\n.*?^# FOCUS END(?:\n|\Z)',
+                         re.M | re.S)
+
+_SECTION_BEGIN = '# FOCUS BEGIN\n'
+_SECTION_END = '# FOCUS END\n'
+_PATCH_RETRIES = 3  # attempts when hosts file changes while patching
+_DNS_ADDRESS = ('127.0.0.153', 53)  # loopback address for dns responder
+_DNS_FALLBACK = '8.8.8.8'  # upstream if no other name server is configured
+
+_LIST_BATCH_SIZE = 4096  # blocklist lines normalized at a time
+_MAX_BLOCKLISTS = 8  # compiled blocklist files kept in memory
+
+# (filename, file identity, sorted domain list), most recently used last
+_blocklists = []
+
+
+def _normalize_names(lines):
+    """ Extracts domains from a batch of blocklist lines. Lines are either
+        a domain or hosts file entries (e.g. '0.0.0.0 domain'), with '#'
+        comments.
+
+        `lines`
+            List of lines.
+
+        Returns set of domains.
+        """
+
+    domains = set()
+
+    for line in lines:
+        names = line.split('#', 1)[0].lower().split()
+        if len(names) > 1:
+            names = names[1:]  # skip the address
+
+        for name in names:
+            # plain domains don't need the url parser
+            if '/' in name or ':' in name:
+                if not _RE_PROTOCOL.match(name):
+                    name = 'http://' + name
+                name = urlparse.urlparse(name).hostname
+
+            if name and _RE_TLD.search(name):
+                domains.add(name)
+
+    return domains
+
+
+def _get_file_identity(filename):
+    """ Returns string identifying the version of a file, or ``None`` if
+        it doesn't exist.
+        """
+
+    try:
+        info = os.stat(filename)
+    except OSError:
+        return None
+
+    return '{0}:{1}:{2}:{3}'.format(info.st_dev, info.st_ino, info.st_size,
+                                    int(info.st_mtime * 1000000))
+
+
+def _get_cached_blocklist(filename, identity):
+    """ Gets the domains of a compiled blocklist file kept in memory.
+
+        `filename`
+            Blocklist filename.
+        `identity`
+            Identity of current version of file.
+
+        Returns sorted list of domains or ``None`` if not kept for this
+        version of the file.
+        """
+
+    for i, item in enumerate(_blocklists):
+        if item[0] == filename:
+            if item[1] != identity:
+                return None
+
+            # most recently used
+            _blocklists.append(_blocklists.pop(i))
+            return item[2]
+
+    return None
+
+
+def _cache_blocklist(filename, identity, domains):
+    """ Keeps the domains of a compiled blocklist file in memory, replacing
+        those of its previous version. The least recently used files are
+        evicted beyond ``_MAX_BLOCKLISTS``.
+
+        `filename`
+            Blocklist filename.
+        `identity`
+            Identity of current version of file.
+        `domains`
+            Sorted list of domains.
+        """
+
+    _blocklists[:] = [x for x in _blocklists if x[0] != filename]
+    _blocklists.append((filename, identity, domains))
+    del _blocklists[:-_MAX_BLOCKLISTS]
+
+
+def _compile_blocklist(filename, cache_dir):
+    """ Reads the domains from a blocklist file. The file is streamed and
+        normalized in batches, and the sorted domains are cached so the file
+        is only read again once it changes.
+
+        `filename`
+            Blocklist filename.
+        `cache_dir`
+            Directory for compiled blocklists.
+
+        Returns sorted list of domains or ``None`` if the file can't be read.
+        """
+
+    filename = os.path.realpath(filename)
+    identity = _get_file_identity(filename)
+    if not identity:
+        return None
+
+    domains = _get_cached_blocklist(filename, identity)
+    if not domains is None:
+        return domains
+
+    cache_file = os.path.join(cache_dir, 'blocklist-{0}'.format(
+                              hashlib.md5(filename).hexdigest()))
+
+    # compiled by this or another task, since file was last changed
+    data = common.readfile(cache_file)
+    if data:
+        header, _, body = data.partition('\n')
+        if header == identity:
+            domains = body.split('\n') if body else []
+            _cache_blocklist(filename, identity, domains)
+            return domains
+
+    domains = set()
+
+    try:
+        with open(filename, 'r') as _file:
+            batch = []
+            for line in _file:
+                batch.append(line)
+                if len(batch) >= _LIST_BATCH_SIZE:
+                    domains.update(_normalize_names(batch))
+                    batch = []
+
+            domains.update(_normalize_names(batch))
+
+    except IOError:
+        return None
+
+    domains = sorted(domains)
+    _cache_blocklist(filename, identity, domains)
+
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+        temp_file = '{0}.tmp'.format(cache_file)
+        if common.writefile(temp_file, identity + '\n' + '\n'.join(domains)):
+            os.rename(temp_file, cache_file)
+
+    except OSError:
+        pass
+
+    return domains
+
+
+def _is_ipv4(address):
+    """ Determines if an address is an IPv4 address.
+
+        `address`
+            Address string.
+
+        Returns boolean.
+        """
+
+    try:
+        socket.inet_pton(socket.AF_INET, address)
+        return True
+    except (socket.error, ValueError):
+        return False
+
+
+def _split_section(data):
+    """ Splits hosts file data around the section managed by focus.
+
+        `data`
+            Hosts file data.
+
+        Returns tuple (data before, section, data after); section is
+        ``None`` if not present.
+        """
+
+    match = _RE_SECTION.search(data)
+    if not match:
+        return data, None, ''
+
+    return data[:match.start()], match.group(0), data[match.end():]
+
+
+def _patch_file(filename, section, run_root, prepend=False):
+    """ Updates only the section of a system file managed by focus,
+        preserving the rest of the file, including changes made by other
+        programs while the task is active.
+
+        `filename`
+            Filename to patch.
+        `section`
+            Section data; ``None`` removes the section.
+        `run_root`
+            Function that runs a shell command as root, returning boolean.
+        `prepend`
+            Set to ``True`` to add a new section at the start of the file,
+            rather than the end.
+
+        Returns modification time of patched file or ``None`` if it
+        failed.
+        """
+
+    filename = os.path.realpath(filename)  # replace link targets
+    digest = lambda v: v and hashlib.md5(v).digest()
+
+    for i in range(_PATCH_RETRIES):
+        try:
+            info = os.stat(filename)
+        except OSError:
+            return None
+
+        data = common.readfile(filename)
+        if data is None:
+            return None
+
+        before, current, after = _split_section(data)
+
+        # section is already up to date, skip the write
+        if digest(current) == digest(section):
+            return info.st_mtime
+
+        if current is None and prepend:
+            before, after = '', before
+        elif current is None and before and not before.endswith('\n'):
+            before += '\n'
+        data = before + (section or '') + after
+
+        # changed since read, start over so other changes aren't lost
+        try:
+            if os.stat(filename).st_mtime != info.st_mtime:
+                continue
+        except OSError:
+            return None
+
+        with tempfile.NamedTemporaryFile(prefix='focus_') as tempf:
+            tempf.write(data)
+            tempf.flush()
+
+            # replace atomically, from a temp file in the same directory
+            temp_file = '{0}.focus-tmp'.format(filename)
+            command = ('cat "{0}" > "{1}" && chmod {2:o} "{1}" && '
+                       'mv -f "{1}" "{3}"'
+                       .format(tempf.name, temp_file,
+                               stat.S_IMODE(info.st_mode), filename))
+
+            if not run_root(command):
+                run_root('rm -f "{0}"'.format(temp_file))
+                return None
+
+        try:
+            return os.path.getmtime(filename)
+        except OSError:
+            return -1
+
+    return None
+
+
+def restore_resolver(filename='/etc/resolv.conf', run_root=None):
+    """ Removes the section managed by focus from resolver configuration,
+        if the dns responder it points at isn't running (e.g. the task
+        daemon that added it crashed).
+
+        `filename`
+            Resolver configuration filename.
+        `run_root`
+            Function that runs a shell command as root, returning boolean.
+            Default: run commands as the current user.
+
+        Returns ``True`` if the section was removed.
+        """
+
+    section = _split_section(common.readfile(filename) or '')[1]
+    if not section:
+        return False
+
+    for line in section.splitlines():
+        parts = line.split('#', 1)[0].split()
+        if (len(parts) > 1 and parts[0] == 'nameserver'
+                and dnssink.is_serving((parts[1], _DNS_ADDRESS[1]))):
+            return False
+
+    if run_root is None:
+        run_root = lambda command: common.shell_process(
+            command, exitcode=True)[1] == 0
+
+    return _patch_file(filename, None, run_root) is not None
+
 
 class SiteBlock(base.Plugin):
     """ Blocks websites during an active task.
@@ -25,18 +336,28 @@ class SiteBlock(base.Plugin):
     version = '0.1'
     target_version = '>=0.1'
     needs_root = True   # so we can update hosts file
-    events = ['task_run', 'task_end']
+    events = ['task_prepare', 'task_run', 'task_end']
     options = [
         # Example:
         #   sites {
         #       block youtube.com, "http://www.reddit.com", www.foursquare.com;
         #       block news.ycombinator.com, twitter.com, "www.facebook.com";
+        #       mode patch;
+        #       block_file /path/to/blocklist.txt;
+        #       block_list social, "ads";
+        #       dns_address 127.0.0.153;
+        #       dns_upstream 192.168.1.1:53;
         #   }
 
         {
             'block': 'sites',
             'options': [
-                {'name': 'block'}
+                {'name': 'block'},
+                {'name': 'mode', 'allow_duplicates': False},
+                {'name': 'block_file'},
+                {'name': 'block_list'},
+                {'name': 'dns_address', 'allow_duplicates': False},
+                {'name': 'dns_upstream', 'allow_duplicates': False}
             ]
         }
     ]
@@ -45,8 +366,168 @@ class SiteBlock(base.Plugin):
         super(SiteBlock, self).__init__()
         self.domains = set()
         self.hosts_file = '/etc/hosts'
+        self.resolv_file = '/etc/resolv.conf'
         self.last_updated = -1
         self.orig_data = None
+        self.mode = 'copy'
+        self.block_files = set()
+        self.block_lists = set()
+        self.dns_address = _DNS_ADDRESS
+        self.dns_upstream = None
+        self._domains = None
+        self._section = None
+        self._sinkhole = None
+        self._dns_enabled = False
+        self._resolv_updated = -1
+
+    def _flush_dns_cache(self):
+        """ Flushes the system dns cache, so changes to the hosts file are
+            picked up.
+            """
+
+        # MacOS X generally requires flushing the system dns cache to pick
+        # up changes to the hosts file:
+        #   dscacheutil -flushcache or lookupd -flushcache
+        if common.IS_MACOSX:
+            dscacheutil, lookupd = [common.which(x) for x in
+                                    ('dscacheutil', 'lookupd')]
+            self.run_root(' '.join([dscacheutil or lookupd,
+                                    '-flushcache']))
+
+    def _get_domains(self, task):
+        """ Returns sorted list of domains to block, including those from
+            blocklist files.
+
+            `task`
+                ``Task`` instance.
+            """
+
+        if self._domains is None:
+            cache_dir = os.path.join(task.base_dir, '.cache')
+            list_dir = os.path.join(task.base_dir, 'blocklists')
+
+            filenames = list(self.block_files)
+            filenames.extend(os.path.join(list_dir, name)
+                             for name in self.block_lists)
+
+            domains = set(self.domains)
+            for filename in filenames:
+                domains.update(_compile_blocklist(filename, cache_dir) or ())
+
+            self._domains = sorted(domains)
+
+        return self._domains
+
+    def _get_section(self, task):
+        """ Returns hosts file section data for blocked domains.
+
+            `task`
+                ``Task`` instance.
+            """
+
+        if self._section is None:
+            self._section = (_SECTION_BEGIN +
+                             ''.join('127.0.0.1\t{0}\t# FOCUS\n'.format(d)
+                                     for d in self._get_domains(task)) +
+                             _SECTION_END)
+        return self._section
+
+    def _patch_hosts(self, task, disable=False):
+        """ Updates only the section of the hosts file managed by focus.
+
+            `task`
+                ``Task`` instance.
+            `disable`
+                Set to ``True`` to remove the section; otherwise, ``False``
+                will add or update it.
+
+            Returns boolean.
+            """
+
+        try:
+            if (not disable and self.last_updated
+                    == os.path.getmtime(self.hosts_file)):
+                return True
+
+        except OSError:
+            return False  # nothing to patch
+
+        section = None if disable else self._get_section(task)
+        prior = self.last_updated
+
+        self.last_updated = _patch_file(self.hosts_file, section,
+                                        self.run_root)
+        if self.last_updated is None:
+            self.last_updated = -1
+            return False
+
+        if self.last_updated != prior:
+            self._flush_dns_cache()
+        return True
+
+    def on_taskprepare(self, task):
+        """ Starts the dns responder, while the task daemon may still have
+            root privileges to bind its port. Resolver configuration left
+            pointing at a responder that's no longer running is restored
+            first.
+            """
+
+        restore_resolver(self.resolv_file, self.run_root)
+
+        if self.mode != 'dns':
+            return
+
+        upstream = self.dns_upstream
+        if not upstream:
+            # the responder only forwards over IPv4
+            servers = [x for x in dnssink.get_nameservers(self.resolv_file)
+                       if x != self.dns_address[0] and _is_ipv4(x)]
+            upstream = (servers[0] if servers else _DNS_FALLBACK, 53)
+
+        sinkhole = dnssink.DnsSinkhole(self.dns_address, upstream)
+
+        if sinkhole.open():
+            self._sinkhole = sinkhole
+        else:
+            self.mode = 'patch'  # fall back to hosts file
+
+    def _handle_dns(self, task, disable=False):
+        """ Handles blocking domains using the dns responder, which the
+            system resolver is pointed at first.
+
+            `task`
+                ``Task`` instance.
+            `disable`
+                Set to ``True`` to turn off blocking; otherwise, ``False``
+                will enable blocking.
+
+            Returns boolean.
+            """
+
+        if disable:
+            self._sinkhole.set_domains(())  # unblocks immediately
+            _patch_file(self.resolv_file, None, self.run_root)
+            self._sinkhole.close()
+            return True
+
+        if not self._dns_enabled:
+            self._sinkhole.set_domains(self._get_domains(task))
+            self._dns_enabled = True
+
+        self._sinkhole.start()
+
+        try:
+            mtime = os.path.getmtime(self.resolv_file)
+        except OSError:
+            mtime = None
+
+        if mtime is None or mtime != self._resolv_updated:
+            section = '{0}nameserver {1}\n{2}'.format(
+                _SECTION_BEGIN, self.dns_address[0], _SECTION_END)
+            self._resolv_updated = _patch_file(self.resolv_file, section,
+                                               self.run_root, prepend=True)
+
+        return self._resolv_updated is not None
 
     def _handle_block(self, task, disable=False):
         """ Handles blocking domains using hosts file.
@@ -62,6 +543,12 @@ class SiteBlock(base.Plugin):
             Returns boolean.
             """
 
+        if self._sinkhole:
+            return self._handle_dns(task, disable)
+
+        if self.mode in ('patch', 'dns'):
+            return self._patch_hosts(task, disable)
+
         backup_file = os.path.join(task.task_dir, '.hosts.bak')
         self.orig_data = self.orig_data or common.readfile(backup_file)
         self.last_updated = self.last_updated or -1
@@ -97,12 +584,8 @@ class SiteBlock(base.Plugin):
         # if not restoring, tack on domains mapped
         # to localhost to end of file data
         if not disable:
-            # convert the set to a list and sort
-            domains = list(self.domains)
-            domains.sort()
-
             data += ('\n'.join('127.0.0.1\t{0}\t# FOCUS'
-                     .format(d) for d in domains) + '\n')
+                     .format(d) for d in self._get_domains(task)) + '\n')
 
         # make temp file with new host file data
         with tempfile.NamedTemporaryFile(prefix='focus_') as tempf:
@@ -114,14 +597,7 @@ class SiteBlock(base.Plugin):
                                                          self.hosts_file)):
                 return False
 
-            # MacOS X generally requires flushing the system dns cache to pick
-            # up changes to the hosts file:
-            #   dscacheutil -flushcache or lookupd -flushcache
-            if common.IS_MACOSX:
-                dscacheutil, lookupd = [common.which(x) for x in
-                                        ('dscacheutil', 'lookupd')]
-                self.run_root(' '.join([dscacheutil or lookupd,
-                                        '-flushcache']))
+            self._flush_dns_cache()
 
         if disable:
             common.safe_remove_file(backup_file)  # cleanup the backup
@@ -141,6 +617,50 @@ class SiteBlock(base.Plugin):
             """
         _extra_subs = ('www', 'm', 'mobile')
 
+        # how sites are blocked
+        if option == 'mode':
+            if len(values) != 1 or values[0] not in ('copy', 'patch', 'dns'):
+                raise ValueError(u'"mode" must be "copy", "patch" or "dns"')
+
+            self.mode = values[0]
+            return
+
+        # dns responder addresses, as host[:port]
+        if option in ('dns_address', 'dns_upstream'):
+            value = values[0] if len(values) == 1 else ''
+            host, _, port = value.partition(':')
+
+            try:
+                socket.inet_aton(host)
+                address = (host, int(port or 53))
+            except (socket.error, ValueError):
+                raise ValueError(u'"{0}" must be an IPv4 address[:port]'
+                                 .format(option))
+
+            setattr(self, option, address)
+            return
+
+        self._domains = self._section = None
+
+        # external blocklists, compiled when the task runs
+        if option == 'block_file':
+            for value in values:
+                path = os.path.realpath(os.path.expanduser(value))
+                if not os.path.isfile(path):
+                    raise ValueError(u'Blocklist "{0}" not found'
+                                     .format(value))
+                self.block_files.add(path)
+            return
+
+        # named blocklists in the data directory's 'blocklists' directory
+        if option == 'block_list':
+            for value in values:
+                if not value or os.sep in value or value.startswith('.'):
+                    raise ValueError(u'Invalid blocklist name "{0}"'
+                                     .format(value))
+                self.block_lists.add(value)
+            return
+
         if len(values) == 0:  # expect some values here..
             raise ValueError
 
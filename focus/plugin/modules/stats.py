@@ -4,18 +4,32 @@
 
 import re
 import os
+import gzip
 import datetime
-
-try:
-    import simplejson as json
-except ImportError:
-    import json
+import contextlib
 
 from focus.plugin import base
-from focus import common, errors
+from focus import errors, statstore, sessionlog
 
 MINS_IN_HOUR = 60
 MINS_IN_DAY = MINS_IN_HOUR * 24
+CHECKPOINT_MINS = 5
+
+
+class _IOWriter(object):
+    """ File-like wrapper to write exported stats to an io stream.
+
+        `io`
+            ``IOStream`` instance.
+        """
+
+    def __init__(self, io):
+        self.io = io
+
+    def write(self, buf):
+        """ Writes buffer to io stream, as is.
+            """
+        self.io.write(buf, newline=False)
 
 
 class Stats(base.Plugin):
@@ -24,9 +38,13 @@ class Stats(base.Plugin):
     name = 'Stats'
     version = '0.1'
     target_version = '>=0.1'
-    events = ['task_end']
+    events = ['task_run', 'task_end']
     command = 'stat'
 
+    def __init__(self):
+        super(Stats, self).__init__()
+        self._checkpoint = 0
+
     def _sdir(self, base_dir):
         """ Return path to stats directory.
 
@@ -35,7 +53,7 @@ class Stats(base.Plugin):
 
             Returns string.
             """
-        return os.path.join(base_dir, '.stats')
+        return statstore.get_stats_dir(base_dir)
 
     def _setup_dir(self, base_dir):
         """ Creates stats directory for storing stat files.
@@ -52,7 +70,7 @@ class Stats(base.Plugin):
                 raise errors.DirectorySetupFail()
 
     def _log_task(self, task):
-        """ Logs task record to file.
+        """ Logs task record to stats store, replacing any checkpoints.
 
             `task`
                 ``Task`` instance.
@@ -61,55 +79,34 @@ class Stats(base.Plugin):
             return
 
         self._setup_dir(task.base_dir)
-        stats_dir = self._sdir(task.base_dir)
+
+        try:
+            statstore.reconcile_session(self._sdir(task.base_dir), task.name,
+                                        task.start_time, task.duration)
+        except (IOError, OSError, statstore.Error):
+            pass
+
+    def _checkpoint_task(self, task):
+        """ Checkpoints the task's current duration, once every
+            ``CHECKPOINT_MINS`` minutes, so it's logged even if the task
+            daemon doesn't get to end the task.
+
+            `task`
+                ``Task`` instance.
+            """
+
         duration = task.duration
+        if duration - self._checkpoint < CHECKPOINT_MINS:
+            return
 
-        while duration > 0:
-            # build filename
-            date = (datetime.datetime.now() -
-                    datetime.timedelta(minutes=duration))
-            date_str = date.strftime('%Y%m%d')
-            filename = os.path.join(stats_dir, '{0}.json'.format(date_str))
-
-            with open(filename, 'a+') as file_:
-                # fetch any existing data
-                try:
-                    file_.seek(0)
-                    data = json.loads(file_.read())
-                except (ValueError, OSError):
-                    data = {}
-
-                if not task.name in data:
-                    data[task.name] = 0
-
-                # how much total time for day
-                try:
-                    total_time = sum(int(x) for x in data.values())
-                    if total_time > MINS_IN_DAY:
-                        total_time = MINS_IN_DAY
-
-                except ValueError:
-                    total_time = 0
-
-                # constrain to single day
-                amount = duration
-                if amount + total_time > MINS_IN_DAY:
-                    amount = MINS_IN_DAY - total_time
-
-                    # invalid or broken state, bail
-                    if amount <= 0:
-                        break
-
-                data[task.name] += amount
-                duration -= amount
-
-                # write file
-                try:
-                    file_.seek(0)
-                    file_.truncate(0)
-                    file_.write(json.dumps(data))
-                except (ValueError, OSError):
-                    pass
+        self._checkpoint = duration
+
+        try:
+            self._setup_dir(task.base_dir)
+            statstore.checkpoint_session(self._sdir(task.base_dir), task.name,
+                                         task.start_time, duration)
+        except (errors.DirectorySetupFail, IOError, OSError):
+            pass
 
     def _fuzzy_time_parse(self, value):
         """ Parses a fuzzy time value into a meaningful interpretation.
@@ -155,33 +152,66 @@ class Stats(base.Plugin):
         """ Fetches statistic information for given task and start range.
             """
 
-        stats = []
-        stats_dir = self._sdir(task.base_dir)
-        date = start_date
-        end_date = datetime.date.today()
-        delta = datetime.timedelta(days=1)
+        store = statstore.open_store(self._sdir(task.base_dir))
 
-        while date <= end_date:
-            date_str = date.strftime('%Y%m%d')
-            filename = os.path.join(stats_dir, '{0}.json'.format(date_str))
+        try:
+            # sort descending by time
+            return [(date, sorted(data.iteritems(), key=lambda x: x[1],
+                                  reverse=True))
+                    for date, data in store.iter_days(start_date,
+                                                      datetime.date.today())]
+        finally:
+            store.close()
 
-            if os.path.exists(filename):
-                try:
-                    # fetch stats content
-                    with open(filename, 'r') as file_:
-                        data = json.loads(file_.read())
+    def _get_rollups(self, task, period, start_date):
+        """ Fetches statistic rollups for given task, period and start range.
+            Task lifetime rollups aren't limited by the start range.
+            """
 
-                    # sort descending by time
-                    stats.append((date, sorted(data.iteritems(),
-                                               key=lambda x: x[1],
-                                               reverse=True)))
+        store = statstore.open_store(self._sdir(task.base_dir))
 
-                except (json.JSONDecodeError, OSError):
-                    pass
+        if period == 'task':
+            start_date = None
 
-            date += delta  # next day
+        try:
+            # sort descending by time
+            return [(key, sorted(data.iteritems(), key=lambda x: x[1],
+                                 reverse=True))
+                    for key, data in store.get_rollups(period, start_date)]
+        finally:
+            store.close()
 
-        return stats
+    def _print_sessions(self, env, start_date):
+        """ Prints each task session ending from start date through today.
+
+            `env`
+                ``Environment`` object.
+            `start_date`
+                ``datetime.date`` instance.
+            """
+
+        log = sessionlog.SessionLog(self._sdir(env.task.base_dir))
+        date = None
+
+        for name, start, end in log.iter_sessions(start_date,
+                                                  datetime.date.today()):
+            if end.date() != date:
+                date = end.date()
+                env.io.write('')
+                env.io.write('[ {0} ]'.format(date.strftime('%Y-%m-%d')))
+                env.io.write('')
+
+            delta = end - start
+            mins = (delta.days * MINS_IN_DAY * 60 + delta.seconds) // 60
+            if len(name) > 55:
+                name = name[:55] + '...'
+            env.io.write(u'   {0} - {1} {2:>5} - {3}'.format(
+                start.strftime('%H:%M'), end.strftime('%H:%M'),
+                '{0}:{1:02}'.format(mins // MINS_IN_HOUR,
+                                    mins % MINS_IN_HOUR), name))
+
+        if date is None:
+            env.io.write('No sessions found.')
 
     def _print_stats(self, env, stats):
         """ Prints statistic information using io stream.
@@ -189,7 +219,7 @@ class Stats(base.Plugin):
             `env`
                 ``Environment`` object.
             `stats`
-                Tuple of task stats for each date.
+                Tuple of task stats for each date, or rollup key string.
             """
 
         def _format_time(mins):
@@ -217,7 +247,9 @@ class Stats(base.Plugin):
         for date, tasks in stats:
             env.io.write('')
             total_mins = float(sum(v[1] for v in tasks))
-            env.io.write('[ {0} ]'.format(date.strftime('%Y-%m-%d')))
+            if isinstance(date, datetime.date):
+                date = date.strftime('%Y-%m-%d')
+            env.io.write('[ {0} ]'.format(date))
             env.io.write('')
 
             for name, mins in tasks:
@@ -248,6 +280,71 @@ class Stats(base.Plugin):
         parser.add_argument('start', nargs='?',
                             help='starting period. defaults to today',
                             default='today')
+        parser.add_argument('--by', choices=statstore.ROLLUPS,
+                            help='show totals per ISO week, month or over '
+                                 'the lifetime of tasks, instead of per day')
+        parser.add_argument('--sessions', action='store_true',
+                            help='show each task session, with its start '
+                                 'and end time')
+        parser.add_argument('--export', choices=statstore.EXPORT_FORMATS,
+                            help='export stats records as csv or jsonl')
+        parser.add_argument('--since', metavar='PERIOD',
+                            help='first day to export. defaults to the '
+                                 'earliest stats')
+        parser.add_argument('--until', metavar='PERIOD',
+                            help='last day to export. defaults to today')
+        parser.add_argument('--output', metavar='FILE',
+                            help='file to export to, compressed if it ends '
+                                 'with .gz. defaults to standard output')
+        parser.add_argument('--migrate', metavar='BACKEND',
+                            choices=sorted(statstore.BACKENDS),
+                            help='move stats to another storage backend: '
+                                 '{0}'.format(', '.join(
+                                     sorted(statstore.BACKENDS))))
+
+    def _export(self, env, args):
+        """ Streams stats records to a file or the io stream.
+
+            `env`
+                Runtime ``Environment`` instance.
+            `args`
+                Arguments object from arg parser.
+            """
+
+        dates = []
+
+        for value in (args.since, args.until):
+            date = None
+            if value:
+                date = self._fuzzy_time_parse(value)
+                if not date:
+                    raise errors.FocusError(u'Invalid period "{0}" provided'
+                                            .format(value))
+            dates.append(date)
+
+        store = statstore.open_store(self._sdir(env.task.base_dir))
+
+        try:
+            if not args.output:
+                statstore.export(store, _IOWriter(env.io), args.export,
+                                 *dates)
+                return
+
+            if args.output.endswith('.gz'):
+                file_ = gzip.open(args.output, 'wb')
+            else:
+                file_ = open(args.output, 'wb')
+
+            with contextlib.closing(file_):
+                count = statstore.export(store, file_, args.export, *dates)
+
+            env.io.success(u'Exported {0} stats records.'.format(count))
+
+        except (IOError, OSError, statstore.Error):
+            raise errors.FocusError(u'Failed to export stats')
+
+        finally:
+            store.close()
 
     def execute(self, env, args):
         """ Prints task information.
@@ -258,13 +355,41 @@ class Stats(base.Plugin):
                 Arguments object from arg parser.
             """
 
+        if args.migrate:
+            self._setup_dir(env.task.base_dir)
+            try:
+                count = statstore.migrate(self._sdir(env.task.base_dir),
+                                          args.migrate)
+            except (IOError, OSError, statstore.Error):
+                raise errors.FocusError(u'Failed to migrate stats')
+
+            env.io.success(u'Migrated {0} days of stats to "{1}".'
+                           .format(count, args.migrate))
+            return
+
+        if args.export:
+            self._export(env, args)
+            return
+
         start = self._fuzzy_time_parse(args.start)
         if not start:
             raise errors.FocusError(u'Invalid start period provided')
 
-        stats = self._get_stats(env.task, start)
+        if args.sessions:
+            self._print_sessions(env, start)
+            return
+
+        if args.by:
+            stats = self._get_rollups(env.task, args.by, start)
+        else:
+            stats = self._get_stats(env.task, start)
         self._print_stats(env, stats)
 
+    def on_taskrun(self, task):
+        """ Checkpoints task usage stats while task is running.
+            """
+        self._checkpoint_task(task)
+
     def on_taskend(self, task):
         """ Logs task usage stats when task ends.
             """
@@ -7,7 +7,7 @@ import os
 import tempfile
 import subprocess
 
-from focus import errors, parser, common
+from focus import errors, parser, common, daemon
 from focus.plugin import base, registration
 
 
@@ -205,6 +205,12 @@ class TaskStart(base.Plugin):
         if env.task.start(args.task_name):
             env.io.success(u'Task Loaded.')
 
+            # let the user know if the daemon was slow to start
+            latency = env.task.start_latency
+            if latency and latency > daemon.START_LATENCY_BUDGET:
+                env.io.write(u'Task daemon took {0:.2f}s to start.'
+                             .format(latency))
+
 
 class TaskStop(base.Plugin):
     """ Ends the active task.
@@ -2,10 +2,44 @@
     for automatically ending an active task after a designated time period.
     """
 
+import re
+import math
+
 from focus import common
 from focus.plugin import base
 
 
+# duration with units, e.g. 90s, 25m, 1h30m
+_DURATION_RE = re.compile(r'^(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s)?$', re.I)
+
+
+def _parse_duration(value):
+    """ Parses a duration value. A plain number is in minutes; otherwise,
+        hours, minutes and seconds are given with units (e.g. ``1h30m``).
+
+        `value`
+            Duration string.
+
+        Returns number of minutes, which is fractional for durations given in
+        seconds.
+
+        * Raises ``ValueError`` if value is invalid.
+        """
+
+    if value.isdigit():
+        return int(value)
+
+    match = _DURATION_RE.match(value)
+    if not value or not match:
+        raise ValueError
+
+    hours, mins, secs = (int(v or 0) for v in match.groups())
+    if secs % 60:
+        return hours * 60 + mins + secs / 60.0
+
+    return hours * 60 + mins + secs // 60
+
+
 class Timer(base.Plugin):
     """ Displays remaining time for the active task.
         """
@@ -19,6 +53,8 @@ class Timer(base.Plugin):
         # Timer duration for task
         # --------------------------------
         # Example: duration 30;
+        #          duration 1h30m;
+        #          duration 90s;
 
         {
             'name': 'duration',
@@ -50,7 +86,7 @@ class Timer(base.Plugin):
 
         msg = u'Time Left: {0}m' if not args.short else '{0}'
         mins = max(0, self.total_duration - env.task.duration)
-        env.io.write(msg.format(mins))
+        env.io.write(msg.format(int(math.ceil(mins))))
 
     def parse_option(self, option, block_name, *values):
         """ Parse duration option for timer.
@@ -60,12 +96,13 @@ class Timer(base.Plugin):
             if len(values) != 1:
                 raise TypeError
 
-            self.total_duration = int(values[0])
+            self.total_duration = _parse_duration(values[0])
             if self.total_duration <= 0:
                 raise ValueError
 
         except ValueError:
-            pattern = u'"{0}" must be an integer > 0'
+            pattern = (u'"{0}" must be minutes > 0 or a duration with units '
+                       u'(e.g. 90s, 25m, 1h30m)')
             raise ValueError(pattern.format(option))
 
     def on_taskstart(self, task):
@@ -19,7 +19,7 @@ _command_hooks = registry.Registry()
 _option_hooks = registry.ExtRegistry()
 _registered = registry.ExtRegistry()  # all installed plugins
 
-_EVENT_VALS = ('task_start', 'task_run', 'task_end')
+_EVENT_VALS = ('task_prepare', 'task_start', 'task_run', 'task_end')
 
 
 def _is_plugin_disabled(plugin):
@@ -114,7 +114,8 @@ def register(hook_type, key, plugin_cls, properties=None):
                 'command' - Name of the command
 
                 'event'   - Name of the event to associate with plugin:
-                                ('task_start', 'task_run', 'task_end')
+                                ('task_prepare', 'task_start', 'task_run',
+                                 'task_end')
 
                 'option'  - Option name for task config file. Name should be
                             prefixed with block name if it has one:
@@ -280,22 +281,30 @@ def get_command_hook(command, task_active=True):
     return None
 
 
-def run_event_hooks(event, task):
+def run_event_hooks(event, task, plugins=None):
     """ Executes registered task event plugins for the provided event and task.
 
         `event`
             Name of the event to trigger for the plugin:
-                ('task_start', 'task_run', 'task_end')
+                ('task_prepare', 'task_start', 'task_run', 'task_end')
         `task`
             ``Task`` instance.
+        `plugins`
+            List of ``Plugin`` instances to limit to. Default: all registered.
+
+        Returns ``True`` if any plugin reported activity (returned a true
+        value from its event hook).
         """
 
+    active = False
+
     # get chain of classes registered for this event
     call_chain = _event_hooks.get(event)
 
     if call_chain:
         # lookup the associated class method for this event
         event_methods = {
+            'task_prepare': 'on_taskprepare',
             'task_start': 'on_taskstart',
             'task_run': 'on_taskrun',
             'task_end': 'on_taskend'
@@ -306,12 +315,23 @@ def run_event_hooks(event, task):
             for _, get_plugin in call_chain:
                 plugin_obj = get_plugin()
 
+                if not plugins is None and not plugin_obj in plugins:
+                    continue
+
                 if not _is_plugin_disabled(plugin_obj):
+                    # attribute any background processes to this plugin
+                    common.set_child_owner(plugin_obj.name)
+
                     try:
-                        getattr(plugin_obj, method)(task)  # execute
+                        if getattr(plugin_obj, method)(task):  # execute
+                            active = True
                     except Exception:
                         # TODO: log these issues for plugin author or user
                         pass
+                    finally:
+                        common.set_child_owner(None)
+
+    return active
 
 
 def run_option_hooks(parser, disable_missing=True):
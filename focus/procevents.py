@@ -0,0 +1,175 @@
+""" This module provides process event notifications from the Linux kernel's
+    netlink process connector, so new programs can be acted upon as soon as
+    they're executed, rather than found by scanning the process table.
+
+    Subscribing requires root privileges (CAP_NET_ADMIN), though the socket
+    can be used after privileges are dropped.
+    """
+
+import os
+import errno
+import socket
+import struct
+
+__all__ = ('ExecMonitor',)
+
+
+# linux/netlink.h, linux/connector.h, linux/cn_proc.h
+_NETLINK_CONNECTOR = 11
+_NLMSG_DONE = 3
+_CN_IDX_PROC = 1
+_CN_VAL_PROC = 1
+_PROC_CN_MCAST_LISTEN = 1
+_PROC_CN_MCAST_IGNORE = 2
+_PROC_EVENT_EXEC = 0x00000002
+
+_NLMSGHDR = struct.Struct('=IHHII')  # len, type, flags, seq, pid
+_CN_MSG = struct.Struct('=IIIIHH')  # idx, val, seq, ack, len, flags
+_PROC_EVENT = struct.Struct('=IIQ')  # what, cpu, timestamp
+_EXEC_EVENT = struct.Struct('=II')  # pid, tgid
+
+_RECV_SIZE = 65536
+
+
+class ExecMonitor(object):
+    """ Receives notifications for programs executed on the system.
+
+        Example Usage::
+
+            >>> monitor = ExecMonitor()
+            >>> if monitor.open():
+            ...     select.select([monitor], [], [])
+            ...     pids = monitor.read_execs()
+        """
+
+    def __init__(self):
+        self._sock = None
+
+    def _send_op(self, op):
+        """ Sends connector operation to kernel.
+
+            `op`
+                ``_PROC_CN_MCAST_LISTEN`` or ``_PROC_CN_MCAST_IGNORE``.
+            """
+
+        data = struct.pack('=I', op)
+        cn_msg = _CN_MSG.pack(_CN_IDX_PROC, _CN_VAL_PROC, 0, 0, len(data), 0)
+        size = _NLMSGHDR.size + len(cn_msg) + len(data)
+        header = _NLMSGHDR.pack(size, _NLMSG_DONE, 0, 0, os.getpid())
+        self._sock.send(header + cn_msg + data)
+
+    def open(self):
+        """ Subscribes to process events.
+
+            Returns ``True`` if subscribed; ``False`` if not supported or
+            not privileged.
+            """
+
+        if self._sock:
+            return True
+
+        if not hasattr(socket, 'AF_NETLINK'):
+            return False
+
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM,
+                                 _NETLINK_CONNECTOR)
+        except socket.error:
+            return False
+
+        try:
+            sock.bind((0, _CN_IDX_PROC))
+            self._sock = sock
+            self._send_op(_PROC_CN_MCAST_LISTEN)
+            sock.setblocking(False)
+            return True
+
+        except (socket.error, OSError):
+            self._sock = None
+            sock.close()
+            return False
+
+    def close(self):
+        """ Unsubscribes from process events.
+            """
+
+        if self._sock:
+            try:
+                self._send_op(_PROC_CN_MCAST_IGNORE)
+            except socket.error:
+                pass
+
+            self._sock.close()
+            self._sock = None
+
+    def fileno(self):
+        """ Returns socket file descriptor, for use with ``select``.
+            """
+        return self._sock.fileno() if self._sock else None
+
+    def read_execs(self):
+        """ Reads pending notifications, without blocking.
+
+            Returns list of process identifiers that executed a program, or
+            ``None`` if notifications were lost (the socket buffer overran)
+            or the monitor isn't open.
+            """
+
+        if not self._sock:
+            return None
+
+        pids = []
+
+        while True:
+            try:
+                data = self._sock.recv(_RECV_SIZE)
+
+            except socket.error as exc:
+                if exc.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                if exc.args[0] == errno.EINTR:
+                    continue
+                return None  # ENOBUFS: events were dropped
+
+            if not data:
+                break
+
+            pids.extend(_parse_execs(data))
+
+        return pids
+
+
+def _parse_execs(data):
+    """ Parses netlink messages for exec notifications.
+
+        `data`
+            Buffer received from netlink socket.
+
+        Returns list of process identifiers.
+        """
+
+    pids = []
+    offset = 0
+
+    while offset + _NLMSGHDR.size <= len(data):
+        size = _NLMSGHDR.unpack_from(data, offset)[0]
+        if size < _NLMSGHDR.size:
+            break
+
+        pos = offset + _NLMSGHDR.size
+        end = pos + _CN_MSG.size + _PROC_EVENT.size + _EXEC_EVENT.size
+
+        if end <= len(data):
+            idx, val = _CN_MSG.unpack_from(data, pos)[:2]
+            pos += _CN_MSG.size
+            what = _PROC_EVENT.unpack_from(data, pos)[0]
+            pos += _PROC_EVENT.size
+
+            if (idx, val, what) == (_CN_IDX_PROC, _CN_VAL_PROC,
+                                    _PROC_EVENT_EXEC):
+                pids.append(_EXEC_EVENT.unpack_from(data, pos)[1])  # tgid
+
+        # messages are aligned to 4 bytes
+        offset += (size + 3) & ~3
+
+    return pids
@@ -0,0 +1,655 @@
+""" This module provides a light-weight process table reader.
+
+    On Linux, process details are read directly from ``/proc`` in a single
+    pass: the status file is read first, so processes not owned by the
+    requested user are skipped before anything else is read. Elsewhere,
+    ``psutil`` is used.
+    """
+
+import os
+import re
+import sys
+import time
+import errno
+import select
+import signal
+import fnmatch
+
+try:
+    import ctypes
+    import ctypes.util
+except ImportError:
+    ctypes = None
+
+import psutil
+
+from focus import common
+
+__all__ = ('ProcessInfo', 'ProcessMatcher', 'TERMINATED', 'KILLED', 'EXITED',
+           'DENIED', 'SURVIVED', 'get_pids', 'get_last_pid',
+           'get_start_time', 'get_exe',
+           'read_process', 'scan', 'terminate', 'terminate_all')
+
+
+_PROC_DIR = '/proc'
+
+# outcomes for `terminate_all`
+TERMINATED = 'terminated'  # exited after SIGTERM
+KILLED = 'killed'  # exited after SIGKILL
+EXITED = 'exited'  # already exited before being signalled
+DENIED = 'denied'  # not permitted to signal
+SURVIVED = 'survived'  # still running after SIGKILL
+
+# linux pidfd syscalls; numbers are shared by all architectures
+_SYS_PIDFD_SEND_SIGNAL = 424
+_SYS_PIDFD_OPEN = 434
+_POLL_INTERVAL = 0.05  # seconds between checks, without pidfds
+
+
+def _load_libc():
+    """ Loads libc for system calls not wrapped by python.
+
+        Returns ``ctypes.CDLL`` instance or ``None``.
+        """
+
+    if ctypes is None or not sys.platform.startswith('linux'):
+        return None
+
+    try:
+        return ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno=True)
+    except OSError:
+        return None
+
+_libc = _load_libc()
+_pidfd_supported = _libc is not None
+
+
+class ProcessInfo(object):
+    """ Compact record for a process.
+
+        `pid`
+            System process identifier.
+        `uid`
+            Real user identifier.
+        `name`
+            Process name.
+        `exe`
+            Path to executable or ``None`` if not accessible.
+        `start_time`
+            Process start time; along with the pid, uniquely identifies the
+            process.
+        `cmdline`
+            List of command-line arguments or ``None`` if not read.
+        """
+
+    __slots__ = ('pid', 'uid', 'name', 'exe', 'start_time', 'cmdline')
+
+    def __init__(self, pid, uid, name, exe=None, start_time=None,
+                 cmdline=None):
+        self.pid = pid
+        self.uid = uid
+        self.name = name
+        self.exe = exe
+        self.start_time = start_time
+        self.cmdline = cmdline
+
+    def __repr__(self):
+        return 'ProcessInfo (pid={0}, uid={1}, name={2})'.format(
+            self.pid, self.uid, self.name)
+
+
+class ProcessMatcher(object):
+    """ Matches process records against a set of rules. Rules are compiled
+        into one combined regular expression per attribute, so each record is
+        checked with at most three searches however many rules there are.
+
+        Supported rules::
+            name:<name>      - Process name is exactly <name>.
+            glob:<pattern>   - Executable path matches shell pattern.
+            re:<regex>       - Executable path matches regular expression.
+            cmd:<substring>  - Command-line contains <substring>.
+
+        Rules without a prefix are treated as ``name:`` rules.
+
+        `rules`
+            List of rule strings.
+
+        * Raises ``ValueError`` if a rule is invalid.
+        """
+
+    def __init__(self, rules):
+        names, paths, cmds = [], [], []
+
+        for rule in rules:
+            kind, sep, value = rule.partition(':')
+            if not sep:
+                kind, value = 'name', rule
+
+            if not value:
+                raise ValueError(u'Invalid rule "{0}"'.format(rule))
+
+            if kind == 'name':
+                names.append(re.escape(value))
+
+            elif kind == 'glob':
+                pattern = fnmatch.translate(value)
+
+                # strip end anchor and flags, which vary by python version
+                pattern = re.sub(r'(\\Z\(\?ms\)|\$)$', '', pattern)
+                paths.append(pattern + r'\Z')
+
+            elif kind == 're':
+                try:
+                    re.compile(value)
+                except re.error:
+                    raise ValueError(u'Invalid regex "{0}"'.format(value))
+                paths.append(value)
+
+            elif kind == 'cmd':
+                cmds.append(re.escape(value))
+
+            else:
+                raise ValueError(u'Invalid rule "{0}"'.format(rule))
+
+        compile_ = lambda patterns, fmt: (
+            re.compile(fmt.format('|'.join('(?:{0})'.format(p)
+                                           for p in patterns)))
+            if patterns else None)
+
+        self._name_re = compile_(names, r'(?:{0})\Z')
+        self._path_re = compile_(paths, '{0}')
+        self._cmd_re = compile_(cmds, '{0}')
+
+    @property
+    def needs_cmdline(self):
+        """ Determines if command-line arguments are needed for matching.
+            """
+        return self._cmd_re is not None
+
+    def matches(self, info, path=None):
+        """ Determines if a process matches any rule.
+
+            `info`
+                ``ProcessInfo`` instance.
+            `path`
+                Executable path, if known better than `info.exe`.
+
+            Returns boolean.
+            """
+
+        if self._name_re and info.name and self._name_re.match(info.name):
+            return True
+
+        path = path or info.exe
+        if self._path_re and path and self._path_re.match(path):
+            return True
+
+        if self._cmd_re and info.cmdline:
+            if self._cmd_re.search(' '.join(info.cmdline)):
+                return True
+
+        return False
+
+
+def _has_proc():
+    """ Determines if the ``/proc`` filesystem is available.
+        """
+    return os.path.isdir(os.path.join(_PROC_DIR, 'self'))
+
+
+def _read(pid, name):
+    """ Reads a file for a process, with as few system calls as possible.
+
+        `pid`
+            System process identifier.
+        `name`
+            Filename within process directory.
+
+        Returns string or ``None``.
+        """
+
+    try:
+        fd = os.open(os.path.join(_PROC_DIR, str(pid), name), os.O_RDONLY)
+    except OSError:
+        return None
+
+    try:
+        chunks = []
+
+        while True:
+            chunk = os.read(fd, 4096)
+            chunks.append(chunk)
+
+            # small enough that one read usually does it
+            if len(chunk) < 4096:
+                break
+
+        return ''.join(chunks)
+
+    except OSError:
+        return None
+
+    finally:
+        os.close(fd)
+
+
+def get_pids():
+    """ Gets the identifiers for all processes on the system.
+
+        Returns set of integers.
+        """
+
+    # linux, one directory read rather than a full process table scan
+    if _has_proc():
+        try:
+            return set(int(name) for name in os.listdir(_PROC_DIR)
+                       if name.isdigit())
+        except OSError:
+            pass
+
+    return set(psutil.get_pid_list())
+
+
+def get_last_pid():
+    """ Gets the last process identifier the kernel allocated. Identifiers
+        are allocated in increasing order, wrapping around, so an identifier
+        is only reused once the last one allocated has passed it again.
+
+        Returns integer or ``None`` if not available.
+        """
+
+    try:
+        with open(os.path.join(_PROC_DIR, 'sys', 'kernel', 'ns_last_pid'),
+                  'r') as file_:
+            return int(file_.read())
+
+    except (IOError, ValueError):
+        return None
+
+
+def get_start_time(pid):
+    """ Gets the start time for a process.
+
+        `pid`
+            System process identifier.
+
+        Returns value or ``None`` if the process doesn't exist.
+        """
+
+    if _has_proc():
+        data = _read(pid, 'stat')
+        if not data:
+            return None
+
+        # skip the process name, it can contain spaces; start time is the
+        # 22nd field
+        try:
+            return int(data.rsplit(')', 1)[1].split()[19])
+        except (IndexError, ValueError):
+            return None
+
+    try:
+        return psutil.Process(pid).create_time
+
+    except (psutil.AccessDenied, psutil.NoSuchProcess):
+        return None
+
+
+def get_exe(pid):
+    """ Gets the executable path for a process, which changes if the
+        process executes another program.
+
+        `pid`
+            System process identifier.
+
+        Returns string or ``None`` if not available.
+        """
+
+    try:
+        path = os.readlink(os.path.join(_PROC_DIR, str(pid), 'exe'))
+    except OSError:
+        return None
+
+    # executable was replaced (e.g. upgraded) while running
+    if path.endswith(' (deleted)'):
+        path = path[:-10]
+
+    return path
+
+
+def _read_status(pid):
+    """ Reads process name and real user identifier from status file.
+
+        Returns tuple (name, uid) or ``None``.
+        """
+
+    data = _read(pid, 'status')
+    if not data:
+        return None
+
+    name = uid = None
+
+    for line in data.split('\n'):
+        if line.startswith('Name:'):
+            name = line[5:].strip()
+        elif line.startswith('Uid:'):
+            uid = int(line.split()[1])  # real, effective, saved, fs
+            break
+
+    if uid is None:
+        return None
+
+    return name, uid
+
+
+def _read_psutil(pid, uid, cmdline):
+    """ Reads process details using ``psutil``.
+
+        Returns ``ProcessInfo`` instance or ``None``.
+        """
+
+    try:
+        proc = psutil.Process(pid)
+        real_uid = proc.uids.real
+
+        if not uid is None and real_uid != uid:
+            return None
+
+        info = ProcessInfo(pid, real_uid, proc.name,
+                           start_time=proc.create_time)
+
+        try:
+            info.exe = proc.exe
+        except psutil.AccessDenied:
+            pass
+
+        if cmdline:
+            info.cmdline = proc.cmdline
+
+        return info
+
+    except (psutil.AccessDenied, psutil.NoSuchProcess):
+        return None
+
+
+def read_process(pid, uid=None, cmdline=False):
+    """ Reads details for a process.
+
+        `pid`
+            System process identifier.
+        `uid`
+            User identifier to limit to. Default: any user.
+        `cmdline`
+            Set to ``True`` to also read command-line arguments.
+
+        Returns ``ProcessInfo`` instance or ``None`` if the process doesn't
+        exist or isn't owned by `uid`.
+        """
+
+    if not _has_proc():
+        return _read_psutil(pid, uid, cmdline)
+
+    status = _read_status(pid)
+    if not status:
+        return None
+
+    name, real_uid = status
+    if not uid is None and real_uid != uid:
+        return None
+
+    start_time = get_start_time(pid)
+    if start_time is None:
+        return None  # exited
+
+    info = ProcessInfo(pid, real_uid, name, get_exe(pid), start_time)
+
+    if cmdline:
+        data = _read(pid, 'cmdline')
+        info.cmdline = data.rstrip('\0').split('\0') if data else []
+
+    return info
+
+
+def scan(uid=None, cmdline=False):
+    """ Reads details for all processes on the system.
+
+        `uid`
+            User identifier to limit to. Default: any user.
+        `cmdline`
+            Set to ``True`` to also read command-line arguments.
+
+        Returns list of ``ProcessInfo`` instances.
+        """
+
+    processes = []
+
+    for pid in get_pids():
+        info = read_process(pid, uid, cmdline)
+        if info:
+            processes.append(info)
+
+    return processes
+
+
+def _is_alive(pid, start_time):
+    """ Determines if a process is still running; zombie processes have
+        exited.
+
+        `pid`
+            System process identifier.
+        `start_time`
+            Process start time, from `get_start_time`.
+
+        Returns boolean.
+        """
+
+    if not _has_proc():
+        try:
+            proc = psutil.Process(pid)
+            return (proc.create_time == start_time
+                    and proc.status != psutil.STATUS_ZOMBIE)
+
+        except psutil.NoSuchProcess:
+            return False
+
+    data = _read(pid, 'stat')
+    if not data:
+        return False
+
+    try:
+        fields = data.rsplit(')', 1)[1].split()
+        return fields[0] != 'Z' and int(fields[19]) == start_time
+
+    except (IndexError, ValueError):
+        return False
+
+
+def _pidfd_open(pid):
+    """ Opens a file descriptor referring to a process, which becomes
+        readable when the process exits.
+
+        `pid`
+            System process identifier.
+
+        Returns integer or ``None`` if not supported.
+        """
+
+    global _pidfd_supported
+
+    if not _pidfd_supported:
+        return None
+
+    pidfd = _libc.syscall(_SYS_PIDFD_OPEN, pid, 0)
+
+    if pidfd < 0:
+        if ctypes.get_errno() in (errno.ENOSYS, errno.EPERM):
+            # not supported or not allowed, don't try again
+            _pidfd_supported = False
+        return None
+
+    return pidfd
+
+
+def _send_signal(pid, pidfd, sig):
+    """ Signals a process, using its pidfd if available, so a reused
+        process identifier can't be signalled.
+
+        * Raises ``OSError`` on failure.
+        """
+
+    if pidfd is None:
+        os.kill(pid, sig)
+
+    elif _libc.syscall(_SYS_PIDFD_SEND_SIGNAL, pidfd, sig, None, 0) < 0:
+        code = ctypes.get_errno()
+        raise OSError(code, os.strerror(code))
+
+
+def _wait_exit(waiting, timeout):
+    """ Waits for processes to exit.
+
+        `waiting`
+            Dict of pid -> (``ProcessInfo`` instance, pidfd or ``None``).
+            Processes that exit are removed.
+        `timeout`
+            Time (seconds) to wait.
+
+        Returns list of pids that exited.
+        """
+
+    exited = []
+    deadline = common.monotonic() + timeout
+
+    while waiting:
+        polled = dict((pidfd, pid) for pid, (_, pidfd) in waiting.iteritems()
+                      if pidfd is not None)
+
+        # processes without pidfds are checked directly
+        for pid, (info, pidfd) in waiting.items():
+            if pidfd is None and not _is_alive(pid, info.start_time):
+                exited.append(waiting.pop(pid)[0].pid)
+
+        remaining = deadline - common.monotonic()
+        if not waiting or remaining <= 0:
+            break
+
+        if len(polled) < len(waiting):
+            remaining = min(remaining, _POLL_INTERVAL)
+
+        if not polled:
+            time.sleep(remaining)
+            continue
+
+        poller = select.poll()
+        for pidfd in polled:
+            poller.register(pidfd, select.POLLIN)
+
+        try:
+            events = poller.poll(remaining * 1000)
+
+        except select.error as exc:
+            if exc.args[0] == errno.EINTR:
+                continue
+            raise
+
+        for pidfd, _ in events:
+            pid = polled[pidfd]
+            os.close(pidfd)
+            waiting.pop(pid)
+            exited.append(pid)
+
+    return exited
+
+
+def terminate_all(processes, grace=2.0, kill_wait=1.0):
+    """ Terminates processes together: all are sent SIGTERM, then those
+        still running after the grace period are sent SIGKILL.
+
+        `processes`
+            Iterable of ``ProcessInfo`` instances.
+        `grace`
+            Time (seconds) to wait for processes to exit after SIGTERM.
+        `kill_wait`
+            Time (seconds) to wait for processes to exit after SIGKILL.
+
+        Returns dict of pid -> outcome (``TERMINATED``, ``KILLED``,
+        ``EXITED``, ``DENIED``, or ``SURVIVED``).
+        """
+
+    outcomes = {}
+    waiting = {}  # pid -> (info, pidfd)
+
+    def _signal(sig):
+        """ Signals waiting processes, recording failures.
+            """
+        for pid, (info, pidfd) in waiting.items():
+            try:
+                _send_signal(pid, pidfd, sig)
+
+            except OSError as exc:
+                outcomes[pid] = DENIED if exc.errno == errno.EPERM else EXITED
+                waiting.pop(pid)
+                if pidfd is not None:
+                    os.close(pidfd)
+
+    for info in processes:
+        if info.pid in outcomes or info.pid in waiting:
+            continue
+
+        # open pidfd before checking identity, so it refers to the same
+        # process that was checked
+        pidfd = _pidfd_open(info.pid)
+
+        if not _is_alive(info.pid, info.start_time):
+            outcomes[info.pid] = EXITED
+            if pidfd is not None:
+                os.close(pidfd)
+        else:
+            waiting[info.pid] = (info, pidfd)
+
+    try:
+        _signal(signal.SIGTERM)
+        for pid in _wait_exit(waiting, grace):
+            outcomes[pid] = TERMINATED
+
+        _signal(signal.SIGKILL)
+        for pid in _wait_exit(waiting, kill_wait):
+            outcomes[pid] = KILLED
+
+        for pid in waiting:
+            outcomes[pid] = SURVIVED
+
+    finally:
+        for _, pidfd in waiting.itervalues():
+            if pidfd is not None:
+                os.close(pidfd)
+
+    return outcomes
+
+
+def terminate(info, sig=signal.SIGTERM):
+    """ Signals a process, if it's still the same process.
+
+        `info`
+            ``ProcessInfo`` instance.
+        `sig`
+            Signal to send. Default: SIGTERM.
+
+        Returns ``True`` if signalled.
+
+        * Raises ``OSError`` if not permitted to signal the process.
+        """
+
+    # make sure the pid hasn't been reused since the process was read
+    if get_start_time(info.pid) != info.start_time:
+        return False
+
+    try:
+        os.kill(info.pid, sig)
+        return True
+
+    except OSError as exc:
+        if exc.errno == errno.ESRCH:
+            return False
+        raise
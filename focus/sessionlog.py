@@ -0,0 +1,277 @@
+""" This module provides a compact log of task sessions, recording when each
+    session started and ended to the second.
+
+    Sessions are stored as fixed-width binary records in append-only segment
+    files, one per month of session end times. Each segment has an index of
+    runs of records ending on the same day, so reading a date range seeks
+    straight to its records and decodes them in bulk. Task names are interned
+    in a side table, and records refer to them by their position in it.
+
+    Layout::
+        sessions/tasks        - Task names, one JSON string per line.
+        sessions/YYYYMM.seg   - Records: start, end (epoch seconds), task id.
+        sessions/YYYYMM.idx   - Runs: day ordinal, first record number.
+    """
+
+import os
+import sys
+import time
+import array
+import fcntl
+import struct
+import datetime
+import contextlib
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+__all__ = ('SessionLog',)
+
+
+_DIR_NAME = 'sessions'
+_TASKS_NAME = 'tasks'
+_LOCK_NAME = '.lock'
+
+_RECORD = struct.Struct('<III')  # start, end, task id
+_INDEX = struct.Struct('<II')  # day ordinal, record number
+_ITEM_TYPE = 'I' if array.array('I').itemsize == 4 else 'L'
+
+
+def _to_epoch(value):
+    """ Returns epoch seconds for a ``datetime.datetime`` instance.
+        """
+    return int(time.mktime(value.timetuple()))
+
+
+def _decode(data):
+    """ Decodes packed little-endian unsigned 32-bit integers.
+
+        `data`
+            Data buffer.
+
+        Returns ``array.array`` instance.
+        """
+
+    values = array.array(_ITEM_TYPE)
+    values.fromstring(data)
+
+    if sys.byteorder != 'little':
+        values.byteswap()
+
+    return values
+
+
+def _iter_months(start_date, end_date):
+    """ Returns generator of (year, month) tuples for each month in a date
+        range.
+        """
+
+    year, month = start_date.year, start_date.month
+
+    while (year, month) <= (end_date.year, end_date.month):
+        yield year, month
+
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+
+
+class SessionLog(object):
+    """ Append-only log of task sessions.
+
+        `stats_dir`
+            Stats directory.
+
+        Example Usage::
+
+            >>> log = SessionLog('/home/user/.focus/.stats')
+            >>> log.add(u'work', start_time, end_time)
+            >>> for name, start, end in log.iter_sessions(first, last):
+            ...     print name, end - start
+        """
+
+    def __init__(self, stats_dir):
+        self.path = os.path.join(stats_dir, _DIR_NAME)
+        self.tasks_file = os.path.join(self.path, _TASKS_NAME)
+
+    def _segment_file(self, year, month, ext):
+        """ Returns filename of segment or its index for a month.
+            """
+        return os.path.join(self.path,
+                            '{0:04}{1:02}.{2}'.format(year, month, ext))
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """ Holds an exclusive advisory lock on the log, which is shared by
+            all processes writing to it.
+            """
+
+        if not os.path.isdir(self.path):
+            os.mkdir(self.path)
+
+        fd = os.open(os.path.join(self.path, _LOCK_NAME),
+                     os.O_RDWR | os.O_CREAT, 0644)
+
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # releases lock
+
+    def get_task_names(self):
+        """ Returns list of interned task names, indexed by task id.
+            """
+
+        names = []
+
+        try:
+            with open(self.tasks_file, 'r') as file_:
+                for line in file_:
+                    if not line.endswith('\n'):
+                        break  # partial append
+                    names.append(json.loads(line))
+
+        except (IOError, ValueError):
+            pass
+
+        return names
+
+    def _intern(self, task_name):
+        """ Returns id of a task name, adding it to the side table if new.
+            Must be called with the lock held.
+            """
+
+        names = self.get_task_names()
+        if task_name in names:
+            return names.index(task_name)
+
+        with open(self.tasks_file, 'a') as file_:
+            # replace partial append, so ids stay in line
+            size = sum(len(json.dumps(n)) + 1 for n in names)
+            file_.truncate(size)
+            file_.write(json.dumps(task_name) + '\n')
+
+        names.append(task_name)
+        return len(names) - 1
+
+    def add(self, task_name, start_time, end_time):
+        """ Adds a session. Adding the same session again has no effect.
+
+            `task_name`
+                Task name.
+            `start_time`
+                ``datetime.datetime`` instance for start of session.
+            `end_time`
+                ``datetime.datetime`` instance for end of session.
+
+            * Raises ``IOError`` or ``OSError`` if write fails.
+            """
+
+        end = _to_epoch(end_time)
+        day = end_time.date().toordinal()
+        start = min(_to_epoch(start_time), end)
+
+        with self._locked():
+            task_id = self._intern(task_name)
+
+            # already added, by an attempt that failed after the write
+            record = (start, end, task_id)
+            try:
+                values = self._read_runs(end_time.year, end_time.month,
+                                         day, day)
+            except IOError:
+                values = ()
+
+            if any(tuple(values[i:i + 3]) == record
+                   for i in xrange(0, len(values), 3)):
+                return
+
+            seg_file = self._segment_file(end_time.year, end_time.month,
+                                          'seg')
+            idx_file = self._segment_file(end_time.year, end_time.month,
+                                          'idx')
+
+            with open(seg_file, 'ab') as seg:
+                # drop partial record left by a crash
+                seg.seek(0, os.SEEK_END)
+                count = seg.tell() // _RECORD.size
+                seg.truncate(count * _RECORD.size)
+
+                # index is written first, so records are never unindexed
+                with open(idx_file, 'ab+') as idx:
+                    idx.seek(0, os.SEEK_END)
+                    size = idx.tell() - idx.tell() % _INDEX.size
+                    idx.truncate(size)
+
+                    last_day = None
+                    if size:
+                        idx.seek(size - _INDEX.size)
+                        last_day = _INDEX.unpack(idx.read(_INDEX.size))[0]
+
+                    if day != last_day:
+                        idx.write(_INDEX.pack(day, count))
+
+                seg.write(_RECORD.pack(start, end, task_id))
+
+    def _read_runs(self, year, month, start_day, end_day):
+        """ Reads records in a segment for runs within a day range.
+
+            Returns ``array.array`` instance of record values.
+            """
+
+        try:
+            with open(self._segment_file(year, month, 'idx'), 'rb') as idx:
+                idx_data = idx.read()
+        except IOError:
+            return array.array(_ITEM_TYPE)
+
+        index = _decode(idx_data[:len(idx_data) -
+                                 len(idx_data) % _INDEX.size])
+        values = array.array(_ITEM_TYPE)
+
+        with open(self._segment_file(year, month, 'seg'), 'rb') as seg:
+            seg.seek(0, os.SEEK_END)
+            total = seg.tell() // _RECORD.size
+
+            for i in xrange(0, len(index), 2):
+                day, first = index[i], index[i + 1]
+                if not start_day <= day <= end_day:
+                    continue
+
+                last = index[i + 3] if i + 3 < len(index) else total
+                if last > first:
+                    seg.seek(first * _RECORD.size)
+                    values.extend(_decode(seg.read((last - first) *
+                                                   _RECORD.size)))
+
+        return values
+
+    def iter_sessions(self, start_date, end_date):
+        """ Gets sessions ending in a date range.
+
+            `start_date`
+                ``datetime.date`` instance for first day.
+            `end_date`
+                ``datetime.date`` instance for last day.
+
+            Returns generator of tuples: (task name, ``datetime.datetime``
+            for start, ``datetime.datetime`` for end), in the order sessions
+            were added for each day.
+            """
+
+        names = self.get_task_names()
+        start_day, end_day = start_date.toordinal(), end_date.toordinal()
+        from_epoch = datetime.datetime.fromtimestamp
+
+        for year, month in _iter_months(start_date, end_date):
+            try:
+                values = self._read_runs(year, month, start_day, end_day)
+            except IOError:
+                continue
+
+            for i in xrange(0, len(values) - 2, 3):
+                start, end, task_id = values[i:i + 3]
+                if task_id < len(names):
+                    yield names[task_id], from_epoch(start), from_epoch(end)
@@ -0,0 +1,1004 @@
+""" This module provides storage backends for task usage statistics, which are
+    recorded as minutes per task for each day. Rollups of those minutes per
+    ISO week, per month and for each task's lifetime are updated as minutes
+    are added.
+
+    Time of a running task is checkpointed by appending to a journal, which
+    is reconciled into the stats when the task ends, or when it's cleaned up
+    after its task daemon stopped.
+
+    Backends::
+        json   - One JSON file per day in the stats directory (default).
+                 Writes are locked and journaled, so concurrent task daemons
+                 and crashes don't lose totals.
+        sqlite - One indexed table in a SQLite database, which is used once
+                 stats have been migrated to it.
+    """
+
+import os
+import re
+import csv
+import fcntl
+import datetime
+import contextlib
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from StringIO import StringIO
+
+try:
+    import sqlite3
+    Error = sqlite3.Error
+except ImportError:
+    sqlite3 = None
+    Error = EnvironmentError
+
+from focus import common, sessionlog
+
+__all__ = ('Error', 'JsonStore', 'SqliteStore', 'BACKENDS', 'ROLLUPS',
+           'EXPORT_FORMATS', 'get_stats_dir', 'open_store', 'migrate',
+           'get_rollup_key', 'log_minutes', 'checkpoint_session',
+           'reconcile_session', 'iter_records', 'export')
+
+
+_DB_NAME = 'stats.db'
+_ROLLUP_NAME = 'rollups.json'
+_JOURNAL_NAME = 'journal.json'
+_LOCK_NAME = '.lock'
+_CHECKPOINT_NAME = 'checkpoints'
+_TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+_MINS_IN_DAY = 60 * 24
+_MIN_DATE = datetime.date(1900, 1, 1)  # strftime limits
+_MAX_DATE = datetime.date(9999, 12, 31)
+_RE_DAY_FILE = re.compile(r'^(\d{8})\.json$')
+_EXPORT_BATCH_SIZE = 512  # records per write
+
+
+def _date_key(date):
+    """ Returns storage key string for a date.
+        """
+    return date.strftime('%Y%m%d')
+
+
+def _parse_date_key(value):
+    """ Returns date for a storage key string.
+        """
+    return datetime.datetime.strptime(value, '%Y%m%d').date()
+
+
+def _replace_file(filename, data):
+    """ Atomically replaces the contents of a file, syncing the new contents
+        to disk before renaming them over the file.
+
+        `filename`
+            Filename to replace.
+        `data`
+            Data buffer to write.
+
+        * Raises ``IOError`` or ``OSError`` if write fails.
+        """
+
+    temp_file = '{0}.tmp'.format(filename)
+
+    with open(temp_file, 'w') as file_:
+        file_.write(data)
+        file_.flush()
+        os.fsync(file_.fileno())
+
+    os.rename(temp_file, filename)
+
+
+def _sync_dir(path):
+    """ Syncs directory entries to disk, making prior renames durable.
+
+        `path`
+            Directory path.
+        """
+
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+ROLLUPS = ('week', 'month', 'task')
+
+
+def get_rollup_key(period, date):
+    """ Returns rollup key string for the period containing a date.
+
+        `period`
+            Rollup period, see ``ROLLUPS``.
+        `date`
+            ``datetime.date`` instance.
+        """
+
+    if period == 'week':
+        year, week = date.isocalendar()[:2]
+        return '{0:04}-W{1:02}'.format(year, week)
+
+    elif period == 'month':
+        return date.strftime('%Y-%m')
+
+    return 'all'  # task lifetime
+
+
+def _build_rollups(days):
+    """ Aggregates daily stats into rollups.
+
+        `days`
+            Iterable of tuples: (``datetime.date``, dict of task name ->
+            minutes).
+
+        Returns dict of period -> rollup key -> task name -> minutes.
+        """
+
+    rollups = dict((period, {}) for period in ROLLUPS)
+
+    for date, data in days:
+        for period in ROLLUPS:
+            totals = rollups[period].setdefault(get_rollup_key(period, date),
+                                                {})
+            for task_name, minutes in data.iteritems():
+                totals[task_name] = totals.get(task_name, 0) + minutes
+
+    return rollups
+
+
+class JsonStore(object):
+    """ Stores stats in one JSON file per day.
+
+        Each change is written to a journal before the stats files are
+        replaced, while holding an advisory lock on the stats directory. A
+        journal left by a crash is replayed before stats are next read or
+        written.
+
+        `stats_dir`
+            Stats directory.
+        """
+
+    name = 'json'
+
+    def __init__(self, stats_dir):
+        self.stats_dir = stats_dir
+        self.rollup_file = os.path.join(stats_dir, _ROLLUP_NAME)
+        self.journal_file = os.path.join(stats_dir, _JOURNAL_NAME)
+        self.lock_file = os.path.join(stats_dir, _LOCK_NAME)
+        self._lock_depth = 0  # nested `_locked` calls holding the lock
+
+    def _filename(self, key):
+        """ Returns filename for date key.
+            """
+        return os.path.join(self.stats_dir, '{0}.json'.format(key))
+
+    def _read(self, key):
+        """ Reads stats for date key.
+
+            Returns dict or ``None`` if no valid stats exist.
+            """
+
+        data = common.readfile(self._filename(key))
+        if not data:
+            return None
+
+        try:
+            data = json.loads(data)
+        except ValueError:
+            return None
+
+        return data if isinstance(data, dict) else None
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """ Holds an exclusive advisory lock on the stats directory, which is
+            shared by all processes using it. Nested calls for the store
+            hold the same lock.
+            """
+
+        if self._lock_depth:
+            fd = None
+        else:
+            fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0644)
+
+        try:
+            if not fd is None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+
+        finally:
+            if not fd is None:
+                os.close(fd)  # releases lock
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """ Holds the lock while stats are read and then added to, so
+            concurrent writers don't lose updates.
+            """
+
+        with self._locked():
+            self._recover()
+            yield
+
+    def _write(self, files):
+        """ Replaces stats files as a single change, journaling their new
+            contents first. Must be called with the lock held.
+
+            `files`
+                Dict of filename, relative to stats directory -> data.
+
+            * Raises ``IOError`` or ``OSError`` if write fails.
+            """
+
+        _replace_file(self.journal_file, json.dumps(files))
+        self._replay(files)
+
+    def _replay(self, files):
+        """ Replaces stats files with journaled contents, then removes the
+            journal. Must be called with the lock held.
+
+            `files`
+                Dict of filename, relative to stats directory -> data.
+            """
+
+        for name, data in files.iteritems():
+            _replace_file(os.path.join(self.stats_dir, name), data)
+
+        _sync_dir(self.stats_dir)
+        os.remove(self.journal_file)
+
+    def _recover(self):
+        """ Replays a journal left by an interrupted write. Must be called
+            with the lock held.
+            """
+
+        data = common.readfile(self.journal_file)
+        if data is None:
+            return
+
+        try:
+            files = json.loads(data)
+        except ValueError:
+            files = None
+
+        if isinstance(files, dict):
+            self._replay(files)
+        else:
+            # journal is replaced atomically, so this isn't ours
+            common.safe_remove_file(self.journal_file)
+
+    def _check_journal(self):
+        """ Recovers from an interrupted write before stats are read.
+            """
+
+        if os.path.isfile(self.journal_file):
+            try:
+                with self._locked():
+                    self._recover()
+
+            except (IOError, OSError):
+                pass
+
+    def get_day(self, date):
+        """ Gets stats for a day.
+
+            `date`
+                ``datetime.date`` instance.
+
+            Returns dict of task name -> minutes.
+            """
+
+        self._check_journal()
+        return self._read(_date_key(date)) or {}
+
+    def _read_rollups(self):
+        """ Reads rollups, building them from daily stats if missing.
+
+            Returns dict of period -> rollup key -> task name -> minutes.
+            """
+
+        try:
+            rollups = json.loads(common.readfile(self.rollup_file) or '')
+            if isinstance(rollups, dict):
+                return rollups
+
+        except ValueError:
+            pass
+
+        return _build_rollups(self._iter_days(_MIN_DATE, _MAX_DATE))
+
+    def add(self, date, task_name, minutes):
+        """ Adds minutes to a task's total for a day.
+
+            `date`
+                ``datetime.date`` instance.
+            `task_name`
+                Task name.
+            `minutes`
+                Minutes to add.
+
+            * Raises ``IOError`` or ``OSError`` if write fails.
+            """
+
+        self.add_many([(_date_key(date), task_name, minutes)])
+
+    def add_many(self, rows):
+        """ Adds minutes for multiple tasks and days as a single change.
+
+            `rows`
+                Iterable of tuples: (date key, task name, minutes).
+
+            * Raises ``IOError`` or ``OSError`` if write fails.
+            """
+
+        with self._locked():
+            self._recover()
+
+            rollups = self._read_rollups()
+            days = {}  # date key -> task name -> minutes
+
+            for key, task_name, minutes in rows:
+                if not key in days:
+                    days[key] = self._read(key) or {}
+
+                data = days[key]
+                data[task_name] = data.get(task_name, 0) + minutes
+
+                date = _parse_date_key(key)
+                for period in ROLLUPS:
+                    totals = rollups.setdefault(period, {}).setdefault(
+                        get_rollup_key(period, date), {})
+                    totals[task_name] = totals.get(task_name, 0) + minutes
+
+            if days:
+                files = dict((os.path.basename(self._filename(key)),
+                              json.dumps(data))
+                             for key, data in days.iteritems())
+                files[_ROLLUP_NAME] = json.dumps(rollups)
+                self._write(files)
+
+    def get_rollups(self, period, start_date=None):
+        """ Gets rollups for a period.
+
+            `period`
+                Rollup period, see ``ROLLUPS``.
+            `start_date`
+                ``datetime.date`` instance. Rollups for periods ending
+                before this date are excluded.
+
+            Returns list of tuples: (rollup key, dict of task name ->
+            minutes), ordered by key.
+            """
+
+        self._check_journal()
+
+        start = get_rollup_key(period, start_date) if start_date else ''
+        rollups = self._read_rollups().get(period, {})
+
+        return [(key, rollups[key]) for key in sorted(rollups)
+                if key >= start]
+
+    def get_keys(self):
+        """ Returns sorted list of date keys with stats.
+            """
+
+        try:
+            names = os.listdir(self.stats_dir)
+        except OSError:
+            return []
+
+        return sorted(m.group(1) for m in
+                      (_RE_DAY_FILE.match(n) for n in names) if m)
+
+    def iter_days(self, start_date, end_date):
+        """ Gets stats for each day with stats in a date range.
+
+            `start_date`
+                ``datetime.date`` instance for first day.
+            `end_date`
+                ``datetime.date`` instance for last day.
+
+            Returns generator of tuples: (``datetime.date``, dict of task
+            name -> minutes).
+            """
+
+        self._check_journal()
+        return self._iter_days(start_date, end_date)
+
+    def _iter_days(self, start_date, end_date):
+        """ Gets stats for each day with stats in a date range, without
+            checking for an interrupted write.
+            """
+
+        start, end = _date_key(start_date), _date_key(end_date)
+
+        # only days that have files, rather than probing every day in range
+        for key in self.get_keys():
+            if start <= key <= end:
+                data = self._read(key)
+                if data:
+                    yield _parse_date_key(key), data
+
+    def close(self):
+        """ Releases resources used by store.
+            """
+        pass
+
+
+class SqliteStore(object):
+    """ Stores stats in a SQLite database table, indexed by date and task.
+
+        `stats_dir`
+            Stats directory.
+        """
+
+    name = 'sqlite'
+
+    def __init__(self, stats_dir):
+        self.stats_dir = stats_dir
+        self.filename = os.path.join(stats_dir, _DB_NAME)
+        self._conn = None
+
+    @property
+    def conn(self):
+        """ Returns database connection, creating tables as needed.
+            """
+
+        if not self._conn:
+            conn = sqlite3.connect(self.filename, timeout=10)
+            has_rollups = conn.execute('SELECT 1 FROM sqlite_master '
+                                       'WHERE type = ? AND name = ?',
+                                       ('table', 'rollups')).fetchone()
+            conn.execute('CREATE TABLE IF NOT EXISTS stats ('
+                         'date TEXT NOT NULL, '
+                         'task TEXT NOT NULL, '
+                         'minutes INTEGER NOT NULL DEFAULT 0, '
+                         'PRIMARY KEY (date, task))')
+            conn.execute('CREATE INDEX IF NOT EXISTS stats_task '
+                         'ON stats (task, date)')
+            conn.execute('CREATE TABLE IF NOT EXISTS rollups ('
+                         'period TEXT NOT NULL, '
+                         'key TEXT NOT NULL, '
+                         'task TEXT NOT NULL, '
+                         'minutes INTEGER NOT NULL DEFAULT 0, '
+                         'PRIMARY KEY (period, key, task))')
+            conn.commit()
+            self._conn = conn
+
+            # databases from before rollups were kept
+            if not has_rollups:
+                self._add_rollups(_build_rollups(
+                    self.iter_days(_MIN_DATE, _MAX_DATE)))
+
+        return self._conn
+
+    def get_day(self, date):
+        """ Gets stats for a day.
+
+            `date`
+                ``datetime.date`` instance.
+
+            Returns dict of task name -> minutes.
+            """
+        return dict(self.conn.execute('SELECT task, minutes FROM stats '
+                                      'WHERE date = ?', (_date_key(date),)))
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """ Holds the database write lock while stats are read and then
+            added to, so concurrent writers don't lose updates. The
+            transaction ends with the next call to `add_many`.
+            """
+
+        with self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            yield
+
+    def add(self, date, task_name, minutes):
+        """ Adds minutes to a task's total for a day.
+
+            `date`
+                ``datetime.date`` instance.
+            `task_name`
+                Task name.
+            `minutes`
+                Minutes to add.
+            """
+
+        self.add_many([(_date_key(date), task_name, minutes)])
+
+    def add_many(self, rows):
+        """ Adds minutes for multiple tasks and days in one transaction.
+
+            `rows`
+                Iterable of tuples: (date key, task name, minutes).
+            """
+
+        with self.conn:
+            for key, task_name, minutes in rows:
+                self.conn.execute('INSERT OR IGNORE INTO stats '
+                                  '(date, task) VALUES (?, ?)',
+                                  (key, task_name))
+                self.conn.execute('UPDATE stats SET minutes = minutes + ? '
+                                  'WHERE date = ? AND task = ?',
+                                  (minutes, key, task_name))
+
+                date = _parse_date_key(key)
+                for period in ROLLUPS:
+                    self._add_rollup(period, get_rollup_key(period, date),
+                                     task_name, minutes)
+
+    def _add_rollup(self, period, key, task_name, minutes):
+        """ Adds minutes to a task's rollup total, within the current
+            transaction.
+
+            `period`
+                Rollup period.
+            `key`
+                Rollup key.
+            `task_name`
+                Task name.
+            `minutes`
+                Minutes to add.
+            """
+
+        self.conn.execute('INSERT OR IGNORE INTO rollups '
+                          '(period, key, task) VALUES (?, ?, ?)',
+                          (period, key, task_name))
+        self.conn.execute('UPDATE rollups SET minutes = minutes + ? '
+                          'WHERE period = ? AND key = ? AND task = ?',
+                          (minutes, period, key, task_name))
+
+    def _add_rollups(self, rollups):
+        """ Adds rollups in one transaction.
+
+            `rollups`
+                Dict of period -> rollup key -> task name -> minutes.
+            """
+
+        with self.conn:
+            for period, keys in rollups.iteritems():
+                for key, totals in keys.iteritems():
+                    for task_name, minutes in totals.iteritems():
+                        self._add_rollup(period, key, task_name, minutes)
+
+    def get_rollups(self, period, start_date=None):
+        """ Gets rollups for a period.
+
+            `period`
+                Rollup period, see ``ROLLUPS``.
+            `start_date`
+                ``datetime.date`` instance. Rollups for periods ending
+                before this date are excluded.
+
+            Returns list of tuples: (rollup key, dict of task name ->
+            minutes), ordered by key.
+            """
+
+        start = get_rollup_key(period, start_date) if start_date else ''
+        rollups = []
+
+        for key, task_name, minutes in self.conn.execute(
+                'SELECT key, task, minutes FROM rollups '
+                'WHERE period = ? AND key >= ? ORDER BY key',
+                (period, start)):
+            if not rollups or rollups[-1][0] != key:
+                rollups.append((key, {}))
+            rollups[-1][1][task_name] = minutes
+
+        return rollups
+
+    def iter_days(self, start_date, end_date):
+        """ Gets stats for each day with stats in a date range.
+
+            `start_date`
+                ``datetime.date`` instance for first day.
+            `end_date`
+                ``datetime.date`` instance for last day.
+
+            Returns generator of tuples: (``datetime.date``, dict of task
+            name -> minutes).
+            """
+
+        cursor = self.conn.execute('SELECT date, task, minutes FROM stats '
+                                   'WHERE date BETWEEN ? AND ? '
+                                   'ORDER BY date',
+                                   (_date_key(start_date),
+                                    _date_key(end_date)))
+        key, data = None, {}
+
+        for row_key, task_name, minutes in cursor:
+            if row_key != key:
+                if data:
+                    yield _parse_date_key(key), data
+                key, data = row_key, {}
+            data[task_name] = minutes
+
+        if data:
+            yield _parse_date_key(key), data
+
+    def close(self):
+        """ Releases resources used by store.
+            """
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+
+BACKENDS = {'json': JsonStore}
+if sqlite3:
+    BACKENDS['sqlite'] = SqliteStore
+
+
+def get_stats_dir(base_dir):
+    """ Returns path to stats directory.
+
+        `base_dir`
+            Base directory.
+        """
+    return os.path.join(base_dir, '.stats')
+
+
+def open_store(stats_dir):
+    """ Opens the store for a stats directory. The SQLite backend is used
+        once stats have been migrated to it.
+
+        `stats_dir`
+            Stats directory.
+
+        Returns store instance.
+        """
+
+    if sqlite3 and os.path.isfile(os.path.join(stats_dir, _DB_NAME)):
+        return SqliteStore(stats_dir)
+
+    return JsonStore(stats_dir)
+
+
+def migrate(stats_dir, backend):
+    """ Moves stats to another backend, which is then used for the stats
+        directory.
+
+        `stats_dir`
+            Stats directory.
+        `backend`
+            Backend name, see ``BACKENDS``.
+
+        Returns number of days migrated.
+
+        * Raises ``ValueError`` if backend isn't supported.
+        """
+
+    if not backend in BACKENDS:
+        raise ValueError(u'Unsupported stats backend "{0}"'.format(backend))
+
+    source = open_store(stats_dir)
+    if source.name == backend:
+        source.close()
+        return 0
+
+    days = list(source.iter_days(_MIN_DATE, _MAX_DATE))
+    source.close()
+
+    if backend == 'sqlite':
+        target = SqliteStore(stats_dir)
+        target.add_many((_date_key(date), task_name, minutes)
+                        for date, data in days
+                        for task_name, minutes in data.iteritems())
+        target.close()  # json files are kept, but no longer used
+
+    else:
+        target = JsonStore(stats_dir)
+
+        with target._locked():
+            for date, data in days:
+                _replace_file(target._filename(_date_key(date)),
+                              json.dumps(data))
+
+            # rebuilt from daily stats when next read
+            common.safe_remove_file(target.rollup_file)
+
+        common.safe_remove_file(source.filename)
+
+    return len(days)
+
+
+def log_minutes(stats_dir, task_name, end_time, minutes):
+    """ Logs minutes for a task session, constraining the total time logged
+        for each day to the length of a day.
+
+        `stats_dir`
+            Stats directory.
+        `task_name`
+            Task name.
+        `end_time`
+            ``datetime.datetime`` instance for end of session.
+        `minutes`
+            Session duration in minutes.
+
+        * Raises ``IOError``, ``OSError`` or ``Error`` if stats can't be read
+          or written.
+        """
+
+    store = open_store(stats_dir)
+    amounts = []  # (date key, task name, minutes)
+    planned = {}
+
+    try:
+        # totals are read and added to as one change, so concurrent task
+        # daemons can't both fill the same day
+        with store.transaction():
+            while minutes > 0:
+                date = (end_time - datetime.timedelta(minutes=minutes)).date()
+
+                # how much total time for day
+                try:
+                    total_time = sum(int(x) for x in
+                                     store.get_day(date).values())
+                    total_time = min(total_time + planned.get(date, 0),
+                                     _MINS_IN_DAY)
+
+                except (ValueError, TypeError):
+                    total_time = 0
+
+                # constrain to single day
+                amount = minutes
+                if amount + total_time > _MINS_IN_DAY:
+                    amount = _MINS_IN_DAY - total_time
+
+                    # invalid or broken state, bail
+                    if amount <= 0:
+                        break
+
+                amounts.append((_date_key(date), task_name, amount))
+                planned[date] = planned.get(date, 0) + amount
+                minutes -= amount
+
+            store.add_many(amounts)
+
+    finally:
+        store.close()
+
+
+@contextlib.contextmanager
+def _open_checkpoints(stats_dir):
+    """ Opens the checkpoint journal, holding an exclusive advisory lock on
+        it.
+
+        `stats_dir`
+            Stats directory.
+
+        Returns file descriptor, opened for appending.
+        """
+
+    fd = os.open(os.path.join(stats_dir, _CHECKPOINT_NAME),
+                 os.O_RDWR | os.O_CREAT | os.O_APPEND, 0644)
+
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield fd
+    finally:
+        os.close(fd)  # releases lock
+
+
+def checkpoint_session(stats_dir, task_name, start_time, minutes):
+    """ Appends the current duration of a running task session to the
+        checkpoint journal.
+
+        `stats_dir`
+            Stats directory.
+        `task_name`
+            Task name.
+        `start_time`
+            ``datetime.datetime`` instance for start of session.
+        `minutes`
+            Session duration so far in minutes.
+
+        * Raises ``IOError`` or ``OSError`` if write fails.
+        """
+
+    entry = json.dumps([task_name, start_time.strftime(_TIME_FORMAT),
+                        datetime.datetime.now().strftime(_TIME_FORMAT),
+                        minutes])
+
+    with _open_checkpoints(stats_dir) as fd:
+        os.write(fd, entry + '\n')
+
+
+def reconcile_session(stats_dir, task_name, start_time, minutes=None):
+    """ Logs minutes for a task session, along with its exact start and end
+        time in the session log, and removes its checkpoints. Once minutes
+        are logged, the session is marked as logged in the journal, so
+        retrying after the session log failed doesn't log them again.
+
+        `stats_dir`
+            Stats directory.
+        `task_name`
+            Task name.
+        `start_time`
+            ``datetime.datetime`` instance for start of session.
+        `minutes`
+            Session duration in minutes, for a session that ended now. If
+            ``None``, the session's last checkpoint is logged instead.
+
+        Returns number of minutes logged.
+
+        * Raises ``IOError``, ``OSError`` or ``Error`` if journal can't be
+          accessed or stats can't be written, in which case the checkpoints
+          are kept.
+        """
+
+    session = [task_name, start_time.strftime(_TIME_FORMAT)]
+    end_time = datetime.datetime.now()
+    last = logged = None
+    lines = []
+
+    with _open_checkpoints(stats_dir) as fd:
+        buf = []
+        while True:
+            data = os.read(fd, 65536)
+            if not data:
+                break
+            buf.append(data)
+
+        for line in ''.join(buf).splitlines(True):
+            try:
+                entry = json.loads(line)
+                if entry[:2] == session:
+                    if entry[4:] == ['logged']:
+                        logged = entry
+                    else:
+                        last = entry
+                    continue
+
+            except (ValueError, TypeError, IndexError):
+                continue  # partial append
+
+            lines.append(line)
+
+        entry = logged or (last if minutes is None else None)
+        if entry:
+            try:
+                end_time = datetime.datetime.strptime(entry[2], _TIME_FORMAT)
+                minutes = int(entry[3])
+
+            except (ValueError, TypeError, IndexError):
+                minutes = None
+
+        if minutes:
+            if not logged:
+                log_minutes(stats_dir, task_name, end_time, minutes)
+                last = session + [end_time.strftime(_TIME_FORMAT), minutes,
+                                  'logged']
+                os.write(fd, json.dumps(last) + '\n')
+
+            sessionlog.SessionLog(stats_dir).add(task_name, start_time,
+                                                 end_time)
+
+        # only once logged; keep checkpoints of other sessions
+        if last or logged:
+            os.ftruncate(fd, 0)
+            if lines:
+                os.write(fd, ''.join(lines))
+
+    return minutes or 0
+
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+
+def iter_records(store, start_date=None, end_date=None):
+    """ Gets stats records in a date range, reading a day at a time.
+
+        `store`
+            Store instance.
+        `start_date`
+            ``datetime.date`` instance for first day. Defaults to earliest.
+        `end_date`
+            ``datetime.date`` instance for last day. Defaults to latest.
+
+        Returns generator of tuples: (``datetime.date``, task name,
+        minutes), ordered by date and task name.
+        """
+
+    for date, data in store.iter_days(start_date or _MIN_DATE,
+                                      end_date or _MAX_DATE):
+        for task_name in sorted(data):
+            yield date, task_name, data[task_name]
+
+
+def _format_csv(records):
+    """ Formats records as CSV lines, with a header line.
+
+        `records`
+            Iterable of record tuples, see ``iter_records``.
+
+        Returns generator of strings.
+        """
+
+    buf = StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+
+    writer.writerow(('date', 'task', 'minutes'))
+    yield buf.getvalue()
+
+    for date, task_name, minutes in records:
+        buf.seek(0)
+        buf.truncate()
+        if isinstance(task_name, unicode):
+            task_name = task_name.encode('utf-8')
+
+        writer.writerow((date.isoformat(), task_name, minutes))
+        yield buf.getvalue()
+
+
+def _format_jsonl(records):
+    """ Formats records as JSON Lines.
+
+        `records`
+            Iterable of record tuples, see ``iter_records``.
+
+        Returns generator of strings.
+        """
+
+    for date, task_name, minutes in records:
+        yield json.dumps({'date': date.isoformat(), 'task': task_name,
+                          'minutes': minutes}, sort_keys=True) + '\n'
+
+
+def export(store, file_, fmt, start_date=None, end_date=None):
+    """ Streams stats records in a date range to a file, in a single pass
+        over the store.
+
+        `store`
+            Store instance.
+        `file_`
+            ``File``-like object to write to.
+        `fmt`
+            Export format, see ``EXPORT_FORMATS``.
+        `start_date`
+            ``datetime.date`` instance for first day. Defaults to earliest.
+        `end_date`
+            ``datetime.date`` instance for last day. Defaults to latest.
+
+        Returns number of records exported.
+
+        * Raises ``ValueError`` if format isn't supported.
+        """
+
+    if not fmt in EXPORT_FORMATS:
+        raise ValueError(u'Unsupported export format "{0}"'.format(fmt))
+
+    counter = [0]
+
+    def _count(records):
+        for record in records:
+            counter[0] += 1
+            yield record
+
+    records = _count(iter_records(store, start_date, end_date))
+    lines = _format_csv(records) if fmt == 'csv' else _format_jsonl(records)
+    batch = []
+
+    for line in lines:
+        batch.append(line)
+
+        if len(batch) >= _EXPORT_BATCH_SIZE:
+            file_.write(''.join(batch))
+            batch = []
+
+    if batch:
+        file_.write(''.join(batch))
+
+    return counter[0]
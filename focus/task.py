@@ -5,11 +5,19 @@
     """
 
 import os
+import time
 import shutil
 import datetime
 
 from focus.plugin import registration
-from focus import common, errors, daemon, parser
+from focus import common, errors, daemon, parser, statstore
+
+
+def _total_seconds(delta):
+    """ Returns fractional seconds for a ``datetime.timedelta`` instance.
+        """
+    return (delta.microseconds +
+            (delta.seconds + delta.days * 24 * 3600) * 10 ** 6) / 10.0 ** 6
 
 
 class Task(object):
@@ -29,7 +37,9 @@ class Task(object):
 
         self._name = None
         self._start_time = None
+        self._start_clock = None  # ``common.boottime`` value at task start
         self._total_duration = 0
+        self._start_latency = None
         self._owner = os.getuid()
         self._loaded = False
         self._default_task_config = '/etc/focus_task.cfg'
@@ -54,6 +64,7 @@ class Task(object):
 
         self._name = None
         self._start_time = None
+        self._start_clock = None
         self._owner = os.getuid()
         self._paths['task_dir'] = None
         self._paths['task_config'] = None
@@ -114,11 +125,27 @@ class Task(object):
                         raise ValueError
 
             except (ValueError, TypeError):
+                self._reconcile_stats()
                 self._clean()
                 return True
 
         return False
 
+    def _reconcile_stats(self):
+        """ Logs the time checkpointed by a task daemon that stopped without
+            ending the task.
+            """
+
+        stats_dir = statstore.get_stats_dir(self._paths['base_dir'])
+        if not self._start_time or not os.path.isdir(stats_dir):
+            return
+
+        try:
+            statstore.reconcile_session(stats_dir, self._name,
+                                        self._start_time)
+        except (IOError, OSError, statstore.Error):
+            pass
+
     def _clean(self):
         """ Cleans up an active task and resets its data.
             """
@@ -164,6 +191,8 @@ class Task(object):
 
             self._name = common.from_utf8(task_name)
             self._start_time = start_time
+            self._start_clock = common.boottime() - max(0, _total_seconds(
+                datetime.datetime.now() - start_time))
             self._owner = owner
             self._paths['task_dir'] = task_dir
             self._paths['task_config'] = task_config
@@ -386,6 +415,7 @@ class Task(object):
         # populate task info
         self._name = common.from_utf8(task_name)
         self._start_time = datetime.datetime.now()
+        self._start_clock = common.boottime()
         self._owner = os.getuid()
         self._paths['task_dir'] = task_dir
         self._paths['task_config'] = task_config
@@ -396,9 +426,11 @@ class Task(object):
         # for the daemon to load
         self._save_active_file()
 
-        # shell the focusd daemon
+        # start the focusd daemon
         try:
-            started = daemon.shell_focusd(self._paths['base_dir'])
+            start = time.time()
+            started = daemon.start_focusd(self)
+            self._start_latency = time.time() - start
 
         # user cancelled or passwords failed?
         except (KeyboardInterrupt, ValueError):
@@ -431,12 +463,13 @@ class Task(object):
         self._clean()
 
     def set_total_duration(self, duration):
-        """ Set the total task duration in minutes.
+        """ Set the total task duration in minutes. Fractional minutes are
+            supported (e.g. 1.5 for 90 seconds).
             """
-        if duration < 1:
+        if duration <= 0:
             raise ValueError(u'Duration must be postive')
 
-        elif self.duration > duration:
+        elif self.run_time > duration * 60:
             raise ValueError(u'{0} must be greater than current duration')
 
         self._total_duration = duration
@@ -478,19 +511,53 @@ class Task(object):
         if not self._loaded:
             return 0
 
-        delta = datetime.datetime.now() - self._start_time
-        total_secs = (delta.microseconds +
-                      (delta.seconds + delta.days * 24 * 3600) *
-                      10 ** 6) / 10 ** 6
+        total_secs = _total_seconds(datetime.datetime.now() -
+                                    self._start_time)
 
         return max(0, int(round(total_secs / 60.0)))
 
+    @property
+    def run_time(self):
+        """ Returns seconds the task has been running, measured with a clock
+            unaffected by system clock changes.
+            """
+
+        if not self._loaded or self._start_clock is None:
+            return 0
+
+        return max(0, common.boottime() - self._start_clock)
+
+    @property
+    def remaining(self):
+        """ Returns seconds left until the task's total duration is reached,
+            or ``None`` if there's no total duration.
+            """
+
+        if not self._total_duration or not self._loaded:
+            return None
+
+        return self._total_duration * 60 - self.run_time
+
+    @property
+    def start_time(self):
+        """ Returns ``datetime.datetime`` instance for when task started, or
+            ``None`` if no task is loaded.
+            """
+        return self._start_time
+
     @property
     def elapsed(self):
         """ Returns if task's duration has exceeded total_duration value.
             """
-        return bool(self._total_duration and
-                    self.duration >= self._total_duration)
+        remaining = self.remaining
+        return remaining is not None and remaining <= 0
+
+    @property
+    def start_latency(self):
+        """ Returns seconds taken to start the task daemon or ``None`` if it
+            wasn't started by this instance.
+            """
+        return self._start_latency
 
     @property
     def base_dir(self):
@@ -0,0 +1,179 @@
+""" This module provides lightweight runtime measurements for the task daemon,
+    which are periodically written to a snapshot file so they can be viewed
+    from the command-line.
+    """
+
+import os
+import bisect
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+from focus import common
+
+__all__ = ('Histogram', 'write_snapshot', 'read_snapshot')
+
+
+class Histogram(object):
+    """ Fixed-bucket histogram of durations (in seconds).
+
+        `bounds`
+            Sorted list of bucket upper bounds. Values larger than the last
+            bound are counted in an overflow bucket.
+        """
+
+    # 1ms .. 10s, roughly logarithmic
+    BOUNDS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5,
+              1.0, 2.0, 5.0, 10.0)
+
+    def __init__(self, bounds=None):
+        self.bounds = list(bounds or self.BOUNDS)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        """ Records a value.
+
+            `value`
+                Duration in seconds.
+            """
+
+        value = max(0.0, value)
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, pct):
+        """ Returns an upper bound for the value at the given percentile; the
+            largest value recorded for the overflow bucket.
+
+            `pct`
+                Percentile (0 - 100).
+
+            Returns float or ``None`` if no values recorded.
+            """
+
+        if not self.count:
+            return None
+
+        target = max(1, int(round(self.count * pct / 100.0)))
+        seen = 0
+
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                if i < len(self.bounds):
+                    return min(self.bounds[i], self.max)
+                break
+
+        return self.max
+
+    @property
+    def mean(self):
+        """ Returns mean value or ``None`` if no values recorded.
+            """
+        if not self.count:
+            return None
+        return self.total / self.count
+
+    def to_dict(self):
+        """ Returns histogram state as a serializable dict.
+            """
+        return {
+            'bounds': self.bounds,
+            'counts': self.counts,
+            'count': self.count,
+            'total': self.total,
+            'max': self.max
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """ Builds histogram from data returned by `to_dict`.
+
+            `data`
+                Dict value.
+
+            Returns ``Histogram`` instance.
+
+            * Raises ``ValueError`` if data is invalid.
+            """
+
+        try:
+            hist = cls(data['bounds'])
+            counts = [int(c) for c in data['counts']]
+            if len(counts) != len(hist.counts):
+                raise ValueError
+
+            hist.counts = counts
+            hist.count = int(data['count'])
+            hist.total = float(data['total'])
+            hist.max = float(data['max'])
+
+        except (KeyError, TypeError):
+            raise ValueError
+
+        return hist
+
+
+def write_snapshot(filename, data):
+    """ Atomically writes snapshot data to file, so readers never see a
+        partial snapshot.
+
+        `filename`
+            Snapshot filename.
+        `data`
+            Dict value. ``Histogram`` values are serialized.
+
+        Returns boolean.
+        """
+
+    data = dict((k, v.to_dict() if isinstance(v, Histogram) else v)
+                for k, v in data.iteritems())
+    temp_file = '{0}.tmp'.format(filename)
+
+    if not common.writefile(temp_file, json.dumps(data)):
+        return False
+
+    try:
+        os.rename(temp_file, filename)
+        return True
+
+    except OSError:
+        common.safe_remove_file(temp_file)
+        return False
+
+
+def read_snapshot(filename, histograms=()):
+    """ Reads snapshot data from file.
+
+        `filename`
+            Snapshot filename.
+        `histograms`
+            Keys for values that should be loaded as ``Histogram``.
+
+        Returns dict or ``None``.
+        """
+
+    data = common.readfile(filename)
+    if not data:
+        return None
+
+    try:
+        data = json.loads(data)
+        if not isinstance(data, dict):
+            return None
+
+        for key in histograms:
+            if key in data:
+                data[key] = Histogram.from_dict(data[key])
+
+    except ValueError:
+        return None
+
+    return data
@@ -3,6 +3,7 @@ import sys
 import types
 import shutil
 import tempfile
+import datetime
 import subprocess
 
 IS_MACOSX = sys.platform.lower().startswith('darwin')
@@ -159,7 +160,10 @@ class MockTask(object):
 
         self.owner = os.getuid()
         self.duration = 10
+        self.start_time = datetime.datetime(2012, 3, 10, 9, 0)
+        self.start_latency = None
         self._total_duration = 0
+        self.remaining = None
         self.elapsed = False
         self._loaded = False
 
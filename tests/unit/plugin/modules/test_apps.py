@@ -1,9 +1,13 @@
 import os
+import sys
 import time
 import shutil
+import signal
+import socket
 import psutil
 import subprocess
 
+from focus import common, procscan
 from focus.plugin.modules import apps as plugins
 from focus_unittest import FocusTestCase, MockTask
 
@@ -181,6 +185,199 @@ class TestAppRun(FocusTestCase):
 
         self.assertTrue(found)
 
+    def testCgroup__parse_option(self):
+        """ AppRun.parse_option: cgroup option enables launching apps into
+            a task cgroup.
+            """
+        self.plugin.parse_option('cgroup', 'apps', 'on')
+        self.assertTrue(self.plugin.use_cgroup)
+        self.assertEqual(self.plugin.paths, {})
+
+        with self.assertRaises(ValueError):
+            self.plugin.parse_option('cgroup', 'apps', 'yes')
+
+    def testCgroupOff__on_taskprepare(self):
+        """ AppRun.on_taskprepare: cgroup isn't created unless enabled.
+            """
+        self.plugin.on_taskprepare(self.task)
+        self.assertIsNone(plugins._task_scope)
+
+
+class TestAppLaunch(FocusTestCase):
+    def setUp(self):
+        super(TestAppLaunch, self).setUp()
+        self.setup_dir()
+
+    def tearDown(self):
+        common.terminate_children()
+        common._children.clear()
+        super(TestAppLaunch, self).tearDown()
+
+    def _make_launches(self, count, delay):
+        """ Makes launches for apps that create a file after a delay.
+            """
+        launches = []
+        for i in range(count):
+            filename = os.path.join(self.test_dir, 'ready{0}'.format(i))
+            launches.append(plugins._AppLaunch(
+                'sleep {0}; touch {1}; sleep 5'.format(delay, filename),
+                'file:' + filename, timeout=5))
+        return launches
+
+    def testConcurrent___launch_apps(self):
+        """ apps._launch_apps: waits for apps together.
+            """
+        launches = self._make_launches(4, 0.3)
+        start = time.time()
+        plugins._launch_apps(launches)
+
+        self.assertLess(time.time() - start, 1.0)
+        self.assertEqual([l.ready for l in launches], [True] * 4)
+
+    def testLimit___launch_apps(self):
+        """ apps._launch_apps: limits apps waiting at once.
+            """
+        launches = self._make_launches(2, 0.3)
+        start = time.time()
+        plugins._launch_apps(launches, limit=1)
+
+        self.assertGreaterEqual(time.time() - start, 0.6)
+        self.assertEqual([l.ready for l in launches], [True] * 2)
+
+    def testNoCondition___launch_apps(self):
+        """ apps._launch_apps: apps without conditions don't wait.
+            """
+        launch = plugins._AppLaunch('sleep 5')
+        start = time.time()
+        plugins._launch_apps([launch])
+
+        self.assertLess(time.time() - start, 0.2)
+        self.assertTrue(launch.ready)
+
+    def testTimeout__poll(self):
+        """ _AppLaunch.poll: not ready when timed out or app exited.
+            """
+        filename = os.path.join(self.test_dir, 'never')
+        launch = plugins._AppLaunch('sleep 5', 'file:' + filename,
+                                    timeout=0.1)
+        plugins._launch_apps([launch])
+        self.assertFalse(launch.ready)
+
+        launch = plugins._AppLaunch('exit 1', 'alive', timeout=5)
+        start = time.time()
+        plugins._launch_apps([launch])
+        self.assertFalse(launch.ready)
+        self.assertLess(time.time() - start, 1.0)
+
+    def testPort__poll(self):
+        """ _AppLaunch.poll: ready once port is listening.
+            """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(('127.0.0.1', 0))
+        sock.listen(1)
+
+        try:
+            port = sock.getsockname()[1]
+            launch = plugins._AppLaunch('sleep 5',
+                                        'port:{0}'.format(port), timeout=5)
+            plugins._launch_apps([launch])
+            self.assertTrue(launch.ready)
+        finally:
+            sock.close()
+
+    def testReady__parse_option(self):
+        """ AppRun.parse_option: ready option sets app condition.
+            """
+        plugin = plugins.AppRun()
+        plugin.parse_option('ready', 'apps', 'cat', 'port:localhost:80', '3')
+        plugin.parse_option('ready', 'apps', 'chmod', 'window')
+        self.assertEqual(plugin.ready[common.which('cat')],
+                         ('port:localhost:80', 3.0))
+        self.assertEqual(plugin.ready[common.which('chmod')][0], 'window')
+
+        for values in (('cat',), ('cat', 'port'), ('cat', 'alive:1'),
+                       ('cat', 'file:/tmp/x', '0'), ('cat', 'soon')):
+            with self.assertRaises(ValueError):
+                plugin.parse_option('ready', 'apps', *values)
+
+        plugin.parse_option('launch_limit', 'apps', '2')
+        self.assertEqual(plugin.launch_limit, 2)
+        with self.assertRaises(ValueError):
+            plugin.parse_option('launch_limit', 'apps', '0')
+
+
+class TestTaskScope(FocusTestCase):
+    class MockScope(object):
+        def __init__(self):
+            self.killed = False
+            self.removed = False
+
+        def get_pids(self):
+            return []
+
+        def kill(self):
+            self.killed = True
+
+        def is_populated(self):
+            return False
+
+        def remove(self):
+            self.removed = True
+            return True
+
+    def setUp(self):
+        super(TestTaskScope, self).setUp()
+        self.setup_dir()
+        self.task = MockTask(base_dir=self.test_dir)
+        self.scope = self.MockScope()
+        plugins._task_scope = self.scope
+        open(plugins.get_scope_file(self.task), 'w').close()
+
+    def tearDown(self):
+        plugins._task_scope = None
+        plugins._scope_close_keys.clear()
+        self.scope = None
+        self.task = None
+        super(TestTaskScope, self).tearDown()
+
+    def test___release_scope(self):
+        """ apps._release_scope: removes the cgroup and its path file.
+            """
+        plugins._release_scope(self.task)
+        self.assertFalse(self.scope.killed)
+        self.assertTrue(self.scope.removed)
+        self.assertIsNone(plugins._task_scope)
+        self.assertFalse(os.path.exists(plugins.get_scope_file(self.task)))
+
+    def testEndClose__on_taskend(self):
+        """ AppClose.on_taskend: kills launched apps in the cgroup when
+            apps are closed at task end.
+            """
+        plugin = plugins.AppClose()
+        plugin.on_taskend(self.task)
+        self.assertFalse(self.scope.killed)
+
+        plugin.paths['end'] = set(['/nonexistent/app'])
+        plugin.on_taskend(self.task)
+        self.assertTrue(self.scope.killed)
+        self.assertIsNone(plugins._task_scope)
+
+    def testEndClose__release(self):
+        """ AppRun.on_taskend: kills launched apps in the cgroup, if it
+            releases the cgroup before AppClose closes apps.
+            """
+        plugins.AppClose().parse_option('end_close', 'apps', 'cat')
+
+        self.task.elapsed = True  # timer_close isn't set
+        plugins.AppRun().on_taskend(self.task)
+        self.assertFalse(self.scope.killed)
+
+        plugins._task_scope = self.scope
+        self.task.elapsed = False
+        plugins.AppRun().on_taskend(self.task)
+        self.assertTrue(self.scope.killed)
+        self.assertIsNone(plugins._task_scope)
+
 
 class TestAppClose(CloseAppCase):
     def setUp(self):
@@ -307,3 +504,409 @@ class TestAppBlock(CloseAppCase):
             self.plugin.paths['block'].add(path)
             self.plugin.on_taskrun(self.task)
         self.assertTrue(self._kill_app(_method, process_count=3))
+
+    def testMatch__on_taskrun(self):
+        """ AppBlock.on_taskrun: running apps matching rules are closed.
+            """
+        def _method(path):
+            self.plugin.parse_option('block_match', 'apps',
+                                     'glob:' + path)
+            self.plugin.on_taskrun(self.task)
+        self.assertTrue(self._kill_app(_method, process_count=3))
+
+    def testGrace__on_taskrun(self):
+        """ AppBlock.on_taskrun: doesn't wait for closed apps to exit, and
+            kills those still running after the grace period on a later
+            run.
+            """
+        bin_file = self.make_file()
+        shutil.copyfile('/bin/sh', bin_file)
+        open(bin_file, 'a+b', 0).write('A' * 100)  # unique checksum
+        os.chmod(bin_file, 0700)
+
+        proc = subprocess.Popen([bin_file, '-c',
+                                 "trap '' TERM; while true; do sleep 1; done"])
+        time.sleep(0.2)  # trap set
+
+        self.plugin.paths['block'] = set([bin_file])
+        grace = plugins._close_grace
+        plugins._close_grace = 0.5
+
+        try:
+            self.assertTrue(self.plugin.on_taskrun(self.task))
+            self.assertIsNone(proc.poll())
+            self.assertIn(proc.pid, self.plugin._closing)
+
+            time.sleep(0.6)
+            self.assertTrue(self.plugin.on_taskrun(self.task))
+
+            for i in range(100):
+                if proc.poll() is not None:
+                    break
+                time.sleep(0.02)
+            self.assertEqual(proc.returncode, -signal.SIGKILL)
+
+            self.assertFalse(self.plugin.on_taskrun(self.task))
+            self.assertEqual(self.plugin._closing, {})
+
+        finally:
+            plugins._close_grace = grace
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+
+
+class TestProcessTracker(FocusTestCase):
+    def setUp(self):
+        super(TestProcessTracker, self).setUp()
+        self.pids = set([100, 101, 102])
+        self.start_times = {100: 1, 101: 1, 102: 1}
+        self.last_pid = 102
+        self.exes = {100: '/bin/app100', 101: '/bin/app101'}
+        self.owned = set([100, 101, 103])
+        self.inspected = []
+        self.read = []
+
+        def _get_start_time(pid):
+            self.read.append(pid)
+            return self.start_times.get(pid)
+
+        def _inspect_process(pid, uid):
+            self.inspected.append(pid)
+            if pid not in self.owned:
+                return None  # not owned by user
+            exe = self.exes.get(pid)
+            info = procscan.ProcessInfo(pid, uid, 'app{0}'.format(pid), exe,
+                                        start_time=self.start_times[pid])
+            return (info, exe or '/bin/app{0}'.format(pid))
+
+        self._orig = (procscan.get_pids, procscan.get_start_time,
+                      procscan.get_last_pid, procscan.get_exe,
+                      plugins._inspect_process)
+        procscan.get_pids = lambda: set(self.pids)
+        procscan.get_start_time = _get_start_time
+        procscan.get_last_pid = lambda: self.last_pid
+        procscan.get_exe = lambda pid: self.exes.get(pid)
+        plugins._inspect_process = _inspect_process
+        self._reset()
+
+    def tearDown(self):
+        (procscan.get_pids, procscan.get_start_time,
+         procscan.get_last_pid, procscan.get_exe,
+         plugins._inspect_process) = self._orig
+        self._reset()
+        super(TestProcessTracker, self).tearDown()
+
+    def _reset(self):
+        plugins._tracked_processes.clear()
+        plugins._tracked_pids.clear()
+        plugins._last_pid = None
+        plugins._tracker_calls = 0
+
+    def _procs(self):
+        return sorted(info.pid for info, _ in plugins._get_user_processes())
+
+    def testOnlyNewInspected___get_user_processes(self):
+        """ apps._get_user_processes: only new processes are inspected.
+            """
+        self.assertEqual(self._procs(), [100, 101])
+        self.assertEqual(sorted(self.inspected), [100, 101, 102])
+
+        self.inspected = []
+        self.read = []
+        self.pids.add(103)
+        self.start_times[103] = 5
+        self.last_pid = 103
+        self.assertEqual(self._procs(), [100, 101, 103])
+        self.assertEqual(self.inspected, [103])
+        self.assertEqual(self.read, [103])
+
+    def testExited___get_user_processes(self):
+        """ apps._get_user_processes: exited processes are forgotten.
+            """
+        self._procs()
+        self.pids.remove(101)
+        self.assertEqual(self._procs(), [100])
+        self.assertNotIn(101, plugins._tracked_pids)
+        self.assertNotIn((101, 1), plugins._tracked_processes)
+
+    def testPidReused___get_user_processes(self):
+        """ apps._get_user_processes: reused process identifiers are
+            inspected again.
+            """
+        self._procs()
+        self.inspected = []
+        self.read = []
+
+        # allocated identifiers wrapped around, up to 100
+        self.start_times[100] = 9
+        self.last_pid = 100
+        self.assertEqual(self._procs(), [100, 101])
+        self.assertEqual(self.inspected, [100])
+        self.assertEqual(sorted(set(self.read)), [100])
+        self.assertIn((100, 9), plugins._tracked_processes)
+        self.assertNotIn((100, 1), plugins._tracked_processes)
+
+    def testNotReallocated___get_user_processes(self):
+        """ apps._get_user_processes: tracked processes aren't read again,
+            unless their identifiers may have been allocated again.
+            """
+        self._procs()
+        self.read = []
+        self.last_pid = 150
+        self.assertEqual(self._procs(), [100, 101])
+        self.assertEqual(self.read, [])
+
+        # last allocated identifier unknown, check all
+        self.last_pid = None
+        self.assertEqual(self._procs(), [100, 101])
+        self.assertEqual(sorted(self.read), [100, 101, 102])
+
+    def testExec___get_user_processes(self):
+        """ apps._get_user_processes: processes that executed another
+            program in place are inspected again.
+            """
+        self.assertEqual(dict((i.pid, p) for i, p in
+                              plugins._get_user_processes())[100],
+                         '/bin/app100')
+        self.inspected = []
+
+        self.exes[100] = '/usr/bin/blocked'
+        self.assertEqual(dict((i.pid, p) for i, p in
+                              plugins._get_user_processes())[100],
+                         '/usr/bin/blocked')
+        self.assertEqual(self.inspected, [100])
+
+    def testRetry___get_user_processes(self):
+        """ apps._get_user_processes: processes that couldn't be inspected
+            are retried periodically.
+            """
+        self.assertEqual(self._procs(), [100, 101])
+        self.owned.add(102)
+
+        for i in range(plugins._TRACKER_RETRY_CALLS - 2):
+            self.assertEqual(self._procs(), [100, 101])
+        self.assertEqual(self._procs(), [100, 101, 102])
+
+    def test___inspect_process(self):
+        """ apps._inspect_process: returns info and executable path for user
+            processes only.
+            """
+        (procscan.get_pids, procscan.get_start_time,
+         procscan.get_last_pid, procscan.get_exe,
+         _inspect_process) = self._orig
+
+        info, path = _inspect_process(os.getpid(), os.getuid())
+        self.assertEqual(info.pid, os.getpid())
+        self.assertEqual(path, os.path.realpath(sys.executable))
+        self.assertIsNone(_inspect_process(os.getpid(), os.getuid() + 1))
+
+
+class TestAppBlockMonitor(FocusTestCase):
+    class MockMonitor(object):
+        def __init__(self, pids):
+            self.pids = pids
+
+        def read_execs(self):
+            return self.pids
+
+    def setUp(self):
+        super(TestAppBlockMonitor, self).setUp()
+        self.task = MockTask()
+        self.plugin = plugins.AppBlock()
+        self.plugin.paths['block'] = set(['/bin/app'])
+        self.calls = []
+
+        def _stop_processes(paths, processes=None, matcher=None,
+                            closing=None):
+            self.calls.append(processes)
+            return {}
+
+        self._orig = (plugins._stop_processes, plugins._get_exec_processes)
+        plugins._stop_processes = _stop_processes
+        plugins._get_exec_processes = lambda pids: list(pids)
+
+    def tearDown(self):
+        plugins._stop_processes, plugins._get_exec_processes = self._orig
+        self.plugin = None
+        self.task = None
+        super(TestAppBlockMonitor, self).tearDown()
+
+    def testNoMonitor__on_taskrun(self):
+        """ AppBlock.on_taskrun: scans all processes without exec monitor.
+            """
+        self.plugin.on_taskrun(self.task)
+        self.plugin.on_taskrun(self.task)
+        self.assertEqual(self.calls, [None, None])
+
+    def testMonitor__on_taskrun(self):
+        """ AppBlock.on_taskrun: only checks executed processes with exec
+            monitor, after the initial scan.
+            """
+        self.plugin._monitor = self.MockMonitor([10, 11])
+        self.plugin.on_taskrun(self.task)
+        self.plugin.on_taskrun(self.task)
+        self.assertEqual(self.calls, [None, [10, 11]])
+
+        # nothing executed
+        self.plugin._monitor.pids = []
+        self.assertFalse(self.plugin.on_taskrun(self.task))
+        self.assertEqual(len(self.calls), 2)
+
+    def testMonitorLost__on_taskrun(self):
+        """ AppBlock.on_taskrun: scans all processes if notifications were
+            lost.
+            """
+        self.plugin._monitor = self.MockMonitor(None)
+        self.plugin._scanned = True
+        self.plugin.on_taskrun(self.task)
+        self.assertEqual(self.calls, [None])
+
+
+class TestChecksumCache(FocusTestCase):
+    def setUp(self):
+        super(TestChecksumCache, self).setUp()
+        self.setup_dir()
+        self.cache = plugins._ChecksumCache(max_entries=10)
+
+    def tearDown(self):
+        self.cache = None
+        super(TestChecksumCache, self).tearDown()
+
+    def testFast___get_checksum(self):
+        """ apps._get_checksum: fast checksums only sample large files.
+            """
+        filename = self.make_file('A' * 1024)
+        orig = (plugins._FAST_CHECKSUM_MIN_SIZE, plugins._FAST_CHECKSUM_CHUNK)
+
+        try:
+            # small file, same as full checksum
+            full = plugins._get_checksum(filename)
+            self.assertEqual(plugins._get_checksum(filename, fast=True), full)
+
+            plugins._FAST_CHECKSUM_MIN_SIZE = 512
+            plugins._FAST_CHECKSUM_CHUNK = 16
+            fast = plugins._get_checksum(filename, fast=True)
+            self.assertNotEqual(fast, full)
+            self.assertTrue(fast.startswith('fast:'))
+
+            # a byte outside the samples doesn't change the checksum
+            data = bytearray(open(filename, 'rb').read())
+            data[20] = 'B'
+            open(filename, 'wb').write(data)
+            self.assertEqual(plugins._get_checksum(filename, fast=True), fast)
+            self.assertNotEqual(plugins._get_checksum(filename), full)
+
+        finally:
+            (plugins._FAST_CHECKSUM_MIN_SIZE,
+             plugins._FAST_CHECKSUM_CHUNK) = orig
+
+    def test__get(self):
+        """ _ChecksumCache.get: caches checksum by file identity.
+            """
+        filename = self.make_file('data')
+        checksum = plugins._get_checksum(filename)
+        self.assertEqual(self.cache.get(filename), checksum)
+        self.assertEqual(len(self.cache._entries), 1)
+
+        # same identity, cached
+        self.assertEqual(self.cache.get(filename), checksum)
+        self.assertEqual(len(self.cache._entries), 1)
+
+        # file changed, new identity
+        open(filename, 'w').write('new data')
+        os.utime(filename, (0, 0))
+        self.assertNotEqual(self.cache.get(filename), checksum)
+        self.assertEqual(len(self.cache._entries), 2)
+
+        self.assertIsNone(self.cache.get('/non-existent-file'))
+
+    def testEvict__get(self):
+        """ _ChecksumCache.get: least-recently used checksums are evicted.
+            """
+        first = self.make_file('first')
+        self.cache.get(first)
+
+        for i in range(10):
+            self.cache.get(self.make_file(str(i)))
+            self.cache.get(first)  # keep it in use
+
+        self.assertLessEqual(len(self.cache._entries), 10)
+        self.assertIn(self.cache._identity(first, False), self.cache._entries)
+
+    def test__save(self):
+        """ _ChecksumCache.save: persists checksums for `load`.
+            """
+        cache_file = os.path.join(self.test_dir, '.cache', 'checksums.json')
+        filename = self.make_file('data')
+
+        self.cache.load(cache_file)
+        self.assertFalse(self.cache.save())  # nothing to save
+
+        checksum = self.cache.get(filename)
+        self.assertTrue(self.cache.save())
+
+        cache = plugins._ChecksumCache()
+        cache.load(cache_file)
+        self.assertEqual(cache._entries, self.cache._entries)
+        self.assertEqual(cache.get(filename), checksum)
+        self.assertFalse(cache._dirty)
+
+    def testInvalid__load(self):
+        """ _ChecksumCache.load: ignores invalid cache files.
+            """
+        self.cache.load(self.make_file('{"key": 1}'))
+        self.assertEqual(self.cache._entries, {})
+
+
+class TestChecksumOption(FocusTestCase):
+    def setUp(self):
+        super(TestChecksumOption, self).setUp()
+        self.plugin = plugins.AppClose()
+
+    def tearDown(self):
+        plugins._checksum_mode = 'full'
+        plugins._close_grace = 2.0
+        plugins._match_cmdline = False
+        self.plugin = None
+        super(TestChecksumOption, self).tearDown()
+
+    def test__parse_option(self):
+        """ AppClose.parse_option: checksum option sets checksum mode.
+            """
+        self.plugin.parse_option('checksum', 'apps', 'fast')
+        self.assertEqual(plugins._checksum_mode, 'fast')
+        self.assertEqual(self.plugin.paths, {})
+
+        with self.assertRaises(ValueError):
+            self.plugin.parse_option('checksum', 'apps', 'quick')
+        with self.assertRaises(ValueError):
+            self.plugin.parse_option('checksum', 'apps', 'full', 'fast')
+
+    def testCloseGrace__parse_option(self):
+        """ AppClose.parse_option: close_grace option sets grace period.
+            """
+        self.plugin.parse_option('close_grace', 'apps', '0.5')
+        self.assertEqual(plugins._close_grace, 0.5)
+        self.assertEqual(self.plugin.paths, {})
+
+        with self.assertRaises(ValueError):
+            self.plugin.parse_option('close_grace', 'apps', '-1')
+        with self.assertRaises(ValueError):
+            self.plugin.parse_option('close_grace', 'apps', 'soon')
+
+    def testMatch__parse_option(self):
+        """ AppClose.parse_option: match options compile rules.
+            """
+        self.plugin.parse_option('close_match', 'apps', 'name:sh',
+                                 'glob:/bin/*')
+        self.assertEqual(self.plugin.paths, {})
+        self.assertEqual(self.plugin.matchers.keys(), ['start'])
+        self.assertFalse(plugins._match_cmdline)
+
+        self.plugin.parse_option('block_match', 'apps', 'cmd:--app')
+        self.assertIn('block', self.plugin.matchers)
+        self.assertTrue(plugins._match_cmdline)
+
+        with self.assertRaises(ValueError):
+            self.plugin.parse_option('close_match', 'apps', 'pid:1')
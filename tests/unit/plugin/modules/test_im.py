@@ -1,3 +1,6 @@
+import time
+
+from focus import dbuspool
 from focus.plugin.modules import im as plugins
 from focus_unittest import (
     FocusTestCase, IS_MACOSX, skipUnless, skipIf
@@ -63,7 +66,8 @@ class IMStatusCase(FocusTestCase):
         """ IMStatus._set_status: installs correct functions for mac osx.
             """
         self.assertEquals(self.plugin.set_status_funcs, (
-           plugins._adium_status, plugins._osx_skype_status 
+            ('adium', plugins._adium_status),
+            ('osx_skype', plugins._osx_skype_status)
         ))
 
     @skipIf(IS_MACOSX, 'for linux/nix')
@@ -71,8 +75,9 @@ class IMStatusCase(FocusTestCase):
         """ IMStatus._set_status: installs correct functions for linux/nix.
             """
         self.assertEquals(self.plugin.set_status_funcs, (
-            plugins._pidgin_status, plugins._empathy_status,
-            plugins._linux_skype_status
+            ('pidgin', plugins._pidgin_status),
+            ('empathy', plugins._empathy_status),
+            ('linux_skype', plugins._linux_skype_status)
         ))
 
     def testCallStatusFuncs___set_status(self):
@@ -82,8 +87,87 @@ class IMStatusCase(FocusTestCase):
         ret_items = []
         def _check_func(status, message):
             ret_items.append((status, message))
-        self.plugin.set_status_funcs = (_check_func, _check_func)
+        self.plugin.set_status_funcs = (('first', _check_func),
+                                        ('second', _check_func))
 
         self.plugin._set_status('away', 'message-here')
+        self.assertEqual(len(ret_items), 2)
         for item in ret_items:
             self.assertEqual(item, ('away', 'message-here'))
+
+
+class FakeBus(object):
+    def __init__(self, owned):
+        self.owned = owned
+        self.checks = 0
+
+    def get_is_connected(self):
+        return True
+
+    def name_has_owner(self, bus_name):
+        self.checks += 1
+        return bus_name in self.owned
+
+
+class TestIMStatusFanout(FocusTestCase):
+    def setUp(self):
+        super(TestIMStatusFanout, self).setUp()
+        self.plugin = plugins.IMStatus()
+        self.calls = []
+
+        self.bus = FakeBus(['im.pidgin.purple.PurpleService'])
+        self._pool = dbuspool._pool
+        dbuspool._pool = dbuspool.DBusPool(bus_factory=lambda: self.bus)
+        plugins._detected.clear()
+
+        self._timeout = plugins._STATUS_TIMEOUT
+        plugins._STATUS_TIMEOUT = 0.2
+
+    def tearDown(self):
+        plugins._STATUS_TIMEOUT = self._timeout
+        plugins._detected.clear()
+        dbuspool._pool = self._pool
+        self.plugin = None
+        super(TestIMStatusFanout, self).tearDown()
+
+    def test___set_status(self):
+        """ IMStatus._set_status: updates clients concurrently, reporting
+            results for each.
+            """
+        def _pidgin(status, message):
+            self.calls.append(('pidgin', status, message))
+
+            # own connection, so abandoned calls don't hold up others
+            pool = dbuspool.get_pool()
+            self.assertIsNot(pool, dbuspool._pool)
+            self.assertIs(pool.bus, self.bus)
+
+        def _empathy(status, message):
+            self.calls.append(('empathy', status, message))
+
+        def _hung(status, message):
+            time.sleep(5)
+
+        def _broken(status, message):
+            raise dbuspool.DBusException('NoReply')
+
+        self.plugin.set_status_funcs = (('pidgin', _pidgin),
+                                        ('empathy', _empathy),
+                                        ('hung', _hung),
+                                        ('broken', _broken))
+
+        start = time.time()
+        results = self.plugin._set_status('away', 'lunch')
+        self.assertLess(time.time() - start, 1.0)
+
+        # empathy isn't running
+        self.assertEqual(self.calls, [('pidgin', 'away', 'lunch')])
+        self.assertEqual(sorted(results), ['broken', 'hung', 'pidgin'])
+        self.assertEqual(results['pidgin'], ('ok', None))
+        self.assertEqual(results['hung'], ('timeout', None))
+        self.assertEqual(results['broken'][0], 'error')
+
+        # detection is cached
+        checks = self.bus.checks
+        self.plugin._set_status('online')
+        self.assertEqual(self.bus.checks, checks)
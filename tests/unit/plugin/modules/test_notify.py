@@ -1,3 +1,5 @@
+import threading
+
 from focus.plugin.modules import notify as plugins
 from focus_unittest import (
     MockTask, FocusTestCase, IS_MACOSX, skipUnless, skipIf
@@ -63,7 +65,33 @@ class NotifyCase(FocusTestCase):
             ret_items.append((task, message))
         self.plugin.notify_func = _check_func
 
-        self.plugin._notify(test_task, 'message-here')
+        self.plugin._notify(test_task, 'start', 'message-here')
+        self.assertTrue(self.plugin.dispatcher.drain(2))
+        self.assertEqual(len(ret_items), 1)
         for item in ret_items:
             self.assertEqual(item, ('Focus ({0})'.format(test_task.name),
                                     'message-here'))
+
+    def testEvents___notify(self):
+        """ Notify._notify: pending messages for other events of the task
+            aren't replaced.
+            """
+
+        test_task = MockTask()
+        test_task.start('Test-Task')
+
+        ret_items = []
+        busy = threading.Event()
+        def _check_func(task, message):
+            busy.wait(2)  # hold the dispatcher, so messages stay pending
+            ret_items.append(message)
+        self.plugin.notify_func = _check_func
+
+        self.plugin.dispatcher.submit('other', 'title', 'busy')
+        self.plugin._notify(test_task, 'start', 'started')
+        self.plugin._notify(test_task, 'end', 'ending')
+        self.plugin._notify(test_task, 'end', 'ended')
+        busy.set()
+
+        self.assertTrue(self.plugin.dispatcher.drain(2))
+        self.assertEqual(ret_items, ['busy', 'started', 'ended'])
@@ -0,0 +1,70 @@
+import os
+
+from focus import daemon, telemetry
+from focus.plugin.modules import apps, perf as plugins
+from focus_unittest import FocusTestCase, MockEnvironment
+
+
+class TestPerf(FocusTestCase):
+    def setUp(self):
+        super(TestPerf, self).setUp()
+        self.setup_dir()
+        self.plugin = plugins.Perf()
+        self.env = MockEnvironment(data_dir=self.test_dir)
+
+    def tearDown(self):
+        self.env = None
+        self.plugin = None
+        super(TestPerf, self).tearDown()
+
+    def testNoSnapshot__execute(self):
+        """ Perf.execute: no measurements written yet.
+            """
+        self.plugin.execute(self.env, None)
+        self.assertEqual(self.env.io.test__write_data,
+                         'No measurements available yet.\n')
+
+    def test__execute(self):
+        """ Perf.execute: prints loop measurements and background processes.
+            """
+        lag = telemetry.Histogram()
+        lag.add(0.0015)
+        tick = telemetry.Histogram()
+
+        telemetry.write_snapshot(daemon.get_daemon_perffile(self.env.task), {
+            'period': 2.0,
+            'sleep_period': 1.0,
+            'lag': lag,
+            'tick': tick,
+            'children': [{'pid': 123, 'owner': 'AppRun', 'returncode': None,
+                          'runtime': 12.2, 'command': 'firefox'}]
+        })
+
+        self.plugin.execute(self.env, None)
+        self.assertEqual(self.env.io.test__write_data,
+                         'Loop period: 2.0s (base 1.0s)\n'
+                         'Loop lag: 1 samples, mean 1.5ms, p50 <= 1.5ms, '
+                         'p99 <= 1.5ms, max 1.5ms\n'
+                         'Tick time: no samples\n'
+                         '\n'
+                         'Background processes:\n'
+                         '    123 [AppRun] running, 12s: firefox\n')
+
+    def testAppUsage__execute(self):
+        """ Perf.execute: prints resource usage for launched apps.
+            """
+        apps_dir = os.path.join(self.test_dir, 'scope', 'apps')
+        os.makedirs(apps_dir)
+        for name, data in (('cpu.stat', 'usage_usec 1500000'),
+                           ('memory.current', '2097152'),
+                           ('cgroup.procs', '10\n11\n')):
+            open(os.path.join(apps_dir, name), 'w').write(data)
+        open(apps.get_scope_file(self.env.task), 'w').write(
+            os.path.dirname(apps_dir))
+
+        self.plugin.execute(self.env, None)
+        self.assertEqual(self.env.io.test__write_data,
+                         'No measurements available yet.\n'
+                         '\n'
+                         'Launched apps: 2 processes, cpu 1.5s, '
+                         'memory 2.0MB\n')
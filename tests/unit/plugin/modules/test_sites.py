@@ -1,4 +1,5 @@
 import os
+import socket
 
 from focus.plugin.modules import sites as plugins
 from focus_unittest import FocusTestCase, MockTask
@@ -115,3 +116,309 @@ class TestSiteBlock(FocusTestCase):
 
         # backup removed
         self.assertFalse(os.path.isfile(self.backup_hosts_file))
+
+
+_PATCHED_HOST_FILE_DATA = _HOST_FILE_DATA + """# FOCUS BEGIN
+127.0.0.1	m.twitter.com	# FOCUS
+127.0.0.1	mobile.twitter.com	# FOCUS
+127.0.0.1	twitter.com	# FOCUS
+127.0.0.1	www.twitter.com	# FOCUS
+# FOCUS END
+"""
+
+
+class TestSiteBlockPatch(FocusTestCase):
+    def setUp(self):
+        super(TestSiteBlockPatch, self).setUp()
+        self.setup_dir()
+
+        self.task = MockTask(base_dir=self.test_dir, make_task_dir=True)
+        self.plugin = plugins.SiteBlock()
+        self.commands = []
+
+        def run_root(command):
+            self.commands.append(command)
+            return os.system(command) == 0
+
+        self.plugin.run_root = run_root
+        self.plugin.hosts_file = os.path.join(self.test_dir, 'hosts')
+        open(self.plugin.hosts_file, 'w').write(_HOST_FILE_DATA)
+
+        self.plugin.parse_option('mode', 'sites', 'patch')
+        self.plugin.parse_option('block', 'sites', 'twitter.com')
+
+    def tearDown(self):
+        self.plugin = None
+        self.task = None
+        super(TestSiteBlockPatch, self).tearDown()
+
+    def _read(self):
+        return open(self.plugin.hosts_file, 'r').read()
+
+    def test__parse_option(self):
+        """ SiteBlock.parse_option: mode option sets update mode.
+            """
+        self.assertEqual(self.plugin.mode, 'patch')
+        with self.assertRaises(ValueError):
+            self.plugin.parse_option('mode', 'sites', 'rewrite')
+
+    def test__on_taskrun(self):
+        """ SiteBlock.on_taskrun: adds section to hosts file, preserving
+            file mode, and only writes it when changed.
+            """
+        os.chmod(self.plugin.hosts_file, 0644)
+        self.plugin.on_taskrun(self.task)
+        self.assertEqual(self._read(), _PATCHED_HOST_FILE_DATA)
+        self.assertEqual(os.stat(self.plugin.hosts_file).st_mode & 0777,
+                         0644)
+        self.assertEqual(len(self.commands), 1)
+
+        # file touched, but section unchanged
+        os.utime(self.plugin.hosts_file, (0, 0))
+        self.plugin.on_taskrun(self.task)
+        self.assertEqual(len(self.commands), 1)
+
+        # section tampered with
+        data = self._read().replace('127.0.0.1\ttwitter.com\t# FOCUS\n', '')
+        open(self.plugin.hosts_file, 'w').write(data)
+        os.utime(self.plugin.hosts_file, (1, 1))
+        self.plugin.on_taskrun(self.task)
+        self.assertEqual(self._read(), _PATCHED_HOST_FILE_DATA)
+        self.assertEqual(len(self.commands), 2)
+
+    def testPreserveEdits__on_taskrun(self):
+        """ SiteBlock.on_taskrun: keeps changes made outside the section.
+            """
+        self.plugin.on_taskrun(self.task)
+
+        edited = ('10.0.0.1\tintranet\n' + self._read() +
+                  '10.0.0.2\tbuild\n')
+        open(self.plugin.hosts_file, 'w').write(edited)
+        os.utime(self.plugin.hosts_file, (1, 1))
+
+        self.plugin.on_taskend(self.task)
+        self.assertEqual(self._read(), '10.0.0.1\tintranet\n' +
+                         _HOST_FILE_DATA + '10.0.0.2\tbuild\n')
+
+    def test__on_taskend(self):
+        """ SiteBlock.on_taskend: removes section, skipping the write if
+            there's no section.
+            """
+        open(self.plugin.hosts_file, 'w').write(_PATCHED_HOST_FILE_DATA)
+        self.plugin.on_taskend(self.task)
+        self.assertEqual(self._read(), _HOST_FILE_DATA)
+
+        self.plugin.on_taskend(self.task)
+        self.assertEqual(len(self.commands), 1)
+
+    def test___split_section(self):
+        """ sites._split_section: splits data around section.
+            """
+        self.assertEqual(plugins._split_section('a\n'), ('a\n', None, ''))
+        self.assertEqual(
+            plugins._split_section('a\n# FOCUS BEGIN\nb\n# FOCUS END\nc\n'),
+            ('a\n', '# FOCUS BEGIN\nb\n# FOCUS END\n', 'c\n'))
+
+
+_BLOCKLIST_DATA = """# community list
+0.0.0.0 ads.example.com
+0.0.0.0 ads.example.com tracker.example.net  # duplicate
+127.0.0.1 localhost
+http://Social.Example.org/path
+plain.example.io
+"""
+
+
+class TestSiteBlockList(FocusTestCase):
+    def setUp(self):
+        super(TestSiteBlockList, self).setUp()
+        self.setup_dir()
+
+        self.task = MockTask(base_dir=self.test_dir, make_task_dir=True)
+        self.plugin = plugins.SiteBlock()
+        self.cache_dir = os.path.join(self.test_dir, '.cache')
+        self.list_file = os.path.join(self.test_dir, 'list.txt')
+        open(self.list_file, 'w').write(_BLOCKLIST_DATA)
+        del plugins._blocklists[:]
+
+    def tearDown(self):
+        del plugins._blocklists[:]
+        self.plugin = None
+        self.task = None
+        super(TestSiteBlockList, self).tearDown()
+
+    def test___compile_blocklist(self):
+        """ sites._compile_blocklist: reads sorted, unique domains.
+            """
+        self.assertEqual(plugins._compile_blocklist(self.list_file,
+                                                    self.cache_dir),
+                         ['ads.example.com', 'plain.example.io',
+                          'social.example.org', 'tracker.example.net'])
+        self.assertIsNone(plugins._compile_blocklist(
+            os.path.join(self.test_dir, 'missing'), self.cache_dir))
+
+    def testCached___compile_blocklist(self):
+        """ sites._compile_blocklist: uses compiled list until file changes.
+            """
+        plugins._compile_blocklist(self.list_file, self.cache_dir)
+        del plugins._blocklists[:]
+
+        # compiled list is used for unchanged file
+        cache_file = os.path.join(self.cache_dir,
+                                  os.listdir(self.cache_dir)[0])
+        data = open(cache_file).read().replace('plain.example.io',
+                                               'cached.example.io')
+        open(cache_file, 'w').write(data)
+        self.assertIn('cached.example.io', plugins._compile_blocklist(
+            self.list_file, self.cache_dir))
+
+        # file changed
+        del plugins._blocklists[:]
+        open(self.list_file, 'a').write('new.example.com\n')
+        domains = plugins._compile_blocklist(self.list_file, self.cache_dir)
+        self.assertIn('new.example.com', domains)
+        self.assertNotIn('cached.example.io', domains)
+
+    def testEvicted___compile_blocklist(self):
+        """ sites._compile_blocklist: keeps only the latest version of recently
+            used files in memory.
+            """
+        plugins._compile_blocklist(self.list_file, self.cache_dir)
+        open(self.list_file, 'a').write('new.example.com\n')
+        plugins._compile_blocklist(self.list_file, self.cache_dir)
+        self.assertEqual(len(plugins._blocklists), 1)
+        self.assertIn('new.example.com', plugins._blocklists[0][2])
+
+        for i in range(plugins._MAX_BLOCKLISTS):
+            filename = os.path.join(self.test_dir, 'list{0}.txt'.format(i))
+            open(filename, 'w').write('site{0}.example.com\n'.format(i))
+            plugins._compile_blocklist(filename, self.cache_dir)
+
+        self.assertEqual(len(plugins._blocklists), plugins._MAX_BLOCKLISTS)
+        self.assertNotIn(os.path.realpath(self.list_file),
+                         [x[0] for x in plugins._blocklists])
+
+    def test__parse_option(self):
+        """ SiteBlock.parse_option: blocklist options set files and names.
+            """
+        self.plugin.parse_option('block_file', 'sites', self.list_file)
+        self.plugin.parse_option('block_list', 'sites', 'social')
+        self.assertEqual(self.plugin.block_files, set([self.list_file]))
+        self.assertEqual(self.plugin.block_lists, set(['social']))
+
+        with self.assertRaises(ValueError):
+            self.plugin.parse_option('block_file', 'sites',
+                                     os.path.join(self.test_dir, 'missing'))
+        with self.assertRaises(ValueError):
+            self.plugin.parse_option('block_list', 'sites', '../social')
+
+    def test___get_domains(self):
+        """ SiteBlock._get_domains: includes domains from blocklists.
+            """
+        list_dir = os.path.join(self.test_dir, 'blocklists')
+        os.mkdir(list_dir)
+        open(os.path.join(list_dir, 'social'), 'w').write('a.example.com\n')
+
+        self.plugin.parse_option('block', 'sites', 'b.example.com')
+        self.plugin.parse_option('block_file', 'sites', self.list_file)
+        self.plugin.parse_option('block_list', 'sites', 'social', 'missing')
+
+        domains = self.plugin._get_domains(self.task)
+        self.assertEqual(domains, sorted(domains))
+        self.assertEqual(domains[:3], ['a.example.com', 'ads.example.com',
+                                       'b.example.com'])
+        self.assertEqual(len(domains), 6)
+
+
+class TestSiteBlockDns(FocusTestCase):
+    def setUp(self):
+        super(TestSiteBlockDns, self).setUp()
+        self.setup_dir()
+
+        self.task = MockTask(base_dir=self.test_dir, make_task_dir=True)
+        self.plugin = plugins.SiteBlock()
+        self.plugin.run_root = lambda command: os.system(command) == 0
+        self.plugin.resolv_file = os.path.join(self.test_dir, 'resolv.conf')
+        open(self.plugin.resolv_file, 'w').write('nameserver 10.0.0.1\n')
+
+        self.plugin.parse_option('mode', 'sites', 'dns')
+        self.plugin.parse_option('dns_address', 'sites', '127.0.0.1:0')
+        self.plugin.parse_option('block', 'sites', 'twitter.com')
+
+    def tearDown(self):
+        if self.plugin._sinkhole:
+            self.plugin._sinkhole.close()
+        self.plugin = None
+        self.task = None
+        super(TestSiteBlockDns, self).tearDown()
+
+    def test__parse_option(self):
+        """ SiteBlock.parse_option: dns options set addresses.
+            """
+        self.assertEqual(self.plugin.dns_address, ('127.0.0.1', 0))
+        self.plugin.parse_option('dns_upstream', 'sites', '10.0.0.2')
+        self.assertEqual(self.plugin.dns_upstream, ('10.0.0.2', 53))
+
+        with self.assertRaises(ValueError):
+            self.plugin.parse_option('dns_upstream', 'sites', 'dns.local')
+        with self.assertRaises(ValueError):
+            self.plugin.parse_option('dns_address', 'sites', '127.0.0.1:x')
+
+    def test__on_taskprepare(self):
+        """ SiteBlock.on_taskprepare: starts responder, forwarding to the
+            configured name server.
+            """
+        self.plugin.on_taskprepare(self.task)
+        self.assertIsNotNone(self.plugin._sinkhole.fileno())
+        self.assertEqual(self.plugin._sinkhole.upstream, ('10.0.0.1', 53))
+
+    def testIPv6Upstream__on_taskprepare(self):
+        """ SiteBlock.on_taskprepare: skips IPv6 name servers, which the
+            responder can't forward to.
+            """
+        open(self.plugin.resolv_file, 'w').write('nameserver fe80::1%eth0\n'
+                                                 'nameserver 10.0.0.1\n')
+        self.plugin.on_taskprepare(self.task)
+        self.assertEqual(self.plugin._sinkhole.upstream, ('10.0.0.1', 53))
+
+    def testStale__on_taskprepare(self):
+        """ SiteBlock.on_taskprepare: restores resolver configuration left
+            pointing at a responder that isn't running.
+            """
+        open(self.plugin.resolv_file, 'w').write(
+            '# FOCUS BEGIN\nnameserver 127.0.0.153\n# FOCUS END\n'
+            'nameserver 10.0.0.1\n')
+        self.plugin.mode = 'patch'
+        self.plugin.on_taskprepare(self.task)
+        self.assertEqual(open(self.plugin.resolv_file).read(),
+                         'nameserver 10.0.0.1\n')
+
+    def test__on_taskrun(self):
+        """ SiteBlock.on_taskrun: answers blocked names and points the
+            resolver at the responder, until the task ends.
+            """
+        self.plugin.on_taskprepare(self.task)
+        sinkhole = self.plugin._sinkhole
+        self.plugin.on_taskrun(self.task)
+
+        self.assertTrue(sinkhole.is_blocked('api.twitter.com'))
+        self.assertEqual(open(self.plugin.resolv_file).read(),
+                         '# FOCUS BEGIN\nnameserver 127.0.0.1\n'
+                         '# FOCUS END\nnameserver 10.0.0.1\n')
+
+        # query handled by the responder's thread
+        client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        client.settimeout(2)
+        try:
+            client.sendto('\x00\x01\x01\x00\x00\x01' + '\x00' * 6 +
+                          '\x07twitter\x03com\x00\x00\x01\x00\x01',
+                          sinkhole.address)
+            self.assertEqual(client.recv(512)[:2], '\x00\x01')
+        finally:
+            client.close()
+
+        self.plugin.on_taskend(self.task)
+        self.assertFalse(sinkhole.is_blocked('api.twitter.com'))
+        self.assertIsNone(sinkhole.fileno())
+        self.assertEqual(open(self.plugin.resolv_file).read(),
+                         'nameserver 10.0.0.1\n')
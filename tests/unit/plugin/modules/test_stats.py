@@ -1,4 +1,5 @@
 import os
+import gzip
 import datetime
 
 try:
@@ -6,12 +7,20 @@ try:
 except ImportError:
     import json
 
+from focus import errors, statstore
 from focus.plugin.modules import stats as plugins
 from focus_unittest import FocusTestCase, MockEnvironment
 
 class TestStats(FocusTestCase):
     class ParsedArgs(object):
         start = None
+        migrate = None
+        by = None
+        sessions = False
+        export = None
+        since = None
+        until = None
+        output = None
 
     def setUp(self):
         super(TestStats, self).setUp()
@@ -107,3 +116,133 @@ class TestStats(FocusTestCase):
             args.start = key
             self.plugin.execute(self.env, args)
             self.assertEqual(output, self.env.io.test__write_data)
+
+    def testBy__execute(self):
+        """ TestStats.execute: prints stats rollups.
+            """
+        args = self.ParsedArgs()
+        stats_dir = os.path.join(self.test_dir, '.stats')
+        os.mkdir(stats_dir)
+        today = datetime.date.today()
+
+        store = statstore.open_store(stats_dir)
+        store.add(today, 'test', 22)
+        store.add(today - datetime.timedelta(days=400), 'test', 60)
+        store.close()
+
+        args.start = 'today'
+        args.by = 'month'
+        self.plugin.execute(self.env, args)
+        output = self.env.io.test__write_data
+        self.assertRegexpMatches(output, r'\[ {0} \]'.format(
+                                 today.strftime('%Y-%m')))
+        self.assertRegexpMatches(output, r'0:22 \(100%\) - test')
+
+        del self.env.io.test__write_data
+        args.by = 'task'
+        self.plugin.execute(self.env, args)
+        self.assertRegexpMatches(self.env.io.test__write_data,
+                                 r'1:22 \(100%\) - test')
+
+    def testExport__execute(self):
+        """ TestStats.execute: exports stats records.
+            """
+        args = self.ParsedArgs()
+        for days in (0, 3):
+            filename = self._get_file(datetime.date.today() -
+                                      datetime.timedelta(days=days))
+            open(filename, 'w').write(json.dumps({"test": 22 + days}))
+
+        args.export = 'jsonl'
+        args.since = '1d'
+        self.plugin.execute(self.env, args)
+        self.assertEqual(json.loads(self.env.io.test__write_data),
+                         {'date': datetime.date.today().isoformat(),
+                          'task': 'test', 'minutes': 22})
+
+        # compressed file
+        args.export = 'csv'
+        args.since = None
+        args.output = os.path.join(self.test_dir, 'stats.csv.gz')
+        self.plugin.execute(self.env, args)
+        self.assertRegexpMatches(self.env.io.test__success_data,
+                                 r'Exported 2 stats records')
+        lines = gzip.open(args.output).read().splitlines()
+        self.assertEqual(lines[0], 'date,task,minutes')
+        self.assertEqual(len(lines), 3)
+
+        args.until = 'bad'
+        with self.assertRaises(errors.FocusError):
+            self.plugin.execute(self.env, args)
+
+    def testSqlite__execute(self):
+        """ TestStats.execute: migrates and prints stats from sqlite store.
+            """
+        args = self.ParsedArgs()
+        filename = self._get_file(datetime.date.today() -
+                                  datetime.timedelta(days=7))
+        open(filename, 'w').write(json.dumps({"test": 22}))
+
+        args.migrate = 'sqlite'
+        self.plugin.execute(self.env, args)
+        self.assertRegexpMatches(self.env.io.test__success_data,
+                                 r'Migrated 1 days')
+        self.assertTrue(os.path.isfile(os.path.join(self.test_dir, '.stats',
+                                                    'stats.db')))
+
+        args.migrate = None
+        args.start = '1w'
+        self.plugin.execute(self.env, args)
+        self.assertRegexpMatches(self.env.io.test__write_data,
+                                 r'0:22 \(100%\) - test')
+
+    def testCheckpoint__on_taskrun(self):
+        """ TestStats.on_taskrun: checkpoints duration, which is replaced by
+            task end.
+            """
+        filename = os.path.join(self.test_dir, '.stats', 'checkpoints')
+        self.env.task.duration = 3
+        self.plugin.on_taskrun(self.env.task)
+        self.assertFalse(os.path.exists(filename))
+
+        for duration in (5, 6, 10):
+            self.env.task.duration = duration
+            self.plugin.on_taskrun(self.env.task)
+        self.assertEqual(len(open(filename).read().splitlines()), 2)
+
+        self.env.task.duration = 12
+        self.plugin.on_taskend(self.env.task)
+        self.assertEqual(open(filename).read(), '')
+
+    def testSessions__execute(self):
+        """ TestStats.execute: prints task sessions logged at task end.
+            """
+        args = self.ParsedArgs()
+        self.env.task.name = 'test'
+        self.env.task.start_time = (datetime.datetime.now() -
+                                    datetime.timedelta(minutes=10))
+        self.plugin.on_taskend(self.env.task)
+
+        args.start = 'today'
+        args.sessions = True
+        self.plugin.execute(self.env, args)
+        self.assertRegexpMatches(self.env.io.test__write_data,
+                                 r'\d\d:\d\d - \d\d:\d\d  0:10 - test')
+
+    def testSqlite__on_taskend(self):
+        """ TestStats.on_taskend: logs task duration to sqlite store.
+            """
+        stats_dir = os.path.join(self.test_dir, '.stats')
+        os.mkdir(stats_dir)
+        statstore.migrate(stats_dir, 'sqlite')
+
+        self.env.task.start('test')
+        self.env.task.duration = 30
+        self.plugin.on_taskend(self.env.task)
+
+        store = statstore.open_store(stats_dir)
+        data = dict(store.iter_days(datetime.date.today() -
+                                    datetime.timedelta(days=1),
+                                    datetime.date.today()))
+        store.close()
+        self.assertEqual(sum(d.get('test', 0) for d in data.values()), 30)
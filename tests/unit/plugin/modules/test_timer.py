@@ -81,6 +81,22 @@ class TestTimer(FocusTestCase):
         self.plugin.parse_option('duration', None, '30')
         self.assertEqual(self.plugin.total_duration, 30)
 
+    def testUnitsDuration__parse_option(self):
+        """ Timer.parse_option: durations with units for duration option.
+            """
+        for value, mins in (('25m', 25), ('1h', 60), ('1h30m', 90),
+                            ('90s', 1.5), ('120s', 2), ('1H5M', 65)):
+            self.plugin.parse_option('duration', None, value)
+            self.assertEqual(self.plugin.total_duration, mins)
+
+    def testPartialMinuteLeft__execute(self):
+        """ Timer.execute: partial minute left is rounded up.
+            """
+        self.plugin.total_duration = 1.5
+        self.env.task.duration = 1
+        self.plugin.execute(self.env, self.ParsedArgs())
+        self.assertEqual(self.env.io.test__write_data, 'Time Left: 1m\n')
+
     def testZeroDuration__parse_option(self):
         """ Timer.parse_option: zero value for duration option.
             """
@@ -100,6 +116,9 @@ class TestTimer(FocusTestCase):
             self.plugin.parse_option('duration', None, 'ABC123')
         with self.assertRaises(ValueError):
             self.plugin.parse_option('duration', None, '22.50')
+        for value in ('', 'm', '30m1h', '0s', '5d'):
+            with self.assertRaises(ValueError):
+                self.plugin.parse_option('duration', None, value)
 
     def testSetTaskTotalDuration__on_taskstart(self):
         """ Timer.on_taskstart: sets task total duration reached timer setting.
@@ -236,6 +236,27 @@ class TestPluginRegistration(FocusTestCase):
             elif event == 'task_end':
                 self.assertTrue(hasattr(plugin, 'test__task_ended'))
 
+    def testLimitPlugins__run_event_hooks(self):
+        """ registration.run_event_hooks: only runs the task event methods
+            for the provided plugins, and returns reported activity.
+            """
+        plugin = MockPlugin()
+        plugin2 = MockPlugin()
+        plugin2.on_taskrun = lambda task: True
+
+        registration._event_hooks['task_run'] = [
+            (plugin.name, lambda: plugin),
+            ('other', lambda: plugin2)
+        ]
+
+        self.assertFalse(registration.run_event_hooks('task_run', MockTask(),
+                                                      plugins=[plugin]))
+        self.assertEqual(plugin.test__task_ran, 1)
+
+        self.assertTrue(registration.run_event_hooks('task_run', MockTask(),
+                                                     plugins=[plugin2]))
+        self.assertEqual(plugin.test__task_ran, 1)
+
     def testNoDisableMissing__run_option_hooks(self):
         """ registration.run_option_hooks: runs the parsing methods for
             registered plugins using option hooks; not disabled if missing
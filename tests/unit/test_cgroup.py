@@ -0,0 +1,191 @@
+import os
+import time
+import subprocess
+
+from focus import cgroup
+from focus_unittest import FocusTestCase, skipUnless
+
+
+def _can_create():
+    root = cgroup.get_root()
+    return bool(root and os.getuid() == 0 and os.access(root, os.W_OK))
+
+
+class TestCgroup(FocusTestCase):
+    def test__get_cgroup(self):
+        """ cgroup.get_cgroup: returns unified hierarchy path for a process,
+            ``None`` for non-existent processes.
+            """
+        if cgroup.is_supported():
+            self.assertTrue(cgroup.get_cgroup().startswith('/'))
+        self.assertIsNone(cgroup.get_cgroup(999999))
+
+
+class TestTaskScope(FocusTestCase):
+    def setUp(self):
+        super(TestTaskScope, self).setUp()
+        self.setup_dir()
+        self.scope = cgroup.TaskScope(self.test_dir)
+        os.mkdir(self.scope.apps_path)
+
+    def tearDown(self):
+        self.scope = None
+        super(TestTaskScope, self).tearDown()
+
+    def _write(self, name, data):
+        with open(os.path.join(self.scope.apps_path, name), 'w') as f:
+            f.write(data)
+
+    def test__get_stats(self):
+        """ TaskScope.get_stats: reads cpu, memory and process counts.
+            """
+        self._write('cpu.stat', 'usage_usec 2500000\nuser_usec 2000000\n')
+        self._write('memory.current', '1048576\n')
+        self._write('cgroup.procs', '100\n101\n')
+
+        self.assertEqual(self.scope.get_stats(),
+                         {'cpu': 2.5, 'memory': 1048576, 'processes': 2})
+
+    def testNoMemory__get_stats(self):
+        """ TaskScope.get_stats: memory is ``None`` without the memory
+            controller.
+            """
+        self.assertEqual(self.scope.get_stats(),
+                         {'cpu': 0.0, 'memory': None, 'processes': 0})
+
+    def test__is_populated(self):
+        """ TaskScope.is_populated: reads populated state from events.
+            """
+        self._write('cgroup.events', 'populated 1\nfrozen 0\n')
+        self.assertTrue(self.scope.is_populated())
+        self._write('cgroup.events', 'populated 0\nfrozen 0\n')
+        self.assertFalse(self.scope.is_populated())
+
+    def _make_scope(self, name='focus-test'):
+        scope = cgroup.TaskScope(os.path.join(self.test_dir, name))
+        for path in (scope.path, scope.apps_path,
+                     os.path.join(scope.path, 'daemon')):
+            os.mkdir(path)
+        return scope
+
+    def test__remove(self):
+        """ TaskScope.remove: moves remaining apps and task daemon processes
+            out and removes the scope and its leaves.
+            """
+        scope = self._make_scope()
+        apps_procs = os.path.join(scope.apps_path, 'cgroup.procs')
+        daemon_procs = os.path.join(scope.path, 'daemon', 'cgroup.procs')
+        open(apps_procs, 'w').write('100\n')
+        open(daemon_procs, 'w').write('200\n201\n')
+
+        written = []
+        _write = cgroup._write
+        cgroup._write = lambda filename, value: written.append((filename,
+                                                                value))
+        try:
+            self.assertFalse(scope.remove())
+        finally:
+            cgroup._write = _write
+
+        parent_procs = os.path.join(self.test_dir, 'cgroup.procs')
+        self.assertEqual(written, [(parent_procs, '100'),
+                                   (parent_procs, '200'),
+                                   (parent_procs, '201')])
+
+        # interface files are removed with the cgroup in cgroupfs
+        os.remove(apps_procs)
+        os.remove(daemon_procs)
+        self.assertTrue(scope.remove())
+        self.assertFalse(os.path.exists(scope.path))
+        self.assertTrue(scope.remove())
+
+    def test__remove_scope(self):
+        """ cgroup.remove_scope: only removes unused scopes created under
+            the current process's cgroup.
+            """
+        root, get_cgroup = cgroup._root, cgroup.get_cgroup
+        cgroup._root = os.path.dirname(self.test_dir)
+        cgroup.get_cgroup = lambda pid='self': '/' + os.path.basename(
+            self.test_dir)
+
+        try:
+            scope = self._make_scope()
+            daemon_procs = os.path.join(scope.path, 'daemon', 'cgroup.procs')
+            open(daemon_procs, 'w').write('200\n')
+            self.assertFalse(cgroup.remove_scope(scope.path))
+
+            os.remove(daemon_procs)
+            self.assertFalse(cgroup.remove_scope(self.test_dir))
+            other = os.path.join(self.test_dir, 'other')
+            os.mkdir(other)
+            self.assertFalse(cgroup.remove_scope(other))
+
+            self.assertTrue(cgroup.remove_scope(scope.path))
+            self.assertFalse(os.path.exists(scope.path))
+
+        finally:
+            cgroup._root, cgroup.get_cgroup = root, get_cgroup
+
+    @skipUnless(_can_create(), 'requires root and cgroup v2')
+    def testLive__kill(self):
+        """ TaskScope.kill: kills launched processes and their children.
+            """
+        path = os.path.join(cgroup.get_root(),
+                            'focus-unittest-{0}'.format(os.getpid()))
+        os.mkdir(path)
+        scope = cgroup.TaskScope(path)
+        os.mkdir(scope.apps_path)
+
+        try:
+            proc = subprocess.Popen('sleep 30 & sleep 30', shell=True,
+                                    preexec_fn=scope.attach)
+            for i in range(100):
+                if len(scope.get_pids()) == 3:
+                    break
+                time.sleep(0.02)
+
+            self.assertIn(proc.pid, scope.get_pids())
+            self.assertEqual(len(scope.get_pids()), 3)
+            self.assertTrue(scope.is_populated())
+
+            self.assertTrue(scope.kill())
+            proc.wait()
+            for i in range(100):
+                if not scope.is_populated():
+                    break
+                time.sleep(0.02)
+
+            self.assertFalse(scope.is_populated())
+            self.assertTrue(scope.remove())
+            self.assertFalse(os.path.exists(path))
+
+        finally:
+            scope.remove()
+
+    @skipUnless(_can_create(), 'requires root and cgroup v2')
+    def testLive__create(self):
+        """ TaskScope.create: creates scope and moves current process into
+            it.
+            """
+        parent = cgroup.get_cgroup()
+        name = 'unittest-{0}'.format(os.getpid())
+
+        pid = os.fork()
+        if not pid:
+            scope = cgroup.TaskScope.create(name)
+            ok = (scope and os.path.isdir(scope.apps_path)
+                  and cgroup.get_cgroup().endswith('/focus-{0}/daemon'
+                                                   .format(name)))
+            os._exit(0 if ok else 1)
+
+        status = os.waitpid(pid, 0)[1]
+
+        path = os.path.join(cgroup.get_root(), parent.lstrip('/'),
+                            'focus-' + name)
+        for sub in ('apps', 'daemon', ''):
+            try:
+                os.rmdir(os.path.join(path, sub))
+            except OSError:
+                pass
+
+        self.assertEqual(status, 0)
@@ -3,6 +3,9 @@
     """
 
 import os
+import time
+import signal
+import subprocess
 
 from focus import common
 from focus_unittest import FocusTestCase
@@ -12,6 +15,24 @@ class TestCommon(FocusTestCase):
     def setUp(self):
         super(TestCommon, self).setUp()
         self.setup_dir()
+        common._children.clear()
+
+    def tearDown(self):
+        common.terminate_children()
+        common._children.clear()
+        common._exited_children.clear()
+        super(TestCommon, self).tearDown()
+
+    def test__boottime(self):
+        """ common.boottime: returns a clock that doesn't go backwards.
+            """
+        first = common.boottime()
+        time.sleep(0.01)
+        self.assertGreater(common.boottime(), first)
+
+        # counts at least as much time as the monotonic clock
+        first = common.monotonic()
+        self.assertGreaterEqual(common.boottime(), first)
 
     def testExistFile__readfile(self):
         """ common.readfile: returns contents for existing files.
@@ -167,6 +188,130 @@ class TestCommon(FocusTestCase):
         self.assertIsNone(res[0])
         self.assertIsNone(res[1])
 
+    def testBackgroundTracked__shell_process(self):
+        """ common.shell_process: tracks backgrounded processes with the
+            current owner.
+            """
+        common.set_child_owner('test-owner')
+        try:
+            common.shell_process('sleep 5', background=True, scoped=True)
+        finally:
+            common.set_child_owner(None)
+
+        children = common.get_children(running=True)
+        self.assertEqual(len(children), 1)
+        self.assertEqual(children[0].owner, 'test-owner')
+        self.assertTrue(children[0].scoped)
+        self.assertIsNone(children[0].returncode)
+
+    def test__spawn_process(self):
+        """ common.spawn_process: returns tracked background process, or
+            ``None`` if it failed.
+            """
+        child = common.spawn_process('sleep 5', scoped=True)
+        self.assertEqual(common.get_children(running=True), [child])
+        self.assertTrue(child.scoped)
+        self.assertFalse(child.poll())
+
+        self.assertIsNone(common.spawn_process(['llama-llama']))
+
+    def test__reap_children(self):
+        """ common.reap_children: reaps exited background processes and
+            records exit status.
+            """
+        common.shell_process('exit 3', background=True)
+        child = common.get_children(running=True)[0]
+
+        for i in range(100):
+            if common.reap_children():
+                break
+            time.sleep(0.05)
+
+        self.assertEqual(common.get_children(running=True), [])
+        self.assertIn(child, common.get_children(running=False))
+        self.assertEqual(child.returncode, 3)
+
+    def testOther__reap_children(self):
+        """ common.reap_children: reaps other child processes, keeping their
+            exit status for their owners.
+            """
+        proc = subprocess.Popen(['sh', '-c', 'exit 4'])
+        time.sleep(0.2)  # exited, not yet waited on
+
+        self.assertEqual(common.reap_children(), [])
+        with self.assertRaises(OSError):
+            os.waitpid(proc.pid, os.WNOHANG)  # no zombie left
+
+        self.assertEqual(common.claim_exit_status(proc.pid), 4)
+        self.assertIsNone(common.claim_exit_status(proc.pid))
+
+    def testReaped__shell_process(self):
+        """ common.shell_process: returns exit status of foreground processes
+            reaped by ``reap_children``.
+            """
+        reap = lambda signo, frame: common.reap_children()
+        handler = signal.signal(signal.SIGCHLD, reap)
+
+        try:
+            for i in range(5):
+                self.assertEqual(common.shell_process('exit 5', exitcode=True),
+                                 (None, 5))
+        finally:
+            signal.signal(signal.SIGCHLD, handler)
+
+    def testScoped__terminate_children(self):
+        """ common.terminate_children: only signals scoped processes when
+            requested.
+            """
+        common.shell_process('sleep 5', background=True)
+        common.shell_process('sleep 5', background=True, scoped=True)
+
+        signalled = common.terminate_children(scoped=True)
+        self.assertEqual(len(signalled), 1)
+        self.assertTrue(signalled[0].scoped)
+
+        signalled = common.terminate_children()
+        self.assertIn(False, [c.scoped for c in signalled])
+
+    def testOwner__terminate_children(self):
+        """ common.terminate_children: only signals processes for the
+            provided owner.
+            """
+        common.set_child_owner('test-owner')
+        try:
+            common.shell_process('sleep 5', background=True)
+        finally:
+            common.set_child_owner(None)
+        common.shell_process('sleep 5', background=True)
+
+        signalled = common.terminate_children(owner='test-owner')
+        self.assertEqual(len(signalled), 1)
+        self.assertEqual(signalled[0].owner, 'test-owner')
+
+    def test__call_with_deadlines(self):
+        """ common.call_with_deadlines: runs calls concurrently, each within
+            its own deadline.
+            """
+        def _fail():
+            raise ValueError('broken')
+
+        start = common.monotonic()
+        results = common.call_with_deadlines([
+            ('hung', time.sleep, (5,), 0.2),
+            ('slow', lambda: time.sleep(0.3) or 'slow', (), 2),
+            ('fast', lambda x: x * 2, (21,), 1),
+            ('fail', _fail, (), 1)
+        ])
+        elapsed = common.monotonic() - start
+
+        self.assertLess(elapsed, 1.0)
+        self.assertGreaterEqual(elapsed, 0.3)
+        self.assertEqual([r[:2] for r in results],
+                         [('hung', 'timeout'), ('slow', 'ok'), ('fast', 'ok'),
+                          ('fail', 'error')])
+        self.assertEqual((results[1][2], results[2][2]), ('slow', 42))
+        self.assertIsInstance(results[3][2], ValueError)
+
     def testStr__to_utf8(self):
         """ common.to_utf8: returns same value if already str:
             """
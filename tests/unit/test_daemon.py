@@ -1,8 +1,11 @@
 import os
 import pwd
+import time
 import types
+import socket
+import threading
 
-from focus import daemon
+from focus import daemon, telemetry
 from focus.plugin import registration
 from focus_unittest import FocusTestCase, MockTask, MockPlugin
 
@@ -87,6 +90,81 @@ class TestDaemon(FocusTestCase):
         self.assertFalse(daemon.pid_exists(99999999))  # invalid
 
 
+class TestForkFocusd(FocusTestCase):
+    class MockFocusd(object):
+        def __init__(self, task):
+            self.task = task
+
+        def run(self, start_command_srv):
+            filename = os.path.join(self.task.task_dir, 'test__ran')
+            open(filename, 'w', 0).write(str(os.getpid()))
+
+    def setUp(self):
+        super(TestForkFocusd, self).setUp()
+        self.setup_dir()
+        self.task = MockTask(base_dir=self.test_dir, make_task_dir=True)
+        self.task.load()
+
+        # inject mock daemon, so the forked daemon exits right away
+        self.orig_focusd = daemon.Focusd
+        daemon.Focusd = self.MockFocusd
+
+    def tearDown(self):
+        daemon.Focusd = self.orig_focusd
+        self.task = None
+        super(TestForkFocusd, self).tearDown()
+
+    def test__fork_focusd(self):
+        """ daemon.fork_focusd: forks daemon from the current process.
+            """
+        self.assertTrue(daemon.fork_focusd(self.task))
+
+        # daemon ran in another process
+        filename = os.path.join(self.task.task_dir, 'test__ran')
+        for i in range(50):
+            if os.path.isfile(filename):
+                break
+            time.sleep(0.05)
+        self.assertNotEqual(open(filename).read(), str(os.getpid()))
+
+    def testForked__start_focusd(self):
+        """ daemon.start_focusd: forks daemon directly, rather than shelling
+            focusd, if no plugins need root.
+            """
+        calls = []
+        orig_fork, orig_shell = daemon.fork_focusd, daemon.shell_focusd
+        daemon.fork_focusd = lambda task: calls.append('fork') or True
+        daemon.shell_focusd = lambda data_dir: calls.append('shell') or True
+
+        plugin = MockPlugin()
+        plugin.needs_root = False
+        registration._event_hooks['task_run'] = [(plugin.name,
+                                                  lambda: plugin)]
+        registration._registered.register(plugin.name, lambda: plugin,
+                                          {'event': True})
+        try:
+            self.assertTrue(daemon.start_focusd(self.task))
+            self.assertEqual(calls, ['fork'])
+
+            # root plugins are shelled through sudo or the supervisor
+            plugin.needs_root = True
+            if os.getuid() != 0:
+                self.assertTrue(daemon.start_focusd(self.task))
+                self.assertEqual(calls, ['fork', 'shell'])
+
+        finally:
+            daemon.fork_focusd, daemon.shell_focusd = orig_fork, orig_shell
+            registration._event_hooks = {}
+            registration._registered.clear()
+
+    def testPidFileExists__fork_focusd(self):
+        """ daemon.fork_focusd: fails if a daemon is already running.
+            """
+        pid_file = daemon.get_daemon_pidfile(self.task)
+        open(pid_file, 'w', 0).write('99999999\n')
+        self.assertFalse(daemon.fork_focusd(self.task))
+
+
 class TestFocusd(FocusTestCase):
     def setUp(self):
         super(TestFocusd, self).setUp()
@@ -150,6 +228,32 @@ class TestFocusd(FocusTestCase):
         self.assertEqual([], [k for k in os.environ.keys() if
                                k.startswith('SUDO_') or k == 'LOGNAME'])
 
+    def testFails___drop_privs(self):
+        """ daemon._drop_privs: fails when privileges can't be dropped.
+            """
+        # unknown user
+        with self.assertRaises(OSError):
+            daemon._drop_privs(2 ** 31 - 2)
+
+        # another user, without root privileges
+        if os.geteuid() != 0:
+            with self.assertRaises(OSError):
+                daemon._drop_privs(0)
+            return
+
+        def _fail(*args):
+            raise OSError(1, 'Operation not permitted')
+
+        setgroups = os.setgroups
+        os.setgroups = _fail
+        try:
+            with self.assertRaises(OSError):
+                daemon._drop_privs(pwd.getpwnam('nobody').pw_uid)
+        finally:
+            os.setgroups = setgroups
+
+        self.assertEqual(os.getuid(), 0)
+
         # proper umask set
         try:
             old_mask = os.umask(022)
@@ -159,6 +263,30 @@ class TestFocusd(FocusTestCase):
         except OSError:
             pass
 
+    def test___call_as_user(self):
+        """ daemon._call_as_user: calls function with effective ids of user,
+            then restores them.
+            """
+        _ids = lambda: (os.geteuid(), os.getegid())
+        orig = (_ids(), os.getgroups())
+
+        if os.geteuid() != 0:
+            self.assertEqual(daemon._call_as_user(0, _ids), orig[0])
+            return
+
+        info = pwd.getpwnam('nobody')
+        self.assertEqual(daemon._call_as_user(info.pw_uid, _ids),
+                         (info.pw_uid, info.pw_gid))
+        self.assertEqual((_ids(), os.getgroups()), orig)
+
+        # restored when function fails
+        def _fail():
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            daemon._call_as_user(info.pw_uid, _fail)
+        self.assertEqual((_ids(), os.getgroups()), orig)
+
     def test__shutdown(self):
         """ Focusd.shutdown: task runner process is shutdown.
             """
@@ -223,6 +351,176 @@ class TestFocusd(FocusTestCase):
         self.assertFalse(self.focusd.running)
 
 
+class TestSupervisor(FocusTestCase):
+    def setUp(self):
+        super(TestSupervisor, self).setUp()
+        self.setup_dir()
+
+        self.socket_path = os.path.join(self.test_dir, 'focusd.sock')
+        self.supervisor = daemon.Supervisor(lambda data_dir: None,
+                                            socket_path=self.socket_path)
+
+        # active file for the task being requested
+        self.active_file = os.path.join(self.test_dir, '.active.cfg')
+        open(self.active_file, 'w', 0).write('')
+
+        # inject fake task start, we don't want to fork while testing
+        self.ready_fds = []
+
+        def _start_task(this, data_dir, owner, env):
+            this.test__started = (data_dir, owner, env)
+            read_fd, write_fd = os.pipe()
+            self.ready_fds.append(write_fd)
+            return read_fd
+        self.supervisor._start_task = types.MethodType(_start_task,
+                                                       self.supervisor)
+
+    def tearDown(self):
+        for fd in self.ready_fds:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self.supervisor.shutdown()
+        self.supervisor = None
+        super(TestSupervisor, self).tearDown()
+
+    def testOwner___handle_request(self):
+        """ Supervisor._handle_request: starts task for active file owner.
+            """
+        payload = '\x80'.join(['RUN', self.test_dir, 'DISPLAY=:1',
+                                'LD_PRELOAD=/tmp/evil.so'])
+        res = self.supervisor._handle_request(payload, os.getuid())
+        self.assertIsInstance(res, int)  # responds once the daemon is ready
+        os.close(res)
+
+        # only whitelisted environment variables are passed along
+        self.assertEqual(self.supervisor.test__started,
+                         (self.test_dir, os.getuid(), {'DISPLAY': ':1'}))
+
+    def testNotOwner___handle_request(self):
+        """ Supervisor._handle_request: refuses users not owning the task.
+            """
+        uid = os.stat(self.active_file).st_uid + 1
+        payload = '\x80'.join(['RUN', self.test_dir])
+        self.assertEqual(self.supervisor._handle_request(payload, uid), 'FAIL')
+        self.assertFalse(hasattr(self.supervisor, 'test__started'))
+
+    def testInvalid___handle_request(self):
+        """ Supervisor._handle_request: refuses invalid requests.
+            """
+        # unknown operation
+        payload = '\x80'.join(['OMG', self.test_dir])
+        self.assertEqual(self.supervisor._handle_request(payload, 0), 'FAIL')
+
+        # no active task
+        self.clean_paths(self.active_file)
+        payload = '\x80'.join(['RUN', self.test_dir])
+        self.assertEqual(self.supervisor._handle_request(payload, 0), 'FAIL')
+
+        # unknown peer
+        self.assertEqual(self.supervisor._handle_request(payload, None),
+                         'FAIL')
+        self.assertFalse(hasattr(self.supervisor, 'test__started'))
+
+    def _request(self):
+        """ Connects to the supervisor and sends a task start request.
+
+            Returns connected ``socket`` object.
+            """
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.socket_path)
+        sock.sendall('\x80'.join(['RUN', self.test_dir]))
+        sock.shutdown(socket.SHUT_WR)
+        return sock
+
+    def test___serve(self):
+        """ Supervisor._serve: processes request from client socket.
+            """
+        self.supervisor._listen()
+
+        sock = self._request()
+        self.supervisor._serve()
+
+        # responds once the task daemon reports in
+        os.write(self.ready_fds[0], 'OK')
+        self.supervisor._serve()
+        self.assertEqual(sock.recv(16), 'OK')
+        sock.close()
+
+        # only root may connect, unless a group is provided
+        self.assertEqual(os.stat(self.socket_path).st_mode & 0777, 0600)
+
+    def testStarting___serve(self):
+        """ Supervisor._serve: serves other requests while task daemons are
+            starting, failing those that don't report in time.
+            """
+        self.supervisor.START_TIMEOUT = 0.5
+        self.supervisor._listen()
+
+        socks = [self._request()]
+        self.supervisor._serve()
+        socks.append(self._request())
+
+        start = time.time()
+        self.supervisor._serve()
+        self.assertLess(time.time() - start, 0.4)
+        self.assertEqual(len(self.ready_fds), 2)
+
+        # second daemon exits without reporting in, first never reports
+        os.close(self.ready_fds.pop())
+        self.supervisor._serve()
+        self.assertEqual(socks[1].recv(16), 'FAIL')
+
+        while self.supervisor._starting:
+            self.supervisor._serve()
+        self.assertEqual(socks[0].recv(16), 'FAIL')
+        self.assertLess(time.time() - start, 1.5)
+
+        for sock in socks:
+            sock.close()
+
+    def testStalled___serve(self):
+        """ Supervisor._serve: drops clients that don't finish sending their
+            request in time.
+            """
+        self.supervisor.CLIENT_TIMEOUT = 0.2
+        self.supervisor._listen()
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.socket_path)
+
+        def _trickle():
+            # keeps sending, but never finishes the request
+            try:
+                for _ in range(40):
+                    sock.send('R')
+                    time.sleep(0.05)
+            except socket.error:
+                pass
+
+        thread = threading.Thread(target=_trickle)
+        thread.daemon = True
+        thread.start()
+
+        try:
+            start = time.time()
+            self.supervisor._serve()
+            self.assertLess(time.time() - start, 1.0)
+            self.assertFalse(hasattr(self.supervisor, 'test__started'))
+
+        finally:
+            sock.close()
+            thread.join()
+
+    def testNoSupervisor___supervisor_request(self):
+        """ daemon._supervisor_request: no supervisor available.
+            """
+        self.assertIsNone(daemon._supervisor_request(self.test_dir,
+                                                     self.socket_path))
+
+
 class TestTaskProcess(FocusTestCase):
     def setUp(self):
         super(TestTaskProcess, self).setUp()
@@ -257,6 +555,51 @@ class TestTaskProcess(FocusTestCase):
         _check_pipe_shutdown(self, self.pipe)
         self.assertFalse(self.task.active)
 
+    def test___next_period(self):
+        """ TaskProcess._next_period: backs off after idle ticks, up to max
+            period, and resets on activity.
+            """
+        # backoff disabled
+        self.assertEqual(self.process._next_period(None, 100), 0.1)
+
+        self.process._max_sleep_period = 0.3
+        self.assertEqual(self.process._next_period(None, 4), 0.1)
+
+        self.process._period = 0.1
+        self.assertEqual(self.process._next_period(None, 5), 0.2)
+        self.process._period = 0.2
+        self.assertEqual(self.process._next_period(None, 6), 0.3)
+        self.process._period = 0.3
+        self.assertEqual(self.process._next_period(None, 7), 0.3)
+
+        # activity resets period
+        self.assertEqual(self.process._next_period(True, 0), 0.1)
+
+    def testCompensated__run(self):
+        """ TaskProcess.run: time spent in `_run` doesn't stretch the loop
+            period, and loop measurements are recorded.
+            """
+        ticks = []
+
+        def _run():
+            ticks.append(1)
+            time.sleep(0.05)
+            return len(ticks) < 5 or False
+
+        self.process._run = _run
+        self.process._register_sigterm = lambda: None
+
+        start = time.time()
+        with self.assertRaises(SystemExit):
+            self.process.run()
+        elapsed = time.time() - start
+
+        # 4 periods of 0.1s, plus the final tick; 0.6s if uncompensated
+        self.assertLess(elapsed, 0.55)
+        self.assertEqual(self.process._tick_hist.count, 5)
+        self.assertEqual(self.process._lag_hist.count, 5)
+        self.assertGreaterEqual(self.process._tick_hist.max, 0.05)
+
 
 class TestTaskRunner(FocusTestCase):
     class MockLock(object):
@@ -381,6 +724,128 @@ class TestTaskRunner(FocusTestCase):
         _check_pipe_shutdown(self, self.pipe)
         self.assertFalse(self.task.active)
 
+    def testIdle__run(self):
+        """ TaskRunner.run: keeps running while plugins report no activity,
+            and backs off the loop period.
+            """
+        ticks = []
+
+        def _on_taskrun(task):
+            ticks.append(1)
+            if len(ticks) >= 8:
+                self.task_runner._exited = True
+            return None if len(ticks) % 2 else False  # idle plugin results
+
+        self.plugin.on_taskrun = _on_taskrun
+        self.task_runner._prepare = lambda: None
+        self.task_runner._tick = lambda lag, duration: None
+        self.task_runner._sleep_period = 0.01
+        self.task_runner._max_sleep_period = 0.02
+        self.task_runner._idle_ticks = 2
+
+        # plugins only backed off while watching a file descriptor
+        read_fd, write_fd = os.pipe()
+        self.plugin.watch_fd = read_fd
+
+        try:
+            self.task_runner.run()
+
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+        self.assertEqual(len(ticks), 8)
+        self.assertTrue(self.task._loaded)
+        self.assertEqual(self.task_runner._period, 0.02)
+
+    def testPolling___next_period(self):
+        """ TaskRunner._next_period: doesn't back off while plugins poll on
+            each tick.
+            """
+        self.task_runner._max_sleep_period = 4.0
+        self.task_runner._period = 2.0
+        self.assertEqual(self.task_runner._next_period(False, 100), 1.0)
+
+        self.plugin.watch_fd = 0
+        self.assertEqual(self.task_runner._next_period(False, 100), 4.0)
+
+    def testActivity__run(self):
+        """ TaskRunner._run: records plugin activity, without ending the
+            main event loop.
+            """
+        self.assertIsNone(self.task_runner._run())
+        self.assertFalse(self.task_runner._active)
+
+        self.plugin.on_taskrun = lambda task: True
+        self.assertIsNone(self.task_runner._run())
+        self.assertTrue(self.task_runner._active)
+
+    def testActivity___run_events(self):
+        """ TaskRunner._run_events: returns whether plugins reported
+            activity.
+            """
+        self.assertFalse(self.task_runner._run_events())
+
+        self.plugin.on_taskrun = lambda task: True
+        self.assertTrue(self.task_runner._run_events())
+
+    def testWatched___wait(self):
+        """ TaskRunner._wait: runs task_run events for plugins as soon as
+            their watched file descriptors are readable.
+            """
+        read_fd, write_fd = os.pipe()
+        try:
+            ran = []
+
+            def _on_taskrun(task):
+                os.read(read_fd, 1)
+                ran.append(time.time())
+
+            self.plugin.watch_fd = read_fd
+            self.plugin.on_taskrun = _on_taskrun
+            self.task_runner._ran_taskstart = True
+
+            os.write(write_fd, 'x')
+            start = time.time()
+            self.task_runner._wait(0.2)
+
+            self.assertEqual(len(ran), 1)
+            self.assertLess(ran[0] - start, 0.1)
+            self.assertGreaterEqual(time.time() - start, 0.19)
+
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+    def testTaskRemaining___wait(self):
+        """ TaskRunner._wait: returns when task's total duration is
+            reached, before the next loop tick.
+            """
+        self.task.remaining = 0.05
+        start = time.time()
+        self.task_runner._wait(2.0)
+        self.assertLess(time.time() - start, 0.5)
+
+        self.task.remaining = -1  # overrun
+        start = time.time()
+        self.task_runner._wait(2.0)
+        self.assertLess(time.time() - start, 0.1)
+
+    def test___write_perf(self):
+        """ TaskRunner._write_perf: writes loop measurements snapshot.
+            """
+        self.setup_dir()
+        filename = os.path.join(self.test_dir, '.focusd.perf')
+        self.task_runner._perf_file = filename
+
+        self.task_runner._tick(0.01, 0.2)
+        data = telemetry.read_snapshot(filename, histograms=('lag', 'tick'))
+
+        self.assertEqual(data['period'], 1.0)
+        self.assertEqual(data['lag'].count, 1)
+        self.assertEqual(data['tick'].max, 0.2)
+        self.assertIn('children', data)
+
 
 class TestCommandServer(FocusTestCase):
     def setUp(self):
@@ -0,0 +1,167 @@
+from focus import dbuspool
+from focus_unittest import FocusTestCase, skipIf
+
+
+class FakeProxy(object):
+    def __init__(self, bus, bus_name, path):
+        self.bus = bus
+        self.bus_name = bus_name
+        self.path = path
+        self.owner = bus.owners.get(bus_name)
+
+    def Ping(self, value):
+        owner = self.bus.owners.get(self.bus_name)
+        if not self.bus.connected or owner != self.owner:
+            raise dbuspool.DBusException('org.freedesktop.DBus.Error.'
+                                         'ServiceUnknown')
+        return value
+
+
+class FakeWatch(object):
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakeBus(object):
+    def __init__(self, owners):
+        self.owners = owners
+        self.connected = True
+        self.lookups = 0
+        self.watches = {}
+
+    def get_is_connected(self):
+        return self.connected
+
+    def get_object(self, bus_name, path):
+        if not bus_name in self.owners:
+            raise dbuspool.DBusException('ServiceUnknown')
+        self.lookups += 1
+        return FakeProxy(self, bus_name, path)
+
+    def watch_name_owner(self, bus_name, callback):
+        self.watches[bus_name] = callback
+        return FakeWatch()
+
+    def name_has_owner(self, bus_name):
+        return bus_name in self.owners
+
+    def close(self):
+        self.connected = False
+
+
+class TestDBusPool(FocusTestCase):
+    def setUp(self):
+        super(TestDBusPool, self).setUp()
+        self.owners = {'org.test': ':1.1'}
+        self.buses = []
+
+        def _factory():
+            self.buses.append(FakeBus(self.owners))
+            return self.buses[-1]
+
+        self.pool = dbuspool.DBusPool(bus_factory=_factory,
+                                      interface_factory=lambda o, i: o)
+
+    def tearDown(self):
+        self.pool = None
+        super(TestDBusPool, self).tearDown()
+
+    def test__get_interface(self):
+        """ DBusPool.get_interface: caches bus and proxies.
+            """
+        iface = self.pool.get_interface('org.test', '/org/test', 'org.Test')
+        self.assertIsNotNone(iface)
+        self.assertIs(self.pool.get_interface('org.test', '/org/test',
+                                              'org.Test'), iface)
+        self.assertIs(self.pool.get_object('org.test', '/org/test'), iface)
+        self.assertEqual((len(self.buses), self.buses[0].lookups), (1, 1))
+
+        self.assertIsNone(self.pool.get_interface('org.missing', '/', 'x'))
+
+    def testReconnect__call(self):
+        """ DBusPool.call: reconnects when the bus drops.
+            """
+        self.assertEqual(self.pool.call('org.test', '/org/test', 'org.Test',
+                                        'Ping', 1), 1)
+        self.buses[0].connected = False
+
+        self.assertEqual(self.pool.call('org.test', '/org/test', 'org.Test',
+                                        'Ping', 2), 2)
+        self.assertEqual(len(self.buses), 2)
+
+    def testOwnerChanged__call(self):
+        """ DBusPool.call: retries with new proxies when owner changes.
+            """
+        self.pool.call('org.test', '/org/test', 'org.Test', 'Ping', 1)
+        self.owners['org.test'] = ':1.2'  # service restarted
+
+        self.assertEqual(self.pool.call('org.test', '/org/test', 'org.Test',
+                                        'Ping', 2), 2)
+        self.assertEqual(self.buses[0].lookups, 2)
+
+        # fails again
+        del self.owners['org.test']
+        with self.assertRaises(dbuspool.DBusException):
+            self.pool.call('org.test', '/org/test', 'org.Test', 'Ping', 3)
+
+    def testOwnerWatch__invalidate(self):
+        """ DBusPool: invalidates proxies when owner change is signalled.
+            """
+        proxy = self.pool.get_object('org.test', '/org/test')
+        changed = self.buses[0].watches['org.test']
+
+        changed(':1.1')  # current owner
+        self.assertIs(self.pool.get_object('org.test', '/org/test'), proxy)
+
+        self.owners['org.test'] = ':1.2'
+        changed(':1.2')
+        self.assertIsNot(self.pool.get_object('org.test', '/org/test'),
+                         proxy)
+
+    def test__has_owner(self):
+        """ DBusPool.has_owner: checks if service is running.
+            """
+        self.assertTrue(self.pool.has_owner('org.test'))
+        self.assertFalse(self.pool.has_owner('org.missing'))
+
+    def test__close(self):
+        """ DBusPool.close: closes bus and cancels watches.
+            """
+        self.pool.get_object('org.test', '/org/test')
+        self.pool.close()
+        self.assertFalse(self.buses[0].connected)
+
+        self.pool.get_object('org.test', '/org/test')
+        self.assertEqual(len(self.buses), 2)
+
+    def test__private_pool(self):
+        """ dbuspool.private_pool: uses its own connection for the current
+            thread, closing it afterwards.
+            """
+        orig = dbuspool._pool
+        dbuspool._pool = self.pool
+
+        try:
+            with dbuspool.private_pool() as pool:
+                self.assertIs(dbuspool.get_pool(), pool)
+                pool.get_object('org.test', '/org/test')
+
+                with dbuspool.private_pool() as nested:
+                    self.assertIs(nested, pool)
+
+            self.assertIs(dbuspool.get_pool(), self.pool)
+            self.assertEqual(len(self.buses), 1)
+            self.assertFalse(self.buses[0].connected)
+
+        finally:
+            dbuspool._pool = orig
+
+    @skipIf(dbuspool.dbus, 'dbus module available')
+    def testUnavailable__get_object(self):
+        """ DBusPool.get_object: returns None without DBus.
+            """
+        pool = dbuspool.DBusPool()
+        self.assertIsNone(pool.get_object('org.test', '/org/test'))
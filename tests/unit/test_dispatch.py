@@ -0,0 +1,104 @@
+import gc
+import time
+import threading
+
+from focus import dispatch
+from focus_unittest import FocusTestCase
+
+
+class TestDispatcher(FocusTestCase):
+    def setUp(self):
+        super(TestDispatcher, self).setUp()
+        self.sent = []
+        self.failures = 0
+        self.gate = threading.Event()
+        self.gate.set()
+
+        def _send(*args):
+            self.gate.wait(5)
+            if self.failures:
+                self.failures -= 1
+                raise IOError('transient')
+            self.sent.append(args)
+
+        self.dispatcher = dispatch.Dispatcher(_send, max_size=2,
+                                              retries=2, backoff=0.01)
+
+    def tearDown(self):
+        self.gate.set()
+        dispatch._dispatchers.discard(self.dispatcher)
+        self.dispatcher = None
+        super(TestDispatcher, self).tearDown()
+
+    def test__submit(self):
+        """ Dispatcher.submit: returns before delivering in background.
+            """
+        self.gate.clear()  # slow backend
+
+        start = time.time()
+        self.dispatcher.submit('a', 'title', 'one')
+        self.assertLess(time.time() - start, 0.1)
+        self.assertEqual(self.sent, [])
+
+        self.gate.set()
+        self.assertTrue(self.dispatcher.drain(2))
+        self.assertEqual(self.sent, [('title', 'one')])
+        self.assertEqual(self.dispatcher.delivered, 1)
+        self.assertEqual(self.dispatcher.latency.count, 1)
+
+    def testCoalesce__submit(self):
+        """ Dispatcher.submit: replaces pending messages with same key and
+            drops oldest when full.
+            """
+        self.gate.clear()
+        self.dispatcher.submit('busy', 'first')  # in flight
+        time.sleep(0.1)
+
+        self.dispatcher.submit('a', 'one')
+        self.dispatcher.submit('a', 'two')  # supersedes
+        self.dispatcher.submit('b', 'three')
+        self.dispatcher.submit('c', 'four')  # full, drops 'a'
+
+        self.gate.set()
+        self.assertTrue(self.dispatcher.drain(2))
+        self.assertEqual(self.sent, [('first',), ('three',), ('four',)])
+        self.assertEqual(self.dispatcher.dropped, 1)
+
+    def testRetry__submit(self):
+        """ Dispatcher.submit: retries failed deliveries with backoff.
+            """
+        self.failures = 2
+        self.dispatcher.submit('a', 'one')
+        self.assertTrue(self.dispatcher.drain(2))
+        self.assertEqual(self.sent, [('one',)])
+
+        self.failures = 3  # exceeds retries
+        self.dispatcher.submit('a', 'two')
+        self.assertTrue(self.dispatcher.drain(2))
+        self.assertEqual(self.sent, [('one',)])
+        self.assertEqual(self.dispatcher.failed, 1)
+
+    def test__drain_all(self):
+        """ dispatch.drain_all: stops waiting at deadline.
+            """
+        self.gate.clear()
+        self.dispatcher.submit('a', 'one')
+
+        start = time.time()
+        self.assertFalse(dispatch.drain_all(0.2))
+        self.assertLess(time.time() - start, 1.0)
+
+        self.gate.set()
+        self.assertTrue(dispatch.drain_all(2))
+
+    def testReleased__drain_all(self):
+        """ dispatch.drain_all: only waits on dispatchers still in use.
+            """
+        dispatcher = dispatch.Dispatcher(lambda *args: None)
+        self.assertIn(dispatcher, dispatch._dispatchers)
+
+        count = len(dispatch._dispatchers)
+        dispatcher = None
+        gc.collect()
+        self.assertEqual(len(dispatch._dispatchers), count - 1)
+        self.assertIn(self.dispatcher, dispatch._dispatchers)
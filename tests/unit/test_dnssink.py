@@ -0,0 +1,139 @@
+import socket
+import select
+import struct
+
+from focus import dnssink
+from focus_unittest import FocusTestCase
+
+
+def _make_query(ident, name, qtype=1):
+    labels = ''.join(chr(len(l)) + l for l in name.split('.'))
+    return (struct.pack('!HHHHHH', ident, 0x0100, 1, 0, 0, 0) + labels +
+            '\x00' + struct.pack('!HH', qtype, 1))
+
+
+class TestDomainTrie(FocusTestCase):
+    def test__matches(self):
+        """ DomainTrie.matches: matches domains and their subdomains.
+            """
+        trie = dnssink.DomainTrie(['example.com', 'ads.example.net'])
+        self.assertEqual(trie.count, 2)
+
+        self.assertTrue(trie.matches('example.com'))
+        self.assertTrue(trie.matches('WWW.Example.com.'))
+        self.assertTrue(trie.matches('a.b.ads.example.net'))
+        self.assertFalse(trie.matches('example.net'))
+        self.assertFalse(trie.matches('notexample.com'))
+        self.assertFalse(trie.matches('com'))
+
+
+class TestDnsSinkhole(FocusTestCase):
+    def setUp(self):
+        super(TestDnsSinkhole, self).setUp()
+
+        # stub upstream name server
+        self.upstream = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.upstream.bind(('127.0.0.1', 0))
+        self.upstream.settimeout(2)
+
+        self.sinkhole = dnssink.DnsSinkhole(('127.0.0.1', 0),
+                                            self.upstream.getsockname())
+        self.assertTrue(self.sinkhole.open())
+        self.sinkhole.set_domains(['example.com'])
+
+        self.client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.client.settimeout(2)
+
+    def tearDown(self):
+        self.client.close()
+        self.sinkhole.close()
+        self.upstream.close()
+        super(TestDnsSinkhole, self).tearDown()
+
+    def _pump(self):
+        select.select([self.sinkhole._sock, self.sinkhole._upstream_sock],
+                      [], [], 2)
+        self.assertTrue(self.sinkhole.process())
+
+    def testBlocked__process(self):
+        """ DnsSinkhole.process: answers blocked names and subdomains.
+            """
+        self.client.sendto(_make_query(0x1234, 'www.example.com'),
+                           self.sinkhole.address)
+        self._pump()
+
+        response = self.client.recv(512)
+        ident, flags, qd, an = struct.unpack_from('!HHHH', response)
+        self.assertEqual((ident, qd, an), (0x1234, 1, 1))
+        self.assertTrue(flags & 0x8000)
+        self.assertEqual(response[-4:], '\x00\x00\x00\x00')  # 0.0.0.0
+
+        # other types answered without records
+        self.client.sendto(_make_query(0x1235, 'example.com', qtype=15),
+                           self.sinkhole.address)
+        self._pump()
+        ident, flags, qd, an = struct.unpack_from('!HHHH',
+                                                  self.client.recv(512))
+        self.assertEqual((ident, flags & 0xf, an), (0x1235, 0, 0))
+
+    def testForward__process(self):
+        """ DnsSinkhole.process: forwards other names and relays response.
+            """
+        query = _make_query(0x4321, 'example.org')
+        self.client.sendto(query, self.sinkhole.address)
+        self._pump()
+
+        forwarded, addr = self.upstream.recvfrom(512)
+        self.assertEqual(forwarded[2:], query[2:])
+
+        # not sent from the listening socket, which is bound to loopback
+        self.assertNotEqual(addr, self.sinkhole.address)
+
+        # respond with forwarded id
+        response = forwarded[:2] + '\x81\x80' + forwarded[4:]
+        self.upstream.sendto(response, addr)
+        self._pump()
+
+        self.assertEqual(self.client.recv(512),
+                         '\x43\x21\x81\x80' + forwarded[4:])
+
+    def test__start(self):
+        """ DnsSinkhole.start: answers queries in a thread until closed.
+            """
+        self.sinkhole.start()
+        self.client.sendto(_make_query(0x1234, 'example.com'),
+                           self.sinkhole.address)
+        self.assertEqual(self.client.recv(512)[:2], '\x12\x34')
+
+        thread = self.sinkhole._thread
+        self.sinkhole.close()
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(self.sinkhole.fileno())
+
+    def test__is_serving(self):
+        """ dnssink.is_serving: determines if a responder is listening.
+            """
+        self.sinkhole.start()
+        address = self.sinkhole.address
+        self.assertTrue(dnssink.is_serving(address))
+
+        self.sinkhole.close()
+        self.assertFalse(dnssink.is_serving(address))
+
+    def test__set_domains(self):
+        """ DnsSinkhole.set_domains: replaces blocked domains.
+            """
+        self.assertTrue(self.sinkhole.is_blocked('a.example.com'))
+        self.sinkhole.set_domains(['example.org'])
+        self.assertFalse(self.sinkhole.is_blocked('a.example.com'))
+        self.assertTrue(self.sinkhole.is_blocked('example.org'))
+
+    def test__get_nameservers(self):
+        """ dnssink.get_nameservers: reads resolver configuration.
+            """
+        self.setup_dir()
+        filename = self.make_file('# comment\nsearch local\n'
+                                  'nameserver 10.0.0.1\n'
+                                  'nameserver 10.0.0.2 # second\n')
+        self.assertEqual(dnssink.get_nameservers(filename),
+                         ['10.0.0.1', '10.0.0.2'])
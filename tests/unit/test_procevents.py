@@ -0,0 +1,68 @@
+import os
+import sys
+import struct
+import select
+import subprocess
+
+from focus import procevents
+from focus_unittest import FocusTestCase, skipUnless
+
+_CAN_SUBSCRIBE = sys.platform.startswith('linux') and os.getuid() == 0
+
+
+def _make_event(what, pid, tgid):
+    event = struct.pack('=IIQII', what, 0, 0, pid, tgid)
+    cn_msg = struct.pack('=IIIIHH', 1, 1, 0, 0, len(event), 0)
+    size = 16 + len(cn_msg) + len(event)
+    return struct.pack('=IHHII', size, 3, 0, 0, 0) + cn_msg + event
+
+
+class TestProcEvents(FocusTestCase):
+    def test___parse_execs(self):
+        """ procevents._parse_execs: returns thread group ids for exec
+            events only.
+            """
+        data = (_make_event(0x2, 101, 100) + _make_event(0x1, 200, 200) +
+                _make_event(0x2, 300, 300))
+        self.assertEqual(procevents._parse_execs(data), [100, 300])
+
+    def testTruncated___parse_execs(self):
+        """ procevents._parse_execs: ignores truncated messages.
+            """
+        data = _make_event(0x2, 100, 100)
+        self.assertEqual(procevents._parse_execs(data[:-4]), [])
+        self.assertEqual(procevents._parse_execs(''), [])
+
+
+class TestExecMonitor(FocusTestCase):
+    def setUp(self):
+        super(TestExecMonitor, self).setUp()
+        self.monitor = procevents.ExecMonitor()
+
+    def tearDown(self):
+        self.monitor.close()
+        self.monitor = None
+        super(TestExecMonitor, self).tearDown()
+
+    def testNotOpen__read_execs(self):
+        """ ExecMonitor.read_execs: returns ``None`` if not open.
+            """
+        self.assertIsNone(self.monitor.read_execs())
+        self.assertIsNone(self.monitor.fileno())
+
+    @skipUnless(_CAN_SUBSCRIBE, 'requires root on linux')
+    def test__read_execs(self):
+        """ ExecMonitor.read_execs: returns pids for executed programs.
+            """
+        self.assertTrue(self.monitor.open())
+
+        proc = subprocess.Popen(['/bin/true'])
+        proc.wait()
+
+        pids = []
+        while not proc.pid in pids:
+            if not select.select([self.monitor.fileno()], [], [], 2)[0]:
+                break
+            pids.extend(self.monitor.read_execs())
+
+        self.assertIn(proc.pid, pids)
@@ -0,0 +1,232 @@
+import os
+import sys
+import time
+import signal
+import subprocess
+
+from focus import procscan
+from focus_unittest import FocusTestCase
+
+
+class TestProcScan(FocusTestCase):
+    def test__get_pids(self):
+        """ procscan.get_pids: includes current process.
+            """
+        self.assertIn(os.getpid(), procscan.get_pids())
+
+    def test__get_last_pid(self):
+        """ procscan.get_last_pid: returns last allocated process identifier.
+            """
+        last_pid = procscan.get_last_pid()
+        if last_pid is None:
+            return  # not available
+
+        self.assertIsInstance(last_pid, int)
+        self.assertGreater(last_pid, 0)
+
+    def test__get_start_time(self):
+        """ procscan.get_start_time: returns same value for a process,
+            ``None`` for non-existent processes.
+            """
+        value = procscan.get_start_time(os.getpid())
+        self.assertIsNotNone(value)
+        self.assertEqual(procscan.get_start_time(os.getpid()), value)
+        self.assertIsNone(procscan.get_start_time(999999))
+
+    def test__read_process(self):
+        """ procscan.read_process: reads details for a process.
+            """
+        info = procscan.read_process(os.getpid(), cmdline=True)
+        self.assertEqual(info.pid, os.getpid())
+        self.assertEqual(info.uid, os.getuid())
+        self.assertEqual(info.exe, os.path.realpath(sys.executable))
+        self.assertEqual(info.start_time,
+                         procscan.get_start_time(os.getpid()))
+        self.assertEqual(info.cmdline[0], sys.executable)
+
+        # not read by default
+        self.assertIsNone(procscan.read_process(os.getpid()).cmdline)
+
+    def testFilterUid__read_process(self):
+        """ procscan.read_process: returns ``None`` for processes not owned
+            by user, or that don't exist.
+            """
+        self.assertIsNone(procscan.read_process(os.getpid(),
+                                                uid=os.getuid() + 1))
+        self.assertIsNone(procscan.read_process(999999))
+
+    def test__scan(self):
+        """ procscan.scan: reads processes owned by user.
+            """
+        processes = procscan.scan(uid=os.getuid())
+        self.assertIn(os.getpid(), [p.pid for p in processes])
+        self.assertEqual(set(p.uid for p in processes), set([os.getuid()]))
+
+    def test__terminate(self):
+        """ procscan.terminate: signals process only if it's still the same
+            process.
+            """
+        proc = subprocess.Popen(['sleep', '5'])
+        try:
+            info = procscan.read_process(proc.pid)
+
+            # different start time, not the same process
+            info.start_time -= 1
+            self.assertFalse(procscan.terminate(info))
+            self.assertIsNone(proc.poll())
+
+            info.start_time += 1
+            self.assertTrue(procscan.terminate(info))
+            self.assertEqual(proc.wait(), -signal.SIGTERM)
+
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+
+
+class TestTerminateAll(FocusTestCase):
+    def setUp(self):
+        super(TestTerminateAll, self).setUp()
+        self.procs = []
+        self._orig_pidfd = procscan._pidfd_supported
+
+    def tearDown(self):
+        procscan._pidfd_supported = self._orig_pidfd
+
+        for proc in self.procs:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+
+        self.procs = None
+        super(TestTerminateAll, self).tearDown()
+
+    def _spawn(self, command):
+        proc = subprocess.Popen(command)
+        self.procs.append(proc)
+
+        # wait until shell has executed (and set its traps)
+        for i in range(100):
+            info = procscan.read_process(proc.pid)
+            if info.exe and not info.exe.endswith('python2.7'):
+                break
+            time.sleep(0.01)
+
+        time.sleep(0.1)
+        return procscan.read_process(proc.pid)
+
+    def _check(self):
+        term = self._spawn(['sleep', '5'])
+        stubborn = self._spawn(['sh', '-c', 'trap "" TERM; sleep 5 & wait'])
+        exited = self._spawn(['true'])
+        self.procs[-1].wait()
+
+        start = time.time()
+        outcomes = procscan.terminate_all([term, stubborn, exited],
+                                          grace=0.3, kill_wait=1)
+        elapsed = time.time() - start
+
+        self.assertEqual(outcomes, {
+            term.pid: procscan.TERMINATED,
+            stubborn.pid: procscan.KILLED,
+            exited.pid: procscan.EXITED
+        })
+        self.assertLess(elapsed, 1)
+        self.assertEqual(self.procs[0].wait(), -signal.SIGTERM)
+        self.assertEqual(self.procs[1].wait(), -signal.SIGKILL)
+
+    def testPidfd__terminate_all(self):
+        """ procscan.terminate_all: terminates processes, killing those that
+            don't exit after grace period.
+            """
+        self._check()
+
+    def testPolling__terminate_all(self):
+        """ procscan.terminate_all: terminates processes, killing those that
+            don't exit after grace period, without pidfds.
+            """
+        procscan._pidfd_supported = False
+        self._check()
+
+    def testPidReused__terminate_all(self):
+        """ procscan.terminate_all: doesn't signal a process with a different
+            start time.
+            """
+        info = self._spawn(['sleep', '5'])
+        info.start_time -= 1
+        self.assertEqual(procscan.terminate_all([info]),
+                         {info.pid: procscan.EXITED})
+        self.assertIsNone(self.procs[0].poll())
+
+
+class TestProcessMatcher(FocusTestCase):
+    def setUp(self):
+        super(TestProcessMatcher, self).setUp()
+        self.info = procscan.ProcessInfo(100, 1000, 'steam',
+                                         exe='/opt/valve/bin/steam',
+                                         cmdline=['steam', '--silent'])
+
+    def tearDown(self):
+        self.info = None
+        super(TestProcessMatcher, self).tearDown()
+
+    def testName__matches(self):
+        """ ProcessMatcher.matches: name rules match the full name.
+            """
+        self.assertTrue(procscan.ProcessMatcher(['name:steam'])
+                        .matches(self.info))
+        self.assertTrue(procscan.ProcessMatcher(['steam']).matches(self.info))
+        self.assertFalse(procscan.ProcessMatcher(['name:stea'])
+                         .matches(self.info))
+        self.assertFalse(procscan.ProcessMatcher(['name:s.*'])
+                         .matches(self.info))
+
+    def testGlob__matches(self):
+        """ ProcessMatcher.matches: glob rules match the executable path.
+            """
+        self.assertTrue(procscan.ProcessMatcher(['glob:/opt/*/steam'])
+                        .matches(self.info))
+        self.assertFalse(procscan.ProcessMatcher(['glob:/opt/*/stea'])
+                         .matches(self.info))
+
+        # path provided overrides executable
+        self.assertTrue(procscan.ProcessMatcher(['glob:/usr/*'])
+                        .matches(self.info, '/usr/bin/steam'))
+
+    def testRegex__matches(self):
+        """ ProcessMatcher.matches: regex rules match the executable path.
+            """
+        self.assertTrue(procscan.ProcessMatcher([r're:^/opt/\w+/bin/'])
+                        .matches(self.info))
+        self.assertFalse(procscan.ProcessMatcher(['re:^/usr/'])
+                         .matches(self.info))
+
+    def testCmdline__matches(self):
+        """ ProcessMatcher.matches: cmd rules match a command-line substring.
+            """
+        matcher = procscan.ProcessMatcher(['cmd:m --sil'])
+        self.assertTrue(matcher.needs_cmdline)
+        self.assertTrue(matcher.matches(self.info))
+
+        self.assertFalse(procscan.ProcessMatcher(['cmd:--loud'])
+                         .matches(self.info))
+        self.assertFalse(procscan.ProcessMatcher(['name:steam'])
+                         .needs_cmdline)
+
+    def testCombined__matches(self):
+        """ ProcessMatcher.matches: matches any of multiple rules.
+            """
+        matcher = procscan.ProcessMatcher(['name:slack', 'glob:/tmp/*',
+                                           're:^/opt/valve/', 'cmd:--x'])
+        self.assertTrue(matcher.matches(self.info))
+
+        self.info.exe = '/usr/bin/steam'
+        self.assertFalse(matcher.matches(self.info))
+
+    def testInvalid__init(self):
+        """ ProcessMatcher: raises ``ValueError`` for invalid rules.
+            """
+        for rule in ('foo:bar', 'name:', 're:(unclosed'):
+            with self.assertRaises(ValueError):
+                procscan.ProcessMatcher([rule])
@@ -0,0 +1,86 @@
+import os
+import datetime
+
+from focus import sessionlog
+from focus_unittest import FocusTestCase
+
+
+class TestSessionLog(FocusTestCase):
+    def setUp(self):
+        super(TestSessionLog, self).setUp()
+        self.setup_dir()
+        self.log = sessionlog.SessionLog(self.test_dir)
+
+    def tearDown(self):
+        self.log = None
+        super(TestSessionLog, self).tearDown()
+
+    def _add(self, name, day, hour, minutes, month=3):
+        end = datetime.datetime(2012, month, day, hour, minutes, 30)
+        start = end - datetime.timedelta(minutes=25, seconds=5)
+        self.log.add(name, start, end)
+        return name, start, end
+
+    def test__iter_sessions(self):
+        """ SessionLog.iter_sessions: returns sessions ending in range.
+            """
+        sessions = [self._add(u'work', 30, 9, 0, month=1),
+                    self._add(u'work', 1, 9, 0),
+                    self._add(u'play', 1, 10, 0),
+                    self._add(u'work', 2, 9, 0),
+                    self._add(u'caf\xe9', 10, 9, 0),
+                    self._add(u'work', 3, 9, 0, month=4)]
+
+        self.assertEqual(self.log.get_task_names(),
+                         [u'work', u'play', u'caf\xe9'])
+        self.assertEqual(list(self.log.iter_sessions(
+            datetime.date(2012, 1, 1), datetime.date(2012, 12, 31))),
+            sessions)
+        self.assertEqual(list(self.log.iter_sessions(
+            datetime.date(2012, 3, 2), datetime.date(2012, 4, 2))),
+            sessions[3:5])
+        self.assertEqual(list(self.log.iter_sessions(
+            datetime.date(2012, 3, 1), datetime.date(2012, 3, 1))),
+            sessions[1:3])
+
+        # fixed-width records, indexed by day
+        seg_file = os.path.join(self.test_dir, 'sessions', '201203.seg')
+        idx_file = os.path.join(self.test_dir, 'sessions', '201203.idx')
+        self.assertEqual(os.path.getsize(seg_file), 4 * 12)
+        self.assertEqual(os.path.getsize(idx_file), 3 * 8)
+
+    def testOutOfOrder__iter_sessions(self):
+        """ SessionLog.iter_sessions: finds sessions added out of order.
+            """
+        first = self._add(u'work', 5, 9, 0)
+        late = self._add(u'work', 2, 9, 0)
+        last = self._add(u'work', 5, 10, 0)
+
+        self.assertEqual(list(self.log.iter_sessions(
+            datetime.date(2012, 3, 2), datetime.date(2012, 3, 2))), [late])
+        self.assertEqual(list(self.log.iter_sessions(
+            datetime.date(2012, 3, 5), datetime.date(2012, 3, 5))),
+            [first, last])
+
+    def testDuplicate__add(self):
+        """ SessionLog.add: ignores sessions already added.
+            """
+        session = self._add(u'work', 5, 9, 0)
+        self._add(u'work', 5, 10, 0)
+        self.log.add(*session)
+
+        self.assertEqual(len(list(self.log.iter_sessions(
+            datetime.date(2012, 3, 5), datetime.date(2012, 3, 5)))), 2)
+
+    def testPartial__add(self):
+        """ SessionLog.add: replaces partial writes left by a crash.
+            """
+        session = self._add(u'work', 1, 9, 0)
+        seg_file = os.path.join(self.test_dir, 'sessions', '201203.seg')
+        open(seg_file, 'ab').write('\x01\x02')
+        open(self.log.tasks_file, 'a').write('"pla')
+
+        other = self._add(u'play', 1, 10, 0)
+        self.assertEqual(list(self.log.iter_sessions(
+            datetime.date(2012, 3, 1), datetime.date(2012, 3, 1))),
+            [session, other])
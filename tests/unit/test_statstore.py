@@ -0,0 +1,396 @@
+import os
+import datetime
+from StringIO import StringIO
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+from focus import statstore, sessionlog
+from focus_unittest import FocusTestCase, skipUnless
+
+
+class StoreTestCase(object):
+    backend = None
+
+    def setUp(self):
+        super(StoreTestCase, self).setUp()
+        self.setup_dir()
+        self.store = statstore.BACKENDS[self.backend](self.test_dir)
+        self.today = datetime.date(2012, 3, 10)
+
+    def tearDown(self):
+        self.store.close()
+        self.store = None
+        super(StoreTestCase, self).tearDown()
+
+    def test__add(self):
+        """ add: adds minutes to task total for day.
+            """
+        self.store.add(self.today, 'test', 10)
+        self.store.add(self.today, 'test', 5)
+        self.store.add(self.today, 'other', 3)
+        self.assertEqual(self.store.get_day(self.today),
+                         {'test': 15, 'other': 3})
+        self.assertEqual(self.store.get_day(datetime.date(2012, 3, 9)), {})
+
+    def test__iter_days(self):
+        """ iter_days: returns days with stats in range, in order.
+            """
+        for days in (0, 3, 8, 40):
+            date = self.today - datetime.timedelta(days=days)
+            self.store.add(date, 'test', days + 1)
+
+        result = list(self.store.iter_days(
+            self.today - datetime.timedelta(days=10), self.today))
+        self.assertEqual(result, [
+            (datetime.date(2012, 3, 2), {'test': 9}),
+            (datetime.date(2012, 3, 7), {'test': 4}),
+            (datetime.date(2012, 3, 10), {'test': 1})
+        ])
+
+    def test__get_rollups(self):
+        """ get_rollups: returns totals maintained as minutes are added.
+            """
+        self.store.add(datetime.date(2012, 2, 27), 'test', 10)  # 2012-W09
+        self.store.add(datetime.date(2012, 3, 4), 'test', 5)  # 2012-W09
+        self.store.add(self.today, 'test', 1)  # 2012-W10
+        self.store.add(self.today, 'other', 2)
+
+        self.assertEqual(self.store.get_rollups('week'), [
+            ('2012-W09', {'test': 15}),
+            ('2012-W10', {'test': 1, 'other': 2})
+        ])
+        self.assertEqual(self.store.get_rollups('month'), [
+            ('2012-02', {'test': 10}),
+            ('2012-03', {'test': 6, 'other': 2})
+        ])
+        self.assertEqual(self.store.get_rollups('task', self.today),
+                         [('all', {'test': 16, 'other': 2})])
+
+        # excludes periods ending before start
+        self.assertEqual(self.store.get_rollups('month', self.today),
+                         [('2012-03', {'test': 6, 'other': 2})])
+        self.assertEqual(self.store.get_rollups('week',
+                                                datetime.date(2012, 3, 4)),
+                         self.store.get_rollups('week'))
+
+    def testConcurrent__log_minutes(self):
+        """ statstore.log_minutes: constrains time logged per day for
+            concurrent writers.
+            """
+        self.store.get_day(self.today)  # creates database, if any
+        end_time = datetime.datetime(2012, 3, 10, 23, 59)
+        pids = []
+
+        for i in range(4):
+            pid = os.fork()
+            if not pid:
+                try:
+                    for j in range(10):
+                        statstore.log_minutes(self.test_dir, u'test',
+                                              end_time, 50)
+                finally:
+                    os._exit(0)
+
+            pids.append(pid)
+
+        for pid in pids:
+            os.waitpid(pid, 0)
+
+        self.assertEqual(self.store.get_day(self.today), {'test': 24 * 60})
+        self.assertEqual(self.store.get_rollups('task'),
+                         [('all', {'test': 24 * 60})])
+
+
+class TestJsonStore(StoreTestCase, FocusTestCase):
+    backend = 'json'
+
+    def testInvalidFile__get_day(self):
+        """ JsonStore.get_day: ignores invalid stats files.
+            """
+        open(os.path.join(self.test_dir, '20120310.json'), 'w').write('[{')
+        self.assertEqual(self.store.get_day(self.today), {})
+        self.assertEqual(list(self.store.iter_days(self.today, self.today)),
+                         [])
+
+    def testMissing__get_rollups(self):
+        """ JsonStore.get_rollups: builds rollups from existing daily stats.
+            """
+        open(os.path.join(self.test_dir, '20120310.json'), 'w').write(
+            json.dumps({'test': 10}))
+        self.store.add(self.today, 'test', 5)
+        self.assertEqual(self.store.get_rollups('task'),
+                         [('all', {'test': 15})])
+
+    def testJournal__get_day(self):
+        """ JsonStore.get_day: replays journal left by interrupted write.
+            """
+        self.store.add(self.today, 'test', 5)
+
+        # crashed after journaling, before replacing files
+        journal = {'20120310.json': json.dumps({'test': 15}),
+                   'rollups.json': json.dumps({'task': {'all': {'test': 15}}})}
+        open(self.store.journal_file, 'w').write(json.dumps(journal))
+
+        self.assertEqual(self.store.get_day(self.today), {'test': 15})
+        self.assertFalse(os.path.exists(self.store.journal_file))
+        self.assertEqual(self.store.get_rollups('task'),
+                         [('all', {'test': 15})])
+
+        # add replays first too
+        open(self.store.journal_file, 'w').write(json.dumps(
+            {'20120310.json': json.dumps({'test': 20})}))
+        self.store.add(self.today, 'test', 1)
+        self.assertEqual(self.store.get_day(self.today), {'test': 21})
+
+    def testConcurrent__add(self):
+        """ JsonStore.add: keeps totals of concurrent writers.
+            """
+        pids = []
+
+        for i in range(4):
+            pid = os.fork()
+            if not pid:
+                try:
+                    store = statstore.JsonStore(self.test_dir)
+                    for j in range(25):
+                        store.add(self.today, 'test', 1)
+                finally:
+                    os._exit(0)
+
+            pids.append(pid)
+
+        for pid in pids:
+            os.waitpid(pid, 0)
+
+        self.assertEqual(self.store.get_day(self.today), {'test': 100})
+        self.assertEqual(self.store.get_rollups('task'),
+                         [('all', {'test': 100})])
+
+
+@skipUnless(statstore.sqlite3, 'sqlite3 module unavailable')
+class TestSqliteStore(StoreTestCase, FocusTestCase):
+    backend = 'sqlite'
+
+
+@skipUnless(statstore.sqlite3, 'sqlite3 module unavailable')
+class TestMigrate(FocusTestCase):
+    def setUp(self):
+        super(TestMigrate, self).setUp()
+        self.setup_dir()
+
+        for key, data in (('20120301', {'a': 10, 'b': 20}),
+                          ('20120305', {'a': 5})):
+            filename = os.path.join(self.test_dir, key + '.json')
+            open(filename, 'w').write(json.dumps(data))
+
+    def test__migrate(self):
+        """ statstore.migrate: moves stats between backends.
+            """
+        db_file = os.path.join(self.test_dir, 'stats.db')
+
+        self.assertEqual(statstore.migrate(self.test_dir, 'sqlite'), 2)
+        self.assertTrue(os.path.isfile(db_file))
+
+        store = statstore.open_store(self.test_dir)
+        self.assertIsInstance(store, statstore.SqliteStore)
+        self.assertEqual(store.get_day(datetime.date(2012, 3, 1)),
+                         {'a': 10, 'b': 20})
+        self.assertEqual(store.get_rollups('month'),
+                         [('2012-03', {'a': 15, 'b': 20})])
+        store.add(datetime.date(2012, 3, 5), 'a', 1)
+        store.close()
+
+        # one-time, stats aren't counted twice
+        self.assertEqual(statstore.migrate(self.test_dir, 'sqlite'), 0)
+
+        # and back again
+        self.assertEqual(statstore.migrate(self.test_dir, 'json'), 2)
+        self.assertFalse(os.path.exists(db_file))
+
+        store = statstore.open_store(self.test_dir)
+        self.assertIsInstance(store, statstore.JsonStore)
+        self.assertEqual(store.get_day(datetime.date(2012, 3, 5)), {'a': 6})
+        self.assertEqual(store.get_rollups('task'),
+                         [('all', {'a': 16, 'b': 20})])
+
+    def testInvalid__migrate(self):
+        """ statstore.migrate: fails for unsupported backends.
+            """
+        with self.assertRaises(ValueError):
+            statstore.migrate(self.test_dir, 'csv')
+
+
+class TestCheckpoint(FocusTestCase):
+    def setUp(self):
+        super(TestCheckpoint, self).setUp()
+        self.setup_dir()
+        self.start_time = datetime.datetime.now()
+
+    def _get_total(self):
+        store = statstore.open_store(self.test_dir)
+        try:
+            return dict(store.get_rollups('task')).get('all', {})
+        finally:
+            store.close()
+
+    def testLast__reconcile_session(self):
+        """ statstore.reconcile_session: logs last checkpoint of session.
+            """
+        for minutes in (5, 10):
+            statstore.checkpoint_session(self.test_dir, u'test',
+                                         self.start_time, minutes)
+        statstore.checkpoint_session(self.test_dir, u'other',
+                                     self.start_time, 5)
+
+        # partial append from crash
+        filename = os.path.join(self.test_dir, 'checkpoints')
+        open(filename, 'a').write('["test", "20')
+
+        self.assertEqual(statstore.reconcile_session(
+            self.test_dir, u'test', self.start_time), 10)
+        self.assertEqual(self._get_total(), {'test': 10})
+
+        # only other session is kept
+        self.assertEqual(len(open(filename).read().splitlines()), 1)
+        self.assertEqual(statstore.reconcile_session(
+            self.test_dir, u'test', self.start_time), 0)
+
+    def testEnded__reconcile_session(self):
+        """ statstore.reconcile_session: logs ended session duration,
+            replacing its checkpoints.
+            """
+        statstore.checkpoint_session(self.test_dir, u'test',
+                                     self.start_time, 5)
+        self.assertEqual(statstore.reconcile_session(
+            self.test_dir, u'test', self.start_time, 7), 7)
+        self.assertEqual(self._get_total(), {'test': 7})
+        self.assertEqual(open(os.path.join(self.test_dir,
+                                           'checkpoints')).read(), '')
+
+    def testFailed__reconcile_session(self):
+        """ statstore.reconcile_session: keeps checkpoints if stats can't be
+            written.
+            """
+        def _fail(*args):
+            raise statstore.Error('database is locked')
+
+        statstore.checkpoint_session(self.test_dir, u'test',
+                                     self.start_time, 5)
+        filename = os.path.join(self.test_dir, 'checkpoints')
+        data = open(filename).read()
+
+        add_many = statstore.JsonStore.add_many
+        statstore.JsonStore.add_many = _fail
+        try:
+            with self.assertRaises(statstore.Error):
+                statstore.reconcile_session(self.test_dir, u'test',
+                                            self.start_time)
+        finally:
+            statstore.JsonStore.add_many = add_many
+
+        self.assertEqual(open(filename).read(), data)
+        self.assertEqual(statstore.reconcile_session(
+            self.test_dir, u'test', self.start_time), 5)
+        self.assertEqual(self._get_total(), {'test': 5})
+
+    def testSessionFailed__reconcile_session(self):
+        """ statstore.reconcile_session: doesn't log minutes again when
+            retried after the session log couldn't be written.
+            """
+        def _fail(*args):
+            raise IOError('disk full')
+
+        statstore.checkpoint_session(self.test_dir, u'test',
+                                     self.start_time, 5)
+
+        add = sessionlog.SessionLog.add
+        sessionlog.SessionLog.add = _fail
+        try:
+            with self.assertRaises(IOError):
+                statstore.reconcile_session(self.test_dir, u'test',
+                                            self.start_time)
+        finally:
+            sessionlog.SessionLog.add = add
+
+        self.assertEqual(self._get_total(), {'test': 5})
+        self.assertEqual(statstore.reconcile_session(
+            self.test_dir, u'test', self.start_time), 5)
+        self.assertEqual(self._get_total(), {'test': 5})
+        self.assertEqual(open(os.path.join(self.test_dir,
+                                           'checkpoints')).read(), '')
+
+        today = datetime.date.today()
+        self.assertEqual(len(list(sessionlog.SessionLog(
+            self.test_dir).iter_sessions(today, today))), 1)
+
+    def test__log_minutes(self):
+        """ statstore.log_minutes: constrains time logged per day.
+            """
+        end_time = datetime.datetime(2012, 3, 10, 12, 0)
+        statstore.log_minutes(self.test_dir, u'test', end_time, 60)
+        statstore.log_minutes(self.test_dir, u'test', end_time, 24 * 60)
+
+        store = statstore.open_store(self.test_dir)
+        self.assertEqual(store.get_day(datetime.date(2012, 3, 10)),
+                         {'test': 60})
+        self.assertEqual(store.get_day(datetime.date(2012, 3, 9)),
+                         {'test': 24 * 60})
+
+
+class TestExport(FocusTestCase):
+    def setUp(self):
+        super(TestExport, self).setUp()
+        self.setup_dir()
+
+        self.store = statstore.JsonStore(self.test_dir)
+        self.store.add(datetime.date(2012, 3, 1), u'b', 20)
+        self.store.add(datetime.date(2012, 3, 1), u'a, "x"', 10)
+        self.store.add(datetime.date(2012, 3, 5), u'caf\xe9', 5)
+
+    def tearDown(self):
+        self.store.close()
+        self.store = None
+        super(TestExport, self).tearDown()
+
+    def test__iter_records(self):
+        """ statstore.iter_records: returns records in date range.
+            """
+        self.assertEqual(list(statstore.iter_records(self.store)), [
+            (datetime.date(2012, 3, 1), u'a, "x"', 10),
+            (datetime.date(2012, 3, 1), u'b', 20),
+            (datetime.date(2012, 3, 5), u'caf\xe9', 5)
+        ])
+        self.assertEqual(list(statstore.iter_records(
+            self.store, datetime.date(2012, 3, 2),
+            datetime.date(2012, 3, 5))),
+            [(datetime.date(2012, 3, 5), u'caf\xe9', 5)])
+
+    def testCsv__export(self):
+        """ statstore.export: writes records as CSV.
+            """
+        buf = StringIO()
+        self.assertEqual(statstore.export(self.store, buf, 'csv'), 3)
+        self.assertEqual(buf.getvalue(),
+                         'date,task,minutes\n'
+                         '2012-03-01,"a, ""x""",10\n'
+                         '2012-03-01,b,20\n'
+                         '2012-03-05,caf\xc3\xa9,5\n')
+
+    def testJsonl__export(self):
+        """ statstore.export: writes records as JSON Lines.
+            """
+        buf = StringIO()
+        self.assertEqual(statstore.export(self.store, buf, 'jsonl',
+                                          end_date=datetime.date(2012, 3, 1)),
+                         2)
+        self.assertEqual([json.loads(l) for l in buf.getvalue().splitlines()],
+                         [{'date': '2012-03-01', 'task': 'a, "x"',
+                           'minutes': 10},
+                          {'date': '2012-03-01', 'task': 'b',
+                           'minutes': 20}])
+
+        with self.assertRaises(ValueError):
+            statstore.export(self.store, buf, 'xml')
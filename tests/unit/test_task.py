@@ -1,7 +1,7 @@
 import os
 from datetime import datetime, timedelta
 
-from focus import errors
+from focus import common, errors, statstore
 from focus.task import Task
 from focus.plugin import registration
 from focus_unittest import FocusTestCase, MockPlugin
@@ -91,6 +91,23 @@ class TestTask(FocusTestCase):
         self.assertTrue(self.task._clean_prior())
         self.assertFalse(os.path.isfile(filename))  # was removed
 
+    def testCheckpoint___clean_prior(self):
+        """ task._clean_prior: logs checkpointed time of stopped daemon.
+            """
+        open(self._get_pidfile(), 'w', 0).write('999999\n')
+        stats_dir = os.path.join(self.test_dir, '.stats')
+        os.mkdir(stats_dir)
+
+        self.task._name = u'test'
+        self.task._start_time = datetime.now() - timedelta(minutes=30)
+        self.task._loaded = True
+        statstore.checkpoint_session(stats_dir, u'test', self.task.start_time,
+                                     25)
+
+        self.assertTrue(self.task._clean_prior())
+        store = statstore.open_store(stats_dir)
+        self.assertEqual(store.get_rollups('task'), [('all', {'test': 25})])
+
     def testNoPidFile___clean_prior(self):
         """ task._clean_prior: no pid file exists, do nothing.
             """
@@ -125,6 +142,10 @@ class TestTask(FocusTestCase):
         self.assertEqual(self.task._start_time, dt)
         self.assertEqual(self.task._owner, os.getuid())
 
+        # run time continues from start time
+        run_secs = (datetime.now() - dt).days * 24 * 3600
+        self.assertGreaterEqual(self.task.run_time, run_secs)
+
     def testInvalidActiveFile__load(self):
         """ Task.load: will not load a task if the active file is missing or
             invalid.
@@ -316,6 +337,12 @@ class TestTask(FocusTestCase):
         self.task.set_total_duration(15)
         self.assertEqual(self.task._total_duration, 15)
 
+        self.task.set_total_duration(1.5)
+        self.assertEqual(self.task._total_duration, 1.5)
+
+        with self.assertRaises(ValueError):
+            self.task.set_total_duration(0)
+
     def test__dunderStr(self):
         """ Task.__str__: returns proper str version.
             """
@@ -388,24 +415,53 @@ class TestTask(FocusTestCase):
         self.task._start_time = datetime.now() + timedelta(minutes=-15)
         self.assertEqual(self.task.duration, 15)
 
+    def test__run_time(self):
+        """ Task.run_time (property): returns seconds from monotonic start.
+            """
+        self.assertEqual(self.task.run_time, 0)
+
+        self.task._loaded = True
+        self.task._start_clock = common.boottime() - 90
+        self.assertAlmostEqual(self.task.run_time, 90, places=1)
+
+    def test__remaining(self):
+        """ Task.remaining (property): returns seconds left until total
+            duration.
+            """
+        self.task._loaded = True
+        self.task._start_clock = common.boottime() - 30
+        self.assertIsNone(self.task.remaining)
+
+        self.task._total_duration = 1.5
+        self.assertAlmostEqual(self.task.remaining, 60, places=1)
+
     def test__elapsed(self):
         """ Task.elapsed (property): returns correct elapsed status.
             """
         self.task._loaded = True
 
+        # no total duration
+        self.task._start_clock = common.boottime() - 15 * 60
+        self.assertFalse(self.task.elapsed)
+
         # not elapsed
-        self.task._start_time = datetime.now() + timedelta(minutes=-15)
         self.task._total_duration = 30
         self.assertFalse(self.task.elapsed)
 
+        # not elapsed, seconds left
+        self.task._total_duration = 15.5
+        self.assertFalse(self.task.elapsed)
+
         # elapsed
-        self.task._start_time = datetime.now() + timedelta(minutes=-15)
         self.task._total_duration = 15
         self.assertTrue(self.task.elapsed)
 
         # elapsed, overrun
-        self.task._total_duration = 15
-        self.task._start_time = datetime.now() + timedelta(minutes=-25)
+        self.task._start_clock = common.boottime() - 25 * 60
+        self.assertTrue(self.task.elapsed)
+
+        # wall clock changes are ignored
+        self.task._start_time = datetime.now() + timedelta(minutes=60)
         self.assertTrue(self.task.elapsed)
 
     def test__base_dir(self):
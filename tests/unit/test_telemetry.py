@@ -0,0 +1,121 @@
+import os
+
+from focus import telemetry
+from focus_unittest import FocusTestCase
+
+
+class TestHistogram(FocusTestCase):
+    def setUp(self):
+        super(TestHistogram, self).setUp()
+        self.hist = telemetry.Histogram()
+
+    def tearDown(self):
+        self.hist = None
+        super(TestHistogram, self).tearDown()
+
+    def test__add(self):
+        """ Histogram.add: counts values into buckets.
+            """
+        self.hist.add(0.0005)
+        self.hist.add(0.001)
+        self.hist.add(0.3)
+        self.hist.add(60)
+
+        self.assertEqual(self.hist.count, 4)
+        self.assertEqual(self.hist.counts[0], 2)  # <= 1ms
+        self.assertEqual(self.hist.counts[8], 1)  # <= 500ms
+        self.assertEqual(self.hist.counts[-1], 1)  # overflow
+        self.assertEqual(self.hist.max, 60)
+
+    def testNegative__add(self):
+        """ Histogram.add: negative values are counted as zero.
+            """
+        self.hist.add(-1)
+        self.assertEqual(self.hist.counts[0], 1)
+        self.assertEqual(self.hist.total, 0)
+
+    def test__percentile(self):
+        """ Histogram.percentile: returns upper bound of bucket.
+            """
+        self.assertIsNone(self.hist.percentile(50))
+
+        for i in range(99):
+            self.hist.add(0.0015)
+        self.hist.add(30)
+
+        self.assertEqual(self.hist.percentile(50), 0.002)
+        self.assertEqual(self.hist.percentile(99), 0.002)
+        self.assertEqual(self.hist.percentile(100), 30)
+
+    def testCappedByMax__percentile(self):
+        """ Histogram.percentile: bucket bound is capped to max value.
+            """
+        self.hist.add(0.15)
+        self.assertEqual(self.hist.percentile(50), 0.15)
+
+    def test__mean(self):
+        """ Histogram.mean (property): returns mean value.
+            """
+        self.assertIsNone(self.hist.mean)
+        self.hist.add(1)
+        self.hist.add(3)
+        self.assertEqual(self.hist.mean, 2)
+
+    def test__from_dict(self):
+        """ Histogram.from_dict: loads data from `to_dict`.
+            """
+        self.hist.add(0.5)
+        self.hist.add(2)
+
+        hist = telemetry.Histogram.from_dict(self.hist.to_dict())
+        self.assertEqual(hist.counts, self.hist.counts)
+        self.assertEqual(hist.count, 2)
+        self.assertEqual(hist.total, 2.5)
+        self.assertEqual(hist.max, 2)
+
+    def testInvalid__from_dict(self):
+        """ Histogram.from_dict: raises ``ValueError`` for invalid data.
+            """
+        with self.assertRaises(ValueError):
+            telemetry.Histogram.from_dict({})
+
+        data = self.hist.to_dict()
+        data['counts'] = [1]
+        with self.assertRaises(ValueError):
+            telemetry.Histogram.from_dict(data)
+
+
+class TestTelemetry(FocusTestCase):
+    def setUp(self):
+        super(TestTelemetry, self).setUp()
+        self.setup_dir()
+        self.filename = os.path.join(self.test_dir, 'snapshot')
+
+    def test__write_snapshot(self):
+        """ telemetry.write_snapshot: writes snapshot readable by
+            `read_snapshot`.
+            """
+        hist = telemetry.Histogram()
+        hist.add(0.25)
+
+        self.assertTrue(telemetry.write_snapshot(self.filename,
+                                                 {'hist': hist, 'val': 1}))
+        self.assertFalse(os.path.exists(self.filename + '.tmp'))
+
+        data = telemetry.read_snapshot(self.filename, histograms=('hist',))
+        self.assertEqual(data['val'], 1)
+        self.assertIsInstance(data['hist'], telemetry.Histogram)
+        self.assertEqual(data['hist'].count, 1)
+
+    def testInvalid__read_snapshot(self):
+        """ telemetry.read_snapshot: returns ``None`` for missing or invalid
+            snapshots.
+            """
+        self.assertIsNone(telemetry.read_snapshot(self.filename))
+
+        open(self.filename, 'w').write('{"hist": {}}')
+        self.assertIsNone(telemetry.read_snapshot(self.filename,
+                                                  histograms=('hist',)))
+
+        open(self.filename, 'w').write('[]')
+        self.assertIsNone(telemetry.read_snapshot(self.filename))